@@ -1,4 +1,5 @@
 # main.py
+from src.core.startup import STARTUP # اول از همه: مبدأ زمان‌بندی شروع برنامه
 import sys
 from PySide6.QtWidgets import QApplication
 from src.ui.main_window import MainWindow
@@ -11,5 +12,6 @@ if __name__ == "__main__":
     
     window = MainWindow()
     window.show()
+    STARTUP.mark("window_shown")
     
     sys.exit(app.exec())
\ No newline at end of file
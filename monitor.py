@@ -1,5 +1,4 @@
 import time
-import pandas as pd
 import psutil
 import requests
 import os
@@ -7,9 +6,11 @@ from datetime import datetime, timedelta
 import colorama
 from colorama import Fore, Style
 
+from src.core.metrics import MetricsReader, METRICS_DB
+
 # تنظیمات اولیه
 colorama.init(autoreset=True)
-TARGET_CSV = "doctor_report.csv"
+TARGET_DB = METRICS_DB
 BENCHMARK_API = "https://api.binance.com/api/v3/ticker/price?symbol=ETHUSDT"
 MEMORY_THRESHOLD = 85.0  # درصد هشدار رم
 FREEZE_THRESHOLD_SEC = 120  # اگر سیستم ۲ دقیقه کاری نکرد، یعنی فریز شده
@@ -17,19 +18,31 @@ FREEZE_THRESHOLD_SEC = 120  # اگر سیستم ۲ دقیقه کاری نکرد
 class ShadowMonitor:
     def __init__(self):
         self.last_known_price = 0
+        # خواندن افزایشی: هر بار فقط چرخه‌های جدید (به جای خواندن کل فایل)
+        self.reader = MetricsReader(TARGET_DB)
+        self.last_record = {}
         print(f"{Fore.CYAN}--- SHADOW MONITOR INITIALIZED ---")
-        print(f"{Fore.CYAN}--- Monitoring: {TARGET_CSV} ---")
+        print(f"{Fore.CYAN}--- Monitoring: {TARGET_DB} ---")
+
+    def poll(self):
+        """دریافت چرخه‌های جدید از آخرین خواندن؛ خروجی: تعداد چرخه جدید"""
+        new_rows = self.reader.tail()
+        if not new_rows.empty:
+            self.last_record = new_rows.iloc[-1].to_dict()
+        return len(new_rows)
 
     def technician_pulse_check(self):
         """بررسی حیاتی: آیا سیستم زنده است؟"""
         try:
             # 1. بررسی وجود فایل
-            if not os.path.exists(TARGET_CSV):
+            if not os.path.exists(TARGET_DB):
                 return False, "FILE_MISSING"
 
-            # 2. بررسی آخرین آپدیت فایل (تشخیص فریز شدن)
-            file_mod_time = os.path.getmtime(TARGET_CSV)
-            time_diff = time.time() - file_mod_time
+            # 2. بررسی زمان آخرین چرخه ثبت‌شده (تشخیص فریز شدن)
+            self.poll()
+            if not self.last_record:
+                return False, "NO_CYCLES_YET"
+            time_diff = time.time() - self.last_record['timestamp']
             
             if time_diff > FREEZE_THRESHOLD_SEC:
                 return False, f"SYSTEM_FREEZE (Last update: {int(time_diff)}s ago)"
@@ -80,12 +93,9 @@ class ShadowMonitor:
             return
 
         try:
-            # خواندن آخرین وضعیت ربات
-            df = pd.read_csv(TARGET_CSV)
-            if df.empty: return
-            
-            last_row = df.iloc[-1]
-            ai_conf = float(last_row.get('ai_confidence', 0))
+            # آخرین وضعیت ربات (از poll در technician_pulse_check)
+            last_row = self.last_record
+            ai_conf = round(float(last_row.get('ai_confidence') or 0), 1)
             ai_sig = str(last_row.get('ai_signal', 'WAIT'))
             
             # بررسی بنچمارک (مهندس)
@@ -108,6 +118,8 @@ class ShadowMonitor:
             print(f"👨‍⚕️ Doctor Audit:")
             print(f"   - Robot Signal: {ai_sig}")
             print(f"   - Confidence: {ai_conf}%")
+            print(f"   - Cycle: {last_row.get('cycle_ms') or 0:.0f}ms (fetch {last_row.get('fetch_ms') or 0:.0f}ms"
+                  f" | inference {last_row.get('inference_ms') or 0:.0f}ms)")
             
             # تشخیص باگ ۵۰ درصد
             if ai_conf == 50.0:
@@ -18,10 +18,14 @@ class Backtester:
         self.trades = []                     # تاریخچه معاملات
         self.equity_curve = []               # نمودار دارایی در طول زمان
 
-    def run(self, df: pd.DataFrame, strategy, macro_data=None):
+    def run(self, df: pd.DataFrame, strategy, macro_data=None, vectorized=False):
         """
         اجرای بک‌تست روی داده‌های تاریخی
+        :param vectorized: اگر True باشد از run_vectorized استفاده می‌شود (برای 50k کندل)
         """
+        if vectorized:
+            return self.run_vectorized(df, strategy, macro_data=macro_data)
+
         self.reset()
         print(f"🔄 Starting Backtest on {len(df)} candles...")
 
@@ -89,6 +93,117 @@ class Backtester:
 
         return self.generate_report()
 
+    def run_vectorized(self, df: pd.DataFrame, strategy, macro_data=None, warmup=50):
+        """
+        بک‌تست برداری: استراتژی کل ستون سیگنال را یک‌جا تولید می‌کند
+        (analyze_vectorized) و موجودی/دارایی/منحنی سرمایه با عملیات آرایه‌ای ساخته می‌شود.
+        خروجی دقیقاً همان گزارش run است.
+        """
+        self.reset()
+        print(f"⚡ Starting Vectorized Backtest on {len(df)} candles...")
+
+        # همان شرط run: تا 50 کندل اول اندیکاتورها کافی نیستند
+        df = df.iloc[warmup - 1:]
+        if df.empty:
+            return self.generate_report()
+
+        signals = strategy.analyze_vectorized(df, macro_data=macro_data)
+        actions = signals['action'].to_numpy()
+        prices = df['close'].to_numpy(dtype=float)
+        times = df.index
+
+        is_buy = np.char.find(actions.astype(str), "BUY") >= 0
+        is_sell = np.char.find(actions.astype(str), "SELL") >= 0
+
+        # وضعیت (balance/position) فقط روی ردیف‌های دارای سیگنال تغییر می‌کند.
+        # اجرای معامله وابسته به مسیر است، پس فقط همین ردیف‌های تُنُک پیمایش می‌شوند
+        # و بقیه منحنی با forward-fill ساخته می‌شود.
+        event_idx = np.flatnonzero(is_buy | is_sell)
+        balance_at = np.full(len(df), np.nan)
+        position_at = np.full(len(df), np.nan)
+
+        balance = self.balance
+        position = self.position
+        for i in event_idx:
+            current_price = prices[i]
+            if is_buy[i] and balance > 10:
+                amount_to_buy = (balance * 0.98) / current_price
+                cost = amount_to_buy * current_price
+                fee = cost * self.fee_rate
+                
+                balance -= (cost + fee)
+                position += amount_to_buy
+                self.trades.append({
+                    'type': 'BUY',
+                    'price': current_price,
+                    'amount': amount_to_buy,
+                    'time': times[i],
+                    'balance': balance
+                })
+            elif is_sell[i] and position > 0.001:
+                revenue = position * current_price
+                fee = revenue * self.fee_rate
+                
+                balance += (revenue - fee)
+                position = 0
+                self.trades.append({
+                    'type': 'SELL',
+                    'price': current_price,
+                    'amount': 0,
+                    'time': times[i],
+                    'balance': balance
+                })
+            else:
+                continue
+            balance_at[i] = balance
+            position_at[i] = position
+
+        self.balance = balance
+        self.position = position
+
+        balance_curve = pd.Series(balance_at).ffill().fillna(self.initial_capital).to_numpy()
+        position_curve = pd.Series(position_at).ffill().fillna(0.0).to_numpy()
+        equity = balance_curve + (position_curve * prices)
+
+        self.equity_curve = pd.DataFrame({'time': times, 'equity': equity})
+        return self.generate_report()
+
+    def check_parity(self, df: pd.DataFrame, strategy, macro_data=None, window=300, tol=1e-9):
+        """
+        مقایسه run (حلقه‌ای) و run_vectorized روی یک پنجره کوچک از انتهای df.
+        خروجی: {'match': bool, 'loop': report, 'vectorized': report, 'diffs': [...]}
+        """
+        sample = df.tail(window)
+        loop_report = self.run(sample, strategy, macro_data=macro_data)
+        loop_equity = pd.DataFrame(self.equity_curve)['equity'].to_numpy(dtype=float) if self.equity_curve else np.array([])
+
+        vec_report = self.run_vectorized(sample, strategy, macro_data=macro_data)
+        vec_equity = pd.DataFrame(self.equity_curve)['equity'].to_numpy(dtype=float) if len(self.equity_curve) else np.array([])
+
+        diffs = []
+        if isinstance(loop_report, str) or isinstance(vec_report, str):
+            if loop_report != vec_report:
+                diffs.append("report")
+        else:
+            for key in ["Final Equity", "Total Return", "Max Drawdown", "Total Trades", "Win Rate"]:
+                if loop_report[key] != vec_report[key]:
+                    diffs.append(key)
+            if len(loop_equity) != len(vec_equity) or not np.allclose(loop_equity, vec_equity, rtol=0, atol=tol):
+                diffs.append("Equity Curve")
+            loop_trades = loop_report["Trade History"]
+            vec_trades = vec_report["Trade History"]
+            if len(loop_trades) != len(vec_trades) or (
+                len(loop_trades) and not np.allclose(loop_trades['balance'], vec_trades['balance'], rtol=0, atol=tol)
+            ):
+                diffs.append("Trade History")
+
+        if diffs:
+            print(f"❌ Backtest parity FAILED on {len(sample)} candles: {diffs}")
+        else:
+            print(f"✅ Backtest parity OK on {len(sample)} candles.")
+
+        return {"match": not diffs, "loop": loop_report, "vectorized": vec_report, "diffs": diffs}
+
     def generate_report(self):
         """محاسبه شاخص‌های عملکرد (KPIs)"""
         df_equity = pd.DataFrame(self.equity_curve)
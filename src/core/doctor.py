@@ -1,30 +1,29 @@
 # src/core/doctor.py
+import math
 import psutil
 import time
-import pandas as pd
 import os
 from datetime import datetime
 
+from src.core.metrics import MetricsCollector
+
 class SystemDoctor:
-    def __init__(self, report_file="doctor_report.csv"):
-        self.report_file = report_file
+    """
+    وضعیت سلامت هر چرخه را در MetricsCollector ثبت می‌کند (به جای append به CSV در هر چرخه).
+    زمان مراحل با self.metrics.stage(...) در worker ثبت می‌شود؛ checkup چرخه را می‌بندد.
+    """
+    def __init__(self, metrics=None):
+        self.metrics = metrics or MetricsCollector()
         self.start_time = time.time()
-        
-        if not os.path.exists(self.report_file):
-            df = pd.DataFrame(columns=[
-                "timestamp", "uptime_min", "cpu_percent", "ram_mb", 
-                "api_latency_ms", "cycle_duration_s", "ai_confidence", 
-                "ai_signal", "strategy_score"
-            ])
-            df.to_csv(self.report_file, index=False)
+        self.process = psutil.Process(os.getpid())
 
-    def checkup(self, api_start_time, ai_result, strat_result):
+    def checkup(self, api_start_time, ai_result, strat_result, features=None):
+        """features: FeatureBlock.footprint() نماد فعلی (گزارش حافظه ویژگی‌ها)"""
         now = datetime.now()
         uptime = (time.time() - self.start_time) / 60
         
         cpu = psutil.cpu_percent(interval=None)
-        process = psutil.Process(os.getpid())
-        ram = process.memory_info().rss / 1024 / 1024
+        ram = self.process.memory_info().rss / 1024 / 1024
         
         cycle_end_time = time.time()
         duration = cycle_end_time - api_start_time
@@ -42,21 +41,24 @@ class SystemDoctor:
             
         score = strat_result.get('score', 0)
 
+        self.metrics.end_cycle(
+            ai_sig, cpu_percent=cpu, ram_mb=ram, ai_confidence=ai_conf * 100, strategy_score=score
+        )
+        # تاخیر واقعی API از تایمر مرحله fetch (اگر ثبت نشده باشد، کل چرخه)
+        fetch_ms = self.metrics.last()["fetch_ms"]
+        api_latency = duration * 1000 if math.isnan(fetch_ms) else fetch_ms
+
         new_record = {
             "timestamp": now.strftime("%H:%M:%S"),
             "uptime_min": round(uptime, 1),
             "cpu_percent": cpu,
             "ram_mb": round(ram, 1),
-            "api_latency_ms": round(duration * 1000, 0),
+            "api_latency_ms": round(api_latency, 0),
             "cycle_duration_s": round(duration, 2),
             "ai_confidence": round(ai_conf * 100, 1),
             "ai_signal": ai_sig,
-            "strategy_score": score
+            "strategy_score": score,
+            "feature_mb": round(features["reserved_mb"], 2) if features else 0.0,
         }
         
-        try:
-            df = pd.DataFrame([new_record])
-            df.to_csv(self.report_file, mode='a', header=False, index=False)
-        except: pass
-        
-        return new_record
\ No newline at end of file
+        return new_record
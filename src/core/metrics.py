@@ -0,0 +1,222 @@
+# src/core/metrics.py
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+METRICS_DB = "data/metrics.db"
+
+# مراحل هر چرخه (زمان هر مرحله به میلی‌ثانیه ثبت می‌شود)
+STAGES = ["fetch", "macro", "news", "merge", "features", "labeling", "inference", "shap", "db", "emit", "cycle"]
+# مقادیر لحظه‌ای هر چرخه
+GAUGES = ["cpu_percent", "ram_mb", "ai_confidence", "strategy_score"]
+SIGNALS = ["WAIT", "BUY", "SELL"]
+# مرزهای هیستوگرام زمان مراحل (میلی‌ثانیه)
+HIST_BUCKETS_MS = np.array([1, 5, 10, 50, 100, 500, 1000, 5000, np.inf])
+
+
+class _StageTimer:
+    __slots__ = ('collector', 'column', 'start')
+
+    def __init__(self, collector, column):
+        self.collector = collector
+        self.column = column
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.collector._add(self.column, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class MetricsCollector:
+    """
+    جمع‌آوری کم‌هزینه متریک‌ها: زمان مراحل، شمارنده‌ها و هیستوگرام‌ها در بافر حلقوی از پیش رزروشده (numpy).
+    ثبت هر چرخه در حد چند میکروثانیه است؛ ردیف‌ها هر flush_interval ثانیه یک‌جا در SQLite نوشته می‌شوند.
+    """
+    def __init__(self, sink_path=METRICS_DB, capacity=4096, flush_interval=30):
+        self.sink_path = sink_path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+
+        self._stages = np.full((capacity, len(STAGES)), np.nan)
+        self._gauges = np.full((capacity, len(GAUGES)), np.nan)
+        self._signal = np.zeros(capacity, dtype=np.int8)
+        self._ts = np.zeros(capacity)
+        self.histograms = np.zeros((len(STAGES), len(HIST_BUCKETS_MS)), dtype=np.int64)
+        self.counters = {}
+
+        self._columns = {name: i for i, name in enumerate(STAGES)}
+        self._timers = {name: _StageTimer(self, i) for name, i in self._columns.items()}
+        self._seq = 0           # شماره چرخه جاری (کل چرخه‌ها از شروع)
+        self._row = 0
+        self._flushed_seq = 0
+        self._cycle_start = None
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._connect() # شماره‌گذاری چرخه‌ها از ادامه اجرای قبلی
+
+    # --- ثبت ---
+    def begin_cycle(self):
+        self._row = self._seq % self.capacity
+        self._stages[self._row] = np.nan
+        self._gauges[self._row] = np.nan
+        self._cycle_start = time.perf_counter()
+
+    def _add(self, column, ms):
+        # یک مرحله ممکن است چند بار در چرخه اجرا شود؛ زمان‌ها جمع می‌شوند
+        current = self._stages[self._row, column]
+        self._stages[self._row, column] = ms if np.isnan(current) else current + ms
+
+    def stage(self, name):
+        """with metrics.stage("features"): ..."""
+        return self._timers[name]
+
+    def record(self, name, ms):
+        self._add(self._columns[name], ms)
+
+    def inc(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def end_cycle(self, signal="WAIT", **gauges):
+        row = self._row
+        if self._cycle_start is not None:
+            self._stages[row, self._columns["cycle"]] = (time.perf_counter() - self._cycle_start) * 1000
+            self._cycle_start = None
+        for i, name in enumerate(GAUGES):
+            if name in gauges:
+                self._gauges[row, i] = gauges[name]
+        self._signal[row] = SIGNALS.index(signal) if signal in SIGNALS else 0
+        self._ts[row] = time.time()
+
+        durations = self._stages[row]
+        measured = ~np.isnan(durations)
+        buckets = np.searchsorted(HIST_BUCKETS_MS, durations[measured])
+        self.histograms[np.flatnonzero(measured), buckets] += 1
+
+        self._seq += 1
+        self.inc("cycles")
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def last(self) -> dict:
+        """آخرین چرخه کامل (برای نمایش/گزارش)"""
+        if self._seq == 0:
+            return {}
+        row = (self._seq - 1) % self.capacity
+        record = {"seq": self._seq, "timestamp": self._ts[row], "ai_signal": SIGNALS[self._signal[row]]}
+        record.update({f"{name}_ms": self._stages[row, i] for i, name in enumerate(STAGES)})
+        record.update({name: self._gauges[row, i] for i, name in enumerate(GAUGES)})
+        return record
+
+    # --- نوشتن در SQLite ---
+    def _connect(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.sink_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._conn = sqlite3.connect(self.sink_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            stage_cols = ", ".join(f"{name}_ms REAL" for name in STAGES)
+            gauge_cols = ", ".join(f"{name} REAL" for name in GAUGES)
+            with self._conn:
+                self._conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS cycles (
+                        seq INTEGER PRIMARY KEY, timestamp REAL, ai_signal TEXT, {stage_cols}, {gauge_cols}
+                    )
+                """)
+                self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS histograms (stage TEXT, bucket_ms REAL, count INTEGER,
+                        PRIMARY KEY (stage, bucket_ms))
+                """)
+            # ادامه شماره چرخه‌ها بعد از اجرای قبلی
+            last = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cycles").fetchone()[0]
+            if self._seq == 0 and last:
+                self._seq = self._flushed_seq = last
+        return self._conn
+
+    def flush(self):
+        """نوشتن چرخه‌های جدید، شمارنده‌ها و هیستوگرام‌ها در یک تراکنش"""
+        with self._lock:
+            conn = self._connect()
+            first = max(self._flushed_seq, self._seq - self.capacity)
+            if first > self._flushed_seq:
+                self.inc("dropped_cycles", first - self._flushed_seq)
+            rows = []
+            for seq in range(first, self._seq):
+                row = seq % self.capacity
+                values = [None if np.isnan(v) else float(v) for v in self._stages[row]]
+                gauges = [None if np.isnan(v) else float(v) for v in self._gauges[row]]
+                rows.append((seq + 1, float(self._ts[row]), SIGNALS[self._signal[row]], *values, *gauges))
+            placeholders = ", ".join("?" * (3 + len(STAGES) + len(GAUGES)))
+            histogram_rows = [
+                (STAGES[s], float(HIST_BUCKETS_MS[b]) if np.isfinite(HIST_BUCKETS_MS[b]) else -1.0,
+                 int(self.histograms[s, b]))
+                for s, b in zip(*np.nonzero(self.histograms))
+            ]
+            with conn:
+                conn.executemany(f"INSERT OR REPLACE INTO cycles VALUES ({placeholders})", rows)
+                conn.executemany(
+                    "INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    list(self.counters.items()))
+                conn.executemany(
+                    "INSERT INTO histograms VALUES (?, ?, ?) ON CONFLICT(stage, bucket_ms) DO UPDATE SET count = count + excluded.count",
+                    histogram_rows)
+            # شمارنده‌ها و هیستوگرام‌ها به صورت افزایشی (delta) نوشته می‌شوند
+            self.counters = {}
+            self.histograms[:] = 0
+            self._flushed_seq = self._seq
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class MetricsReader:
+    """خواندن افزایشی متریک‌ها (برای monitor.py): هر بار فقط چرخه‌های بعد از آخرین seq خوانده‌شده"""
+    def __init__(self, sink_path=METRICS_DB):
+        self.sink_path = sink_path
+        self.cursor = 0
+
+    def _query(self, query, params=()):
+        if not os.path.exists(self.sink_path):
+            return pd.DataFrame()
+        conn = sqlite3.connect(f"file:{self.sink_path}?mode=ro", uri=True)
+        try:
+            return pd.read_sql_query(query, conn, params=params)
+        except Exception:
+            return pd.DataFrame()
+        finally:
+            conn.close()
+
+    def tail(self, limit=1000) -> pd.DataFrame:
+        df = self._query("SELECT * FROM cycles WHERE seq > ? ORDER BY seq LIMIT ?", (self.cursor, limit))
+        if not df.empty:
+            self.cursor = int(df['seq'].iloc[-1])
+        return df
+
+    def last(self) -> dict:
+        df = self._query("SELECT * FROM cycles ORDER BY seq DESC LIMIT 1")
+        return df.iloc[0].to_dict() if not df.empty else {}
+
+    def counters(self) -> dict:
+        df = self._query("SELECT * FROM counters")
+        return dict(zip(df['name'], df['value'])) if not df.empty else {}
+
+    def histograms(self) -> pd.DataFrame:
+        df = self._query("SELECT * FROM histograms")
+        if df.empty:
+            return df
+        df['bucket_ms'] = df['bucket_ms'].replace(-1.0, np.inf)
+        return df.pivot(index='stage', columns='bucket_ms', values='count').fillna(0).astype(int)
@@ -1,111 +1,311 @@
 # src/core/persistence.py
 import sqlite3
+import time
 import pandas as pd
 from datetime import datetime, timedelta
 import os
 
 DB_PATH = 'trader.db'
 
+# تنظیمات SQLite: WAL (خواننده‌ها نویسنده را بلاک نمی‌کنند) و sync کمتر در هر commit
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -20000,        # حدود 20MB
+    "mmap_size": 268435456,      # 256MB
+    "busy_timeout": 5000,
+}
+
+
+def _stats_upsert(row, sign):
+    """
+    به‌روزرسانی شمارنده‌های ai_stats برای ردیف NEW/OLD در سه سطح:
+    (نماد، روز)، (نماد، کل) و (همه، کل)
+    """
+    keys = [(f"{row}.symbol", f"substr({row}.timestamp, 1, 10)"), (f"{row}.symbol", "'*'"), ("'*'", "'*'")]
+    return "".join(f"""
+            INSERT INTO ai_stats (symbol, day, pending, correct, wrong)
+            VALUES (COALESCE({symbol}, ''), {day}, {sign}({row}.status = 'PENDING'),
+                    {sign}({row}.status = 'CORRECT'), {sign}({row}.status = 'WRONG'))
+            ON CONFLICT(symbol, day) DO UPDATE SET
+                pending = pending + excluded.pending,
+                correct = correct + excluded.correct,
+                wrong = wrong + excluded.wrong;""" for symbol, day in keys)
+
+
+def _stats_backfill(symbol, day):
+    return f"""
+        INSERT INTO ai_stats (symbol, day, pending, correct, wrong)
+        SELECT {symbol}, {day}, SUM(status = 'PENDING'), SUM(status = 'CORRECT'), SUM(status = 'WRONG')
+        FROM ai_history GROUP BY 1, 2
+    """
+
+
+# مهاجرت‌های schema به ترتیب نسخه (PRAGMA user_version)
+MIGRATIONS = [
+    # 1. جداول اصلی
+    [
+        # 1. جدول ذخیره سیگنال‌های نهایی و امتیاز نهایی
+        """
+        CREATE TABLE IF NOT EXISTS signals (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT,
+            symbol TEXT,
+            final_action TEXT,
+            final_score REAL,
+            price REAL
+        )
+        """,
+        # 2. جدول تاریخچه اعتبارسنجی AI (جایگزین ai_history.csv)
+        """
+        CREATE TABLE IF NOT EXISTS ai_history (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT,
+            symbol TEXT,
+            predicted_direction TEXT,
+            confidence REAL,
+            entry_price REAL,
+            status TEXT, -- PENDING, CORRECT, WRONG
+            actual_result REAL
+        )
+        """,
+    ],
+    # 2. ایندکس‌ها: پیدا کردن پیش‌بینی‌های PENDING سررسیده و سیگنال‌های هر نماد
+    [
+        "CREATE INDEX IF NOT EXISTS idx_ai_history_status_ts ON ai_history(status, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_signals_symbol_ts ON signals(symbol, timestamp)",
+    ],
+    # 3. شمارنده‌های تجمیعی دقت (نگهداری با trigger) و ستون rev برای دریافت فقط تغییرات
+    [
+        "ALTER TABLE ai_history ADD COLUMN rev INTEGER",
+        "UPDATE ai_history SET rev = id",
+        "CREATE INDEX IF NOT EXISTS idx_ai_history_rev ON ai_history(rev)",
+        """
+        CREATE TABLE IF NOT EXISTS ai_stats (
+            symbol TEXT NOT NULL,
+            day TEXT NOT NULL, -- YYYY-MM-DD یا '*' برای کل
+            pending INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            wrong INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (symbol, day)
+        )
+        """,
+        _stats_backfill("COALESCE(symbol, '')", "substr(timestamp, 1, 10)"),
+        _stats_backfill("COALESCE(symbol, '')", "'*'"),
+        _stats_backfill("'*'", "'*'"),
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ai_history_insert AFTER INSERT ON ai_history
+        BEGIN{_stats_upsert("NEW", "")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ai_history_update AFTER UPDATE OF status, symbol, timestamp ON ai_history
+        BEGIN{_stats_upsert("OLD", "-")}{_stats_upsert("NEW", "")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ai_history_delete AFTER DELETE ON ai_history
+        BEGIN{_stats_upsert("OLD", "-")}
+        END
+        """,
+    ],
+    # 4. نتیجه اعتبارسنجی مسیر: زمان برخورد، بیشترین حرکت مخالف و بازده محقق‌شده
+    [
+        "ALTER TABLE ai_history ADD COLUMN hit_time TEXT",
+        "ALTER TABLE ai_history ADD COLUMN mae REAL",
+        "ALTER TABLE ai_history ADD COLUMN realized_return REAL",
+    ],
+]
+
+INSERT_SIGNAL = """
+    INSERT INTO signals (timestamp, symbol, final_action, final_score, price)
+    VALUES (?, ?, ?, ?, ?)
+"""
+INSERT_PREDICTION = """
+    INSERT INTO ai_history (timestamp, symbol, predicted_direction, confidence, entry_price, status, actual_result, rev)
+    VALUES (?, ?, ?, ?, ?, 'PENDING', 0.0, (SELECT COALESCE(MAX(rev), 0) + 1 FROM ai_history))
+"""
+
+
 class DBManager:
-    def __init__(self):
+    """
+    لایه ذخیره‌سازی: نوشتن‌ها بافر می‌شوند و در یک تراکنش گروهی flush می‌شوند
+    (وقتی بافر پر شود، flush_interval بگذرد، قبل از هر خواندن و هنگام close).
+    """
+    def __init__(self, db_path=DB_PATH, flush_interval=1.0, max_buffer=500):
         # ایجاد اتصال و ایجاد فایل دیتابیس
-        self.conn = sqlite3.connect(DB_PATH)
+        self.conn = sqlite3.connect(db_path)
         self.cursor = self.conn.cursor()
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._signals = []
+        self._predictions = []
+        self._last_flush = time.monotonic()
+        self.apply_pragmas()
         self.create_tables()
 
+    def apply_pragmas(self):
+        for name, value in PRAGMAS.items():
+            self.cursor.execute(f"PRAGMA {name}={value}")
+
     def create_tables(self):
-        """ایجاد جداول signals و ai_history."""
-        # 1. جدول ذخیره سیگنال‌های نهایی و امتیاز نهایی
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS signals (
-                id INTEGER PRIMARY KEY,
-                timestamp TEXT,
-                symbol TEXT,
-                final_action TEXT,
-                final_score REAL,
-                price REAL
-            )
-        """)
-        
-        # 2. جدول تاریخچه اعتبارسنجی AI (جایگزین ai_history.csv)
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS ai_history (
-                id INTEGER PRIMARY KEY,
-                timestamp TEXT,
-                symbol TEXT,
-                predicted_direction TEXT,
-                confidence REAL,
-                entry_price REAL,
-                status TEXT, -- PENDING, CORRECT, WRONG
-                actual_result REAL
-            )
-        """)
-        self.conn.commit()
+        """اجرای مهاجرت‌هایی که هنوز روی این فایل اجرا نشده‌اند (جداول signals و ai_history و ایندکس‌ها)."""
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], version + 1):
+            with self.conn:
+                for statement in statements:
+                    self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version={number}")
+
+    def flush(self):
+        """نوشتن همه رکوردهای بافرشده در یک تراکنش."""
+        if self._signals or self._predictions:
+            with self.conn:
+                if self._signals:
+                    self.conn.executemany(INSERT_SIGNAL, self._signals)
+                if self._predictions:
+                    self.conn.executemany(INSERT_PREDICTION, self._predictions)
+            self._signals = []
+            self._predictions = []
+        self._last_flush = time.monotonic()
+
+    def _maybe_flush(self):
+        pending = len(self._signals) + len(self._predictions)
+        if pending >= self.max_buffer or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
 
     def save_signal(self, symbol, action, score, price):
         """ذخیره سیگنال نهایی تولید شده توسط StrategyEngine."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.cursor.execute("""
-            INSERT INTO signals (timestamp, symbol, final_action, final_score, price)
-            VALUES (?, ?, ?, ?, ?)
-        """, (timestamp, symbol, action, score, price))
-        self.conn.commit()
-        
+        self._signals.append((timestamp, symbol, action, score, price))
+        self._maybe_flush()
+
+    def save_signals(self, rows):
+        """ذخیره دسته‌ای سیگنال‌ها (symbol, action, score, price) در یک تراکنش واحد."""
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._signals.extend((timestamp, symbol, action, score, price) for symbol, action, score, price in rows)
+        self.flush()
+
     def add_prediction(self, symbol, direction, confidence, current_price):
         """ثبت یک پیش‌بینی جدید از AI."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-        self.cursor.execute("""
-            INSERT INTO ai_history (timestamp, symbol, predicted_direction, confidence, entry_price, status, actual_result)
-            VALUES (?, ?, ?, ?, ?, 'PENDING', 0.0)
-        """, (timestamp, symbol, direction, confidence, current_price))
-        self.conn.commit()
+        self._predictions.append((timestamp, symbol, direction, confidence, current_price))
+        self._maybe_flush()
 
     def validate_past_predictions(self, current_price, validation_period_minutes=120):
-        """بررسی پیش‌بینی‌های گذشته و به‌روزرسانی وضعیت (VALIDATION LOOP)."""
+        """
+        بررسی پیش‌بینی‌های گذشته و به‌روزرسانی وضعیت (VALIDATION LOOP).
+        یک UPDATE مجموعه‌ای (CASE) به جای یک UPDATE برای هر ردیف؛ خروجی: تعداد ردیف‌های بررسی‌شده.
+        """
+        self.flush()
         validation_time = datetime.now() - timedelta(minutes=validation_period_minutes)
         validation_time_str = validation_time.strftime("%Y-%m-%d %H:%M")
+        current_price = float(current_price)
+
+        # Logic: Did the price move in the predicted direction?
+        with self.conn:
+            cursor = self.conn.execute("""
+                UPDATE ai_history SET
+                    status = CASE
+                        WHEN predicted_direction = 'BUY' AND ? > entry_price THEN 'CORRECT'
+                        WHEN predicted_direction = 'SELL' AND ? < entry_price THEN 'CORRECT'
+                        ELSE 'WRONG'
+                    END,
+                    actual_result = ?,
+                    rev = (SELECT COALESCE(MAX(rev), 0) + 1 FROM ai_history)
+                WHERE status = 'PENDING' AND timestamp <= ?
+            """, (current_price, current_price, current_price, validation_time_str))
+        return cursor.rowcount
+
+    def get_pending_predictions(self, symbol=None) -> pd.DataFrame:
+        """پیش‌بینی‌های PENDING (از ایندکس status) برای اعتبارسنجی مسیر."""
+        self.flush()
+        query = "SELECT id, timestamp, symbol, predicted_direction, entry_price FROM ai_history WHERE status = 'PENDING'"
+        params = ()
+        if symbol:
+            query += " AND symbol = ?"
+            params = (symbol,)
+        return pd.read_sql_query(query + " ORDER BY id", self.conn, params=params)
+
+    def resolve_predictions(self, results):
+        """
+        ثبت نتیجه اعتبارسنجی در یک تراکنش.
+        results: ردیف‌های (id, status, actual_result, hit_time, mae, realized_return)
+        """
+        rows = [(status, float(actual), hit_time, float(mae), float(ret), row_id)
+                for row_id, status, actual, hit_time, mae, ret in results]
+        if not rows:
+            return 0
+        with self.conn:
+            rev = self.conn.execute("SELECT COALESCE(MAX(rev), 0) + 1 FROM ai_history").fetchone()[0]
+            self.conn.executemany(f"""
+                UPDATE ai_history SET status = ?, actual_result = ?, hit_time = ?, mae = ?,
+                    realized_return = ?, rev = {int(rev)}
+                WHERE id = ? AND status = 'PENDING'
+            """, rows)
+        return len(rows)
 
-        # گرفتن تمام پیش‌بینی‌های PENDING که زمان بررسی آن‌ها رسیده است
-        self.cursor.execute("""
-            SELECT id, predicted_direction, entry_price FROM ai_history 
-            WHERE status = 'PENDING' AND timestamp <= ?
-        """, (validation_time_str,))
-        
-        pending_trades = self.cursor.fetchall()
-        
-        for trade_id, direction, entry, in pending_trades:
-            entry = float(entry)
-            is_correct = False
-            
-            # Logic: Did the price move in the predicted direction?
-            if direction == "BUY" and current_price > entry:
-                is_correct = True
-            elif direction == "SELL" and current_price < entry:
-                is_correct = True
-
-            status = 'CORRECT' if is_correct else 'WRONG'
-            
-            self.cursor.execute("""
-                UPDATE ai_history SET status = ?, actual_result = ? 
-                WHERE id = ?
-            """, (status, current_price, trade_id))
-            
-        self.conn.commit()
+    def get_accuracy(self, symbol=None):
+        """دقت AI (درصد) از شمارنده‌های تجمیعی؛ یک lookup روی کلید اصلی به جای خواندن کل جدول."""
+        self.flush()
+        row = self.conn.execute(
+            "SELECT correct, wrong FROM ai_stats WHERE symbol = ? AND day = '*'", (symbol or '*',)
+        ).fetchone()
+        if not row or not (row[0] + row[1]):
+            return 0.0
+        return row[0] / (row[0] + row[1]) * 100
+
+    def get_ai_stats(self, symbol=None):
+        """شمارنده‌های روزانه (pending/correct/wrong) برای یک نماد یا همه نمادها."""
+        self.flush()
+        if symbol:
+            query, params = "SELECT * FROM ai_stats WHERE symbol = ? AND day != '*' ORDER BY day", (symbol,)
+        else:
+            query, params = """
+                SELECT day, SUM(pending) AS pending, SUM(correct) AS correct, SUM(wrong) AS wrong
+                FROM ai_stats WHERE symbol != '*' AND day != '*' GROUP BY day ORDER BY day
+            """, ()
+        return pd.read_sql_query(query, self.conn, params=params)
+
+    def get_history(self, limit=100, since_id=None, before_id=None):
+        """
+        صفحه‌ای از تاریخچه AI (جدیدترین اول): n ردیف آخر، یا ردیف‌های بعد از since_id،
+        یا صفحه قبلی با before_id.
+        """
+        self.flush()
+        conditions, params = [], []
+        if since_id is not None:
+            conditions.append("id > ?")
+            params.append(since_id)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return pd.read_sql_query(
+            f"SELECT * FROM ai_history {where} ORDER BY id DESC LIMIT ?", self.conn, params=(*params, limit)
+        )
+
+    def get_history_changes(self, since_rev=0, limit=500):
+        """
+        ردیف‌های جدید یا تغییرکرده (مثلاً اعتبارسنجی‌شده) بعد از since_rev، حداکثر limit ردیف آخر.
+        خروجی: (DataFrame به ترتیب id، rev بعدی برای فراخوانی بعد)
+        """
+        self.flush()
+        df = pd.read_sql_query("""
+            SELECT * FROM (
+                SELECT * FROM ai_history WHERE rev > ? ORDER BY rev DESC LIMIT ?
+            ) ORDER BY id
+        """, self.conn, params=(since_rev, limit))
+        return df, (int(df['rev'].max()) if not df.empty else since_rev)
 
     def get_ai_history(self):
-        """دریافت کل تاریخچه AI برای نمایش در UI."""
+        """دریافت کل تاریخچه AI (برای گزارش‌ها؛ UI از get_history_changes استفاده می‌کند)."""
+        self.flush()
         df = pd.read_sql_query("SELECT * FROM ai_history ORDER BY id DESC", self.conn)
-        
-        # محاسبه دقت
-        finished = df[df['status'] != 'PENDING']
-        if finished.empty: 
-            accuracy = 0.0
-        else:
-            correct = len(finished[finished['status'] == 'CORRECT'])
-            total = len(finished)
-            accuracy = (correct / total) * 100
-            
-        return df, accuracy
-        
+
+        return df, self.get_accuracy()
+
     def close(self):
-        self.conn.close()
\ No newline at end of file
+        self.flush()
+        self.conn.close()
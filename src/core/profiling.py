@@ -0,0 +1,193 @@
+# src/core/profiling.py
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from src.core.utils import LOGGER
+
+PROFILE_ENV = "PIED_PIPER_PROFILE"  # مثلا PIED_PIPER_PROFILE=5 → پروفایل ۵ چرخه اول
+PROFILE_DIR = "data/profiles"
+DEFAULT_CYCLES = 5
+
+
+class _ProfileSpan:
+    """span حالت پروفایل: علاوه بر زمان دیواری، زمان CPU ترد و اوج تخصیص حافظه مرحله"""
+    __slots__ = ('profiler', 'name', 'timer', 'cpu_start', 'mem_start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.timer = profiler.metrics.stage(name)
+
+    def __enter__(self):
+        self.mem_start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self.cpu_start = time.thread_time()
+        self.timer.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        wall_ms = (time.perf_counter() - self.timer.start) * 1000
+        self.timer.__exit__(*exc)
+        cpu_ms = (time.thread_time() - self.cpu_start) * 1000
+        peak = tracemalloc.get_traced_memory()[1] - self.mem_start
+        self.profiler._add_span(self.name, wall_ms, cpu_ms, peak)
+        return False
+
+
+class CycleProfiler:
+    """
+    پروفایل مرحله‌ای چرخه تحلیل.
+    span(name) همیشه فعال است و فقط زمان مرحله را در MetricsCollector ثبت می‌کند (چند میکروثانیه).
+    با request(n) یا متغیر محیطی PIED_PIPER_PROFILE، n چرخه بعدی با cProfile (ترد loop و ترد تحلیل)
+    و tracemalloc ضبط می‌شوند و گزارش متنی + فایل .prof (برای snakeviz/flameprof) در PROFILE_DIR نوشته می‌شود.
+    """
+    def __init__(self, metrics, report_dir=PROFILE_DIR):
+        self.metrics = metrics
+        self.report_dir = report_dir
+        self._lock = threading.Lock()
+        self._requested = 0
+        self._remaining = 0
+        self._captured = 0
+        self._profiles = []
+        self._loop_profile = None
+        self._cycle_start = None
+        self._spans = {}
+        self._started = None
+        self.last_report = None
+
+        env = os.environ.get(PROFILE_ENV, "").strip().lower()
+        if env and env not in ("0", "false", "no"):
+            self.request(int(env) if env.isdigit() else DEFAULT_CYCLES)
+
+    @property
+    def capturing(self):
+        return self._remaining > 0
+
+    def request(self, cycles=DEFAULT_CYCLES):
+        """درخواست ضبط n چرخه بعدی (از UI یا env)؛ از هر تردی قابل فراخوانی است"""
+        with self._lock:
+            self._requested = max(1, int(cycles))
+
+    def span(self, name):
+        if self._remaining:
+            return _ProfileSpan(self, name)
+        return self.metrics.stage(name)
+
+    def _add_span(self, name, wall_ms, cpu_ms, peak_bytes):
+        with self._lock:
+            stats = self._spans.setdefault(name, [0, 0.0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += wall_ms
+            stats[2] += cpu_ms
+            stats[3] = max(stats[3], peak_bytes)
+
+    # --- چرخه (در ترد loop) ---
+    def begin_cycle(self):
+        if not self._remaining and self._requested:
+            with self._lock:
+                self._remaining, self._requested = self._requested, 0
+            self._profiles, self._spans, self._captured = [], {}, 0
+            self._started = time.perf_counter()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+            LOGGER.info(f"PROFILER: capturing {self._remaining} cycles...")
+        if self._remaining:
+            # کل چرخه: زمان CPU پروسه (همه تردها)
+            self._cycle_start = (time.perf_counter(), time.process_time())
+            self._loop_profile = cProfile.Profile()
+            self._loop_profile.enable()
+
+    def end_cycle(self):
+        """بستن چرخه؛ خروجی: مسیر گزارش وقتی آخرین چرخه درخواستی ضبط شد، وگرنه None"""
+        if self._loop_profile is None:
+            return None
+        self._loop_profile.disable()
+        self._profiles.append(self._loop_profile)
+        wall_start, cpu_start = self._cycle_start
+        self._add_span("cycle", (time.perf_counter() - wall_start) * 1000,
+                       (time.process_time() - cpu_start) * 1000,
+                       max((stats[3] for stats in self._spans.values()), default=0))
+        self._loop_profile = None
+        self._captured += 1
+        self._remaining -= 1
+        if self._remaining:
+            return None
+        self.last_report = self._write_report()
+        return self.last_report
+
+    def thread(self):
+        """بخش‌هایی که در ترد دیگری اجرا می‌شوند (executor تحلیل)؛ cProfile فقط ترد خودش را می‌بیند"""
+        return _ThreadProfile(self) if self._remaining else _NULL_SECTION
+
+    # --- گزارش ---
+    def _write_report(self):
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        traced_peak = tracemalloc.get_traced_memory()[1] if snapshot else 0
+        tracemalloc.stop()
+
+        os.makedirs(self.report_dir, exist_ok=True)
+        base = os.path.join(self.report_dir, f"cycle_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        stats = pstats.Stats(self._profiles[0])
+        for profile in self._profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(base + ".prof")
+
+        out = io.StringIO()
+        out.write(f"CYCLE PROFILE | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {self._captured} cycles | "
+                  f"{time.perf_counter() - self._started:.1f}s\n\n")
+        out.write(f"{'stage':<12}{'calls':>7}{'wall ms':>12}{'wall/call':>12}{'cpu ms':>12}{'cpu/call':>12}{'peak MB':>10}\n")
+        for name, (calls, wall, cpu, peak) in sorted(self._spans.items(), key=lambda kv: -kv[1][1]):
+            out.write(f"{name:<12}{calls:>7}{wall:>12.1f}{wall / calls:>12.1f}"
+                      f"{cpu:>12.1f}{cpu / calls:>12.1f}{peak / 2**20:>10.2f}\n")
+
+        out.write("\n--- TOP FUNCTIONS (cumulative, all threads) ---\n")
+        pstats.Stats(base + ".prof", stream=out).sort_stats("cumulative").print_stats(30)
+
+        if snapshot is not None:
+            out.write(f"--- TOP ALLOCATORS (traced peak {traced_peak / 2**20:.1f} MB) ---\n")
+            for stat in snapshot.statistics("lineno")[:20]:
+                out.write(f"{stat.size / 2**10:>10.1f} KB {stat.count:>8} blocks  {stat.traceback[0]}\n")
+
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        LOGGER.info(f"PROFILER: report written to {base}.txt")
+        return base + ".txt"
+
+
+class _ThreadProfile:
+    __slots__ = ('profiler', 'profile')
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        try:
+            self.profile.enable()
+        except ValueError:
+            # پایتون 3.12+: cProfile سراسری است و پروفایل ترد loop همین ترد را هم پوشش می‌دهد
+            self.profile = None
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile is not None:
+            self.profile.disable()
+            self.profiler._profiles.append(self.profile)
+        return False
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
@@ -0,0 +1,66 @@
+# src/core/startup.py
+import json
+import os
+import time
+
+# مبدأ زمان: اولین import این ماژول (main.py آن را قبل از هر import دیگری وارد می‌کند)
+_ORIGIN = time.perf_counter()
+
+from src.core.utils import LOGGER
+
+# بنچمارک شروع (tools/bench_startup.py): بعد از رسیدن به این مرحله گزارش ذخیره و برنامه بسته می‌شود
+EXIT_ENV = "PIED_PIPER_STARTUP_EXIT"        # first_frame | warm | first_signal
+REPORT_ENV = "PIED_PIPER_STARTUP_REPORT"    # مسیر JSON گزارش
+STARTUP_MARKS = ["window_shown", "first_frame", "warm", "worker_start", "first_signal"]
+
+
+class StartupClock:
+    """
+    زمان‌بندی شروع برنامه (میلی‌ثانیه از اولین import):
+    window_shown → first_frame (اولین paint پنجره) → warm (پایان warm-up پس‌زمینه)،
+    worker_start (دکمه START) → first_signal (اولین data_ready در UI).
+    imports: زمان هر مرحله warm-up (src/ui/warmup.py).
+    """
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.marks = {}
+        self.imports = {}
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.origin) * 1000
+
+    def mark(self, name) -> bool:
+        """ثبت اولین رسیدن به یک مرحله؛ True فقط بار اول"""
+        if name in self.marks:
+            return False
+        self.marks[name] = self.elapsed_ms()
+        LOGGER.info(f"STARTUP: {name} at {self.marks[name]:.0f} ms")
+        return True
+
+    def record_import(self, label, ms):
+        self.imports[label] = ms
+
+    def report(self) -> dict:
+        report = {"marks_ms": dict(self.marks), "imports_ms": dict(self.imports)}
+        if "worker_start" in self.marks and "first_signal" in self.marks:
+            report["signal_after_start_ms"] = self.marks["first_signal"] - self.marks["worker_start"]
+        return report
+
+    def save(self, path=None):
+        """ذخیره گزارش JSON (پیش‌فرض: مسیر PIED_PIPER_STARTUP_REPORT)؛ بدون مسیر کاری نمی‌کند"""
+        path = path or os.environ.get(REPORT_ENV)
+        if not path:
+            return None
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    @staticmethod
+    def exit_target():
+        return os.environ.get(EXIT_ENV, "").strip().lower() or None
+
+
+STARTUP = StartupClock(_ORIGIN)
@@ -11,7 +11,8 @@ def setup_logging():
     logger.setLevel(logging.INFO)
     
     # 1. File Handler: ذخیره تمام پیام‌ها در فایل
-    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+    # delay: فایل با اولین پیام باز می‌شود، نه هنگام import (شروع سریع‌تر، بدون فایل خالی)
+    file_handler = logging.FileHandler(log_filename, encoding='utf-8', delay=True)
     file_handler.setLevel(logging.INFO)
     # فرمت شامل زمان، سطح خطا و ماژول
     file_formatter = logging.Formatter(
@@ -26,8 +27,6 @@ def setup_logging():
     console_formatter = logging.Formatter('%(levelname)s: %(message)s')
     console_handler.setFormatter(console_formatter)
     logger.addHandler(console_handler)
-    
-    logger.info("--- Logging System Initialized ---")
     return logger
 
 # ایجاد نمونه سراسری Logger برای استفاده در کل برنامه
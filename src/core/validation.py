@@ -0,0 +1,121 @@
+# src/core/validation.py
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.ml.dataset import DataLabeler, SEQUENCE_LENGTH
+
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class PathValidator:
+    """
+    اعتبارسنجی پیش‌بینی‌ها روی مسیر واقعی قیمت (کندل‌های ذخیره‌شده) با همان منطق Triple Barrier در DataLabeler:
+    سد سود pt×نوسان، سد ضرر sl×نوسان و سد عمودی horizon کندل بعد از ورود.
+    BUY درست است اگر سد بالا زودتر لمس شود؛ SELL اگر سد پایین زودتر لمس شود؛
+    اگر هیچ سدی لمس نشود (سد عمودی) مثل vertical_label=0 در DataLabeler، نادرست حساب می‌شود.
+    پیش‌بینی تا وقتی سدی لمس نشده و مسیر کامل نیست PENDING می‌ماند، پس بعد از قطعی هم درست پر می‌شود.
+    فقط کندل‌های بسته‌شده بررسی می‌شوند (کندل باز هنوز ممکن است برگردد).
+    """
+    def __init__(self, pt=2, sl=1, horizon=SEQUENCE_LENGTH, span=100, bar=pd.Timedelta(hours=1)):
+        self.pt = pt
+        self.sl = sl
+        self.horizon = horizon
+        self.span = span
+        self.bar = pd.Timedelta(bar)
+
+    def closed_candles(self, candles: pd.DataFrame, now=None) -> pd.DataFrame:
+        """حذف آخرین کندل اگر دوره‌اش (زمان شروع + bar) هنوز تمام نشده؛ زمان‌ها UTC بدون تایم‌زون"""
+        if candles.empty:
+            return candles
+        now = pd.Timestamp.now(tz='UTC').tz_localize(None) if now is None else pd.Timestamp(now)
+        if candles.index[-1] + self.bar > now:
+            return candles.iloc[:-1]
+        return candles
+
+    @staticmethod
+    def _to_utc(local_strings):
+        """زمان ثبت پیش‌بینی (محلی، datetime.now) به زمان کندل‌ها (UTC بدون تایم‌زون)"""
+        epochs = [datetime.strptime(s[:16], TIME_FORMAT).timestamp() for s in local_strings]
+        return pd.to_datetime(np.asarray(epochs), unit='s')
+
+    @staticmethod
+    def _to_local(utc_index):
+        return [datetime.fromtimestamp(ts.timestamp()).strftime(TIME_FORMAT) for ts in utc_index]
+
+    def resolve(self, pending: pd.DataFrame, candles: pd.DataFrame, now=None) -> pd.DataFrame:
+        """
+        حل برداری همه پیش‌بینی‌های pending روی candles (ایندکس زمانی مرتب، ستون close).
+        کندل باز انتهایی (نسبت به now) کنار گذاشته می‌شود، پس لمس سد یا کامل بودن مسیر فقط با کندل بسته است.
+        خروجی: فقط ردیف‌های حل‌شده با ستون‌های id, status, actual_result, hit_time, mae, realized_return
+        """
+        columns = ['id', 'status', 'actual_result', 'hit_time', 'mae', 'realized_return']
+        candles = self.closed_candles(candles, now)
+        if pending.empty or candles.empty:
+            return pd.DataFrame(columns=columns)
+
+        close = candles['close']
+        close_values = close.to_numpy(dtype=float)
+        volatility = DataLabeler.get_volatility(close, span0=self.span).to_numpy(dtype=float)
+
+        # کندلی که پیش‌بینی در آن ثبت شده (آخرین کندل با زمان شروع <= زمان ورود)
+        entry_times = self._to_utc(pending['timestamp'].tolist())
+        positions = close.index.searchsorted(entry_times, side='right') - 1
+        entry = pending['entry_price'].to_numpy(dtype=float)
+        is_buy = (pending['predicted_direction'] == 'BUY').to_numpy()
+
+        usable = (positions >= 0) & (entry > 0)
+        vol = np.where(usable, volatility[np.clip(positions, 0, None)], np.nan)
+        usable &= np.isfinite(vol)
+        if not usable.any():
+            return pd.DataFrame(columns=columns)
+        pos, entry, is_buy, vol = positions[usable], entry[usable], is_buy[usable], vol[usable]
+        ids = pending['id'].to_numpy()[usable]
+
+        # سدها نسبت به قیمت ورود ثبت‌شده؛ first_touch نسبت به close کندل ورود می‌سنجد
+        up_target = np.where(is_buy, 1 + self.pt * vol, 1 + self.sl * vol) * entry
+        down_target = np.where(is_buy, 1 - self.sl * vol, 1 - self.pt * vol) * entry
+        base = close_values[pos]
+        first_up, first_down = DataLabeler.first_touch(
+            close_values, pos, up_target / base - 1, down_target / base - 1, horizon=self.horizon
+        )
+
+        hit = np.minimum(first_up, first_down)
+        touched = hit < self.horizon
+        complete = pos + self.horizon - 1 <= len(close_values) - 1
+        resolved = touched | complete
+        if not resolved.any():
+            return pd.DataFrame(columns=columns)
+
+        correct = np.where(is_buy, first_up < first_down, first_down < first_up)
+        exit_pos = pos + np.where(touched, hit, self.horizon - 1)
+        exit_pos = np.minimum(exit_pos, len(close_values) - 1)
+        exit_price = close_values[exit_pos]
+        sign = np.where(is_buy, 1.0, -1.0)
+        realized = sign * (exit_price / entry - 1)
+
+        # بیشترین حرکت مخالف تا لحظه خروج (کسری مثبت از قیمت ورود)
+        offsets = np.arange(self.horizon)
+        path_idx = np.minimum(pos[:, None] + offsets, len(close_values) - 1)
+        path = np.where(offsets <= (exit_pos - pos)[:, None], close_values[path_idx], np.nan)
+        adverse = np.where(is_buy, 1 - np.nanmin(path, axis=1) / entry, np.nanmax(path, axis=1) / entry - 1)
+        mae = np.clip(adverse, 0, None)
+
+        r = resolved
+        return pd.DataFrame({
+            'id': ids[r],
+            'status': np.where(correct[r], 'CORRECT', 'WRONG'),
+            'actual_result': exit_price[r],
+            'hit_time': self._to_local(close.index[exit_pos[r]]),
+            'mae': mae[r],
+            'realized_return': realized[r],
+        }, columns=columns)
+
+    def run(self, db_manager, symbol, candles: pd.DataFrame) -> int:
+        """اعتبارسنجی همه پیش‌بینی‌های PENDING یک نماد و ثبت دسته‌ای نتایج؛ خروجی: تعداد حل‌شده"""
+        pending = db_manager.get_pending_predictions(symbol)
+        if pending.empty:
+            return 0
+        results = self.resolve(pending, candles)
+        return db_manager.resolve_predictions(results.itertuples(index=False, name=None))
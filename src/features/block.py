@@ -0,0 +1,101 @@
+# src/features/block.py
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.core.utils import LOGGER
+from src.ingest.buffer import CompactingBuffer
+
+# حالت بودجه حافظه: PIED_PIPER_FEATURE_MB=n سقف حافظه ویژگی‌های هر نماد (مگابایت)
+BUDGET_ENV = "PIED_PIPER_FEATURE_MB"
+DEFAULT_BUDGET_MB = None
+
+
+def budget_from_env(default=DEFAULT_BUDGET_MB):
+    value = os.environ.get(BUDGET_ENV, "").strip()
+    try:
+        return float(value) if value else default
+    except ValueError:
+        LOGGER.warning(f"FEATURES: invalid {BUDGET_ENV}={value!r}, ignored")
+        return default
+
+
+class FeatureBlock(CompactingBuffer):
+    """
+    بلوک پیش‌تخصیص‌یافته float32 برای ویژگی‌ها (به جای DataFrameهای float64 که در هر مرحله کپی می‌شدند).
+    ردیف‌ها در یک آرایه (2×capacity, n_columns) نوشته می‌شوند و مثل HistoryBuffer فشرده می‌شوند
+    (CompactingBuffer) تا values()/frame() همیشه view پیوسته و بدون کپی باشند.
+    columns: نام → شماره ستون، مشترک بین اندیکاتورها، labeler و مدل‌ها.
+    budget_mb: سقف حافظه کل بلوک؛ اگر capacity در آن جا نشود، کوچک می‌شود (ردیف‌های قدیمی‌تر کنار می‌روند).
+    """
+    def __init__(self, columns, capacity=2000, dtype=np.float32, budget_mb=DEFAULT_BUDGET_MB, index_name=None):
+        self.names = list(columns)
+        self.columns = {name: i for i, name in enumerate(self.names)}
+        self.dtype = np.dtype(dtype)
+        self.index_name = index_name
+        # هر ردیف ظرفیت دو بار رزرو می‌شود (مقادیر + زمان int64)
+        self.row_bytes = 2 * (len(self.names) * self.dtype.itemsize + 8)
+        if budget_mb is not None:
+            fits = max(1, int(budget_mb * 1024 * 1024) // self.row_bytes)
+            if fits < capacity:
+                LOGGER.warning(f"FEATURES: {budget_mb} MB budget caps feature history at {fits} rows (wanted {capacity})")
+                capacity = fits
+        self.budget_mb = budget_mb
+        self._allocate(capacity, len(self.names), self.dtype)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, capacity=None, dtype=np.float32, budget_mb=DEFAULT_BUDGET_MB):
+        """تبدیل یک دیتافریم ویژگی (مثلاً خروجی add_all) به بلوک فشرده"""
+        block = cls(df.columns, capacity or max(len(df), 1), dtype, budget_mb, df.index.name)
+        rows = df.tail(block.capacity)
+        n = len(rows)
+        block._ts[:n] = rows.index.as_unit('ns').asi8
+        block._data[:n] = rows.to_numpy(dtype=block.dtype)
+        block.end = n
+        return block
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes + self._ts.nbytes
+
+    def footprint(self) -> dict:
+        """گزارش حافظه: ردیف‌ها، ظرفیت و بایت‌های رزروشده/استفاده‌شده"""
+        return {
+            "rows": len(self),
+            "capacity": self.capacity,
+            "columns": len(self.names),
+            "dtype": self.dtype.name,
+            "reserved_mb": self.nbytes / 1024 / 1024,
+            "used_mb": len(self) * self.row_bytes / 2 / 1024 / 1024,
+            "budget_mb": self.budget_mb,
+        }
+
+    def append(self, timestamp, row):
+        self._make_room(1)
+        self._ts[self.end] = pd.Timestamp(timestamp).value
+        self._data[self.end] = row
+        self._advance(1)
+
+    def pop(self):
+        """حذف آخرین ردیف (rollback کندل باز)"""
+        if len(self):
+            self.end -= 1
+
+    def column(self, name, tail=None) -> np.ndarray:
+        return self.values(tail)[:, self.columns[name]]
+
+    def values(self, tail=None) -> np.ndarray:
+        """آرایه (rows, n_columns) فقط-خواندنی روی بلوک (بدون کپی)"""
+        start = max(self.start, self.end - tail) if tail else self.start
+        view = self._data[start:self.end]
+        view.flags.writeable = False
+        return view
+
+    def index(self, tail=None) -> pd.DatetimeIndex:
+        start = max(self.start, self.end - tail) if tail else self.start
+        return pd.DatetimeIndex(self._ts[start:self.end].view('datetime64[ns]'), name=self.index_name)
+
+    def frame(self, tail=None) -> pd.DataFrame:
+        """دیتافریم float32 روی همان حافظه بلوک (بدون کپی)"""
+        return pd.DataFrame(self.values(tail), index=self.index(tail), columns=self.names, copy=False)
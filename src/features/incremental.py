@@ -0,0 +1,312 @@
+# src/features/incremental.py
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from src.features.block import FeatureBlock
+
+NAN = np.float64(np.nan)
+EPSILON = np.finfo(float).eps
+
+# ترتیب ستون‌ها دقیقاً مثل TechnicalFeatures.add_all
+FEATURE_COLUMNS = [
+    'sma_20', 'sma_50', 'rsi', 'macd_line', 'macd_hist', 'macd_signal',
+    'atr', 'bb_upper', 'bb_lower', 'adx', 'obv', 'vol_ratio',
+    'price_sma_ratio', 'volatility_ratio', 'pct_change_1h', 'pct_change_3h',
+    'pct_change_24h', 'rsi_diff'
+]
+
+
+class _Ewm:
+    """
+    میانگین نمایی با adjust=False (همان حلقه داخلی pandas با ignore_na=False).
+    rma/ema در pandas_ta همین ewm هستند، پس خروجی بیت‌به‌بیت یکسان می‌ماند.
+    """
+    __slots__ = ('alpha', 'weighted', 'old_wt', 'nobs')
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def update(self, x):
+        is_obs = x == x
+        if self.weighted == self.weighted:
+            self.old_wt *= (1.0 - self.alpha)
+            if is_obs:
+                if self.weighted != x:
+                    self.weighted = ((self.old_wt * self.weighted) + (self.alpha * x)) / (self.old_wt + self.alpha)
+                self.old_wt = 1.0
+        elif is_obs:
+            self.weighted = np.float64(x)
+        self.nobs += is_obs
+        return self.weighted if self.nobs > 0 else NAN
+
+    def copy(self):
+        other = _Ewm(self.alpha)
+        other.weighted, other.old_wt, other.nobs = self.weighted, self.old_wt, self.nobs
+        return other
+
+
+class _PresmaEwm:
+    """
+    ema/atr در pandas_ta: مقدار length-ام = میانگین ساده length مقدار اول، بعد ewm.
+    """
+    __slots__ = ('length', 'ewm', 'seed')
+
+    def __init__(self, length, alpha):
+        self.length = length
+        self.ewm = _Ewm(alpha)
+        self.seed = []
+
+    def update(self, x):
+        if self.seed is not None:
+            self.seed.append(x)
+            if len(self.seed) < self.length:
+                return self.ewm.update(NAN)
+            sma_nth = np.nanmean(self.seed) if not np.all(np.isnan(self.seed)) else NAN
+            self.seed = None
+            return self.ewm.update(sma_nth)
+        return self.ewm.update(x)
+
+    def copy(self):
+        other = _PresmaEwm(self.length, self.ewm.alpha)
+        other.ewm = self.ewm.copy()
+        other.seed = None if self.seed is None else list(self.seed)
+        return other
+
+
+class IncrementalFeatures:
+    """
+    موتور اندیکاتور حالت‌دار: هر کندل جدید در O(1) به وضعیت اضافه می‌شود
+    و خروجی با TechnicalFeatures.add_all روی همان داده (از همان نقطه شروع) برابر است.
+    اگر آخرین کندل (کندل باز) دوباره با همان زمان ارسال شود، وضعیت rollback و دوباره اعمال می‌شود.
+    وضعیت داخلی float64 است؛ ردیف‌های خروجی در یک FeatureBlock پیش‌تخصیص‌یافته (پیش‌فرض float32) نوشته می‌شوند.
+    """
+    def __init__(self, max_rows=2000, dtype=np.float32, budget_mb=None):
+        self.max_rows = max_rows
+        self.dtype = dtype
+        self.budget_mb = budget_mb
+        self.reset()
+
+    def reset(self):
+        self.columns = None
+        self.index_name = None
+        self.last_timestamp = None
+        self.block = None
+        self._state = self._new_state()
+        self._snapshot = None
+        self._last_emitted = False
+
+    @staticmethod
+    def _new_state():
+        return {
+            'closes': deque(maxlen=50),
+            'volumes': deque(maxlen=20),
+            'prev_high': NAN,
+            'prev_low': NAN,
+            'prev_rsi': NAN,
+            'obv': NAN,
+            'hl_zero': False,
+            'ema_fast': _PresmaEwm(12, 2.0 / 13),
+            'ema_slow': _PresmaEwm(26, 2.0 / 27),
+            'ema_signal': _PresmaEwm(9, 2.0 / 10),
+            'rsi_pos': _Ewm(1.0 / 14),
+            'rsi_neg': _Ewm(1.0 / 14),
+            'atr': _PresmaEwm(14, 1.0 / 14),
+            'adx_atr': _PresmaEwm(14, 1.0 / 14),
+            'adx_pos': _Ewm(1.0 / 14),
+            'adx_neg': _Ewm(1.0 / 14),
+            'adx': _Ewm(1.0 / 14),
+        }
+
+    def seed(self, df: pd.DataFrame) -> pd.DataFrame:
+        """شروع از صفر روی یک دیتافریم کامل (یک بار، O(n))"""
+        self.reset()
+        return self.update_frame(df)
+
+    def update_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        فقط کندل‌های جدیدتر از آخرین کندل ثبت‌شده (و خود آخرین کندل برای اصلاح) اعمال می‌شوند.
+        """
+        if df is None or df.empty:
+            return self.frame()
+
+        if self.columns is not None and list(df.columns) != self.columns:
+            self.reset()
+        self.columns = list(df.columns)
+        self.index_name = df.index.name
+
+        if self.last_timestamp is not None:
+            df = df[df.index >= self.last_timestamp]
+
+        for ts, row in zip(df.index, df.itertuples(index=False, name=None)):
+            self.update(ts, row)
+        return self.frame()
+
+    def update(self, timestamp, candle):
+        """
+        اعمال یک کندل. candle می‌تواند dict یا tuple هم‌ترتیب با self.columns باشد.
+        خروجی: ردیف ویژگی‌ها (dict) یا None اگر هنوز NaN دارد.
+        """
+        if isinstance(candle, dict):
+            if self.columns is None:
+                self.columns = list(candle.keys())
+            values = tuple(candle[c] for c in self.columns)
+        else:
+            if self.columns is None:
+                raise ValueError("Column order unknown: pass a dict or use update_frame/seed first.")
+            values = tuple(candle)
+
+        if self.last_timestamp is not None:
+            if timestamp == self.last_timestamp:
+                self._rollback()
+            elif timestamp < self.last_timestamp:
+                return None
+
+        self._snapshot = (self._copy_state(), self._last_emitted)
+        record = dict(zip(self.columns, values))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features = self._step(record)
+        record.update(features)
+
+        self.last_timestamp = timestamp
+        self._last_emitted = not pd.isna(list(record.values())).any()
+        if self._last_emitted:
+            if self.block is None:
+                self.block = FeatureBlock(record.keys(), self.max_rows, self.dtype, self.budget_mb, self.index_name)
+            self.block.append(timestamp, tuple(record.values()))
+            return record
+        return None
+
+    def _copy_state(self):
+        return {k: (v.copy() if hasattr(v, 'copy') else v) for k, v in self._state.items()}
+
+    def _rollback(self):
+        """بازگرداندن وضعیت به قبل از آخرین کندل (کندل باز که اصلاح شده)"""
+        if self._snapshot is None:
+            return
+        state, emitted = self._snapshot
+        if self._last_emitted:
+            self.block.pop()
+        self._state = state
+        self._last_emitted = emitted
+        self._snapshot = None
+
+    def _step(self, candle):
+        st = self._state
+        high = np.float64(candle['high'])
+        low = np.float64(candle['low'])
+        close = np.float64(candle['close'])
+        volume = np.float64(candle['volume'])
+
+        closes = st['closes']
+        prev_close = closes[-1] if closes else NAN
+        closes.append(close)
+        st['volumes'].append(volume)
+        n = len(closes)
+
+        # 1. Trend
+        sma_20 = np.sum(list(closes)[-20:]) / 20 if n >= 20 else NAN
+        sma_50 = np.sum(closes) / 50 if n >= 50 else NAN
+
+        diff = close - prev_close
+        pos_avg = st['rsi_pos'].update(max(diff, 0.0) if diff == diff else NAN)
+        neg_avg = st['rsi_neg'].update(min(diff, 0.0) if diff == diff else NAN)
+        rsi = 100 * pos_avg / (pos_avg + abs(neg_avg))
+
+        macd_line = st['ema_fast'].update(close) - st['ema_slow'].update(close)
+        macd_signal = st['ema_signal'].update(macd_line) if macd_line == macd_line else NAN
+        macd_hist = macd_line - macd_signal
+
+        # 2. Volatility
+        hl_range = high - low
+        if hl_range == 0:
+            st['hl_zero'] = True
+        if st['hl_zero']:
+            hl_range += EPSILON
+        gaps = [abs(high - prev_close), abs(prev_close - low)] if prev_close == prev_close else []
+        true_range = max([abs(hl_range)] + gaps)
+        atr = st['atr'].update(true_range)
+
+        if n >= 20:
+            window = np.array(list(closes)[-20:])
+            std = np.std(window, ddof=1)
+            bb_upper = sma_20 + 2.0 * std
+            bb_lower = sma_20 - 2.0 * std
+        else:
+            bb_upper = bb_lower = NAN
+
+        # 3. ADX (atr داخلی ADX کندل اول را NaN می‌گیرد: prenan=True)
+        adx_atr = st['adx_atr'].update(true_range if prev_close == prev_close else NAN)
+        up = high - st['prev_high']
+        dn = st['prev_low'] - low
+        if up == up and dn == dn:
+            pos = up if (up > dn and up > 0) else 0.0
+            neg = dn if (dn > up and dn > 0) else 0.0
+            pos = 0.0 if abs(pos) < EPSILON else pos
+            neg = 0.0 if abs(neg) < EPSILON else neg
+        else:
+            pos = neg = NAN
+        k = 100 / adx_atr
+        dmp = k * st['adx_pos'].update(pos)
+        dmn = k * st['adx_neg'].update(neg)
+        dx = 100 * abs(dmp - dmn) / (dmp + dmn)
+        adx = st['adx'].update(dx)
+        st['prev_high'] = high
+        st['prev_low'] = low
+
+        # OBV (کندل اول علامت ندارد و NaN می‌ماند)
+        if prev_close == prev_close:
+            sign = 1.0 if diff > 0 else (-1.0 if diff < 0 else 0.0)
+            signed_volume = sign * volume
+            st['obv'] = signed_volume if st['obv'] != st['obv'] else st['obv'] + signed_volume
+            obv = st['obv']
+        else:
+            obv = NAN
+
+        volumes = st['volumes']
+        vol_ma = np.sum(volumes) / 20 if len(volumes) >= 20 else NAN
+        vol_ratio = volume / vol_ma
+
+        # 4. Ratios & 5. Lags
+        def back(k):
+            return closes[-1 - k] if n > k else NAN
+
+        rsi_diff = rsi - st['prev_rsi']
+        st['prev_rsi'] = rsi
+
+        return {
+            'sma_20': sma_20,
+            'sma_50': sma_50,
+            'rsi': rsi,
+            'macd_line': macd_line,
+            'macd_hist': macd_hist,
+            'macd_signal': macd_signal,
+            'atr': atr,
+            'bb_upper': bb_upper,
+            'bb_lower': bb_lower,
+            'adx': adx,
+            'obv': obv,
+            'vol_ratio': vol_ratio,
+            'price_sma_ratio': close / sma_50,
+            'volatility_ratio': close / prev_close,
+            'pct_change_1h': close / back(1) - 1,
+            'pct_change_3h': close / back(3) - 1,
+            'pct_change_24h': close / back(24) - 1,
+            'rsi_diff': rsi_diff,
+        }
+
+    def frame(self) -> pd.DataFrame:
+        """
+        دیتافریم ویژگی‌ها (حداکثر max_rows ردیف آخر)، هم‌شکل خروجی add_all.
+        view فقط-خواندنی روی FeatureBlock است (بدون کپی)؛ برای تغییر، copy بگیرید.
+        """
+        if self.columns is None:
+            return pd.DataFrame()
+        if self.block is None:
+            columns = self.columns + [c for c in FEATURE_COLUMNS if c not in self.columns]
+            return pd.DataFrame(columns=columns, dtype=self.dtype)
+        return self.block.frame()
@@ -1,13 +1,38 @@
 # src/features/indicators.py
+import numpy as np
 import pandas as pd
-import pandas_ta as ta 
+
+from src.features import kernels
+from src.features.incremental import FEATURE_COLUMNS
 
 class TechnicalFeatures:
     """
     موتور محاسبات برداری (شامل تمامی ویژگی‌های Elite).
+    backend اندیکاتورها (src/features/kernels.py):
+      "numba"     → هسته‌های ewm کامپایل‌شده (پیش‌فرض اگر numba نصب باشد)
+      "numpy"     → NumPy + فیلتر IIR (بدون وابستگی اضافه)
+      "pandas_ta" → مسیر مرجع قبلی (برای اعتبارسنجی؛ pandas_ta فقط همین‌جا import می‌شود)
+    انتخاب: آرگومان backend، وگرنه PIED_PIPER_INDICATORS (پیش‌فرض auto).
     """
     @staticmethod
-    def add_all(df: pd.DataFrame) -> pd.DataFrame:
+    def add_all(df: pd.DataFrame, backend=None) -> pd.DataFrame:
+        backend = kernels.resolve_backend(backend)
+        if backend == "pandas_ta":
+            return TechnicalFeatures.add_all_pandas_ta(df)
+
+        features = kernels.compute_all(df['high'], df['low'], df['close'], df['volume'], backend)
+        # dropna بدون کپی میانی: یک ماسک و یک ساخت نهایی
+        valid = ~df.isna().to_numpy().any(axis=1)
+        for name in FEATURE_COLUMNS:
+            valid &= ~np.isnan(features[name])
+        data = {col: df[col].to_numpy()[valid] for col in df.columns}
+        data.update({name: features[name][valid] for name in FEATURE_COLUMNS})
+        return pd.DataFrame(data, index=df.index[valid])
+
+    @staticmethod
+    def add_all_pandas_ta(df: pd.DataFrame) -> pd.DataFrame:
+        import pandas_ta as ta
+
         df = df.copy()
         
         # 1. Trend Indicators
@@ -0,0 +1,266 @@
+# src/features/kernels.py
+import importlib.util
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# numba فقط در اولین فراخوانی import و کامپایل می‌شود (import آن به تنهایی چند صد میلی‌ثانیه است)
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+# انتخاب backend اندیکاتورها: PIED_PIPER_INDICATORS=auto|numba|numpy|pandas_ta
+BACKEND_ENV = "PIED_PIPER_INDICATORS"
+BACKENDS = ("numba", "numpy", "pandas_ta")
+EPSILON = np.finfo(float).eps   # همان sflt.epsilon در pandas_ta
+CHUNK_ROWS = 65536              # سقف ردیف‌های هر دسته پنجره‌های rolling std (حافظه محدود)
+
+
+def resolve_backend(backend=None):
+    """backend صریح، وگرنه متغیر محیطی، وگرنه auto: numba اگر نصب باشد و گرنه numpy"""
+    name = (backend or os.environ.get(BACKEND_ENV, "") or "auto").strip().lower()
+    if name == "auto":
+        return "numba" if HAS_NUMBA else "numpy"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown indicator backend {name!r}; expected auto or one of {BACKENDS}")
+    if name == "numba" and not HAS_NUMBA:
+        return "numpy"
+    return name
+
+
+# --- هسته بازگشتی: ewm(adjust=False) دقیقاً مثل حلقه داخلی pandas (ignore_na=False)، ستون به ستون ---
+def _ewm_loop(x, alpha):
+    out = np.empty(x.shape)
+    for j in range(x.shape[1]):
+        weighted = np.nan
+        old_wt = 1.0
+        for i in range(x.shape[0]):
+            cur = x[i, j]
+            if weighted == weighted:
+                old_wt *= 1.0 - alpha
+                if cur == cur:
+                    if weighted != cur:
+                        weighted = ((old_wt * weighted) + (alpha * cur)) / (old_wt + alpha)
+                    old_wt = 1.0
+            elif cur == cur:
+                weighted = cur
+            out[i, j] = weighted
+    return out
+
+
+_EWM_NUMBA = None
+
+
+def _ewm_numba(x, alpha):
+    global _EWM_NUMBA
+    if _EWM_NUMBA is None:
+        from numba import njit
+        _EWM_NUMBA = njit(cache=True, nogil=True)(_ewm_loop)
+    return _EWM_NUMBA(x, alpha)
+
+
+def _ewm_numpy(x, alpha):
+    """
+    y[t] = (1-alpha)·y[t-1] + alpha·x[t] با فیلتر IIR (scipy.signal.lfilter روی محور زمان، بدون حلقه پایتون).
+    NaNهای ابتدای هر ستون مثل pandas رد می‌شوند (ستون‌های هم‌شروع در یک فراخوانی)؛
+    ستون‌هایی که وسطشان NaN دارند (نادر) به مسیر حلقه‌ای دقیق می‌روند.
+    """
+    from scipy.signal import lfilter
+
+    out = np.full(x.shape, np.nan)
+    first = _first_valid(x)
+    observed = (x == x).sum(axis=0)
+    dense = (observed > 0) & (observed == len(x) - first)
+    for row in np.unique(first[dense]):
+        cols = np.flatnonzero(dense & (first == row))
+        block = x[row:, cols]
+        out[row, cols] = block[0]
+        if len(block) > 1:
+            out[row + 1:, cols], _ = lfilter([alpha], [1.0, alpha - 1.0], block[1:], axis=0,
+                                             zi=(1.0 - alpha) * block[:1])
+    gaps = np.flatnonzero((observed > 0) & ~dense)
+    if len(gaps):
+        out[:, gaps] = _ewm_loop(x[:, gaps], alpha)
+    return out
+
+
+def ewm(x, alpha, backend="numpy"):
+    """x: (time,) یا (time, symbols)؛ خروجی هم‌شکل ورودی"""
+    x = np.asarray(x, dtype=np.float64)
+    panel = np.asfortranarray(x.reshape(len(x), -1))   # هر ستون پیوسته (حلقه زمان در numba)
+    out = _ewm_numba(panel, alpha) if backend == "numba" else _ewm_numpy(panel, alpha)
+    return out.reshape(x.shape)
+
+
+def _presma_ewm(x, length, alpha, backend, start):
+    """
+    ema/atr در pandas_ta: مقدار length-ام هر ستون (از ردیف start آن) = میانگین (skipna) length مقدار اول،
+    قبل از آن NaN، بعد ewm.
+    """
+    x = np.array(x, dtype=np.float64)
+    seed_row = start + length - 1
+    cols = np.flatnonzero(seed_row < len(x))
+    # سر هر ستون پیوسته (symbols, length) تا جمع دقیقاً مثل nanmean یک‌بعدی باشد
+    head = np.ascontiguousarray(x[start[cols][:, None] + np.arange(length), cols[:, None]])
+    observed = head == head
+    x[np.arange(len(x))[:, None] < seed_row] = np.nan
+    x[seed_row[cols], cols] = np.where(observed, head, 0.0).sum(axis=1) / observed.sum(axis=1)
+    return ewm(x, alpha, backend)
+
+
+# --- ابزار (همه روی محور زمان = محور 0) ---
+def _first_valid(x):
+    """اولین ردیف غیر NaN هر ستون؛ ستون تماماً NaN → len(x)"""
+    observed = x == x
+    return np.where(observed.any(axis=0), observed.argmax(axis=0), len(x))
+
+
+def _shift(x, periods=1):
+    out = np.full(x.shape, np.nan)
+    if periods < len(x):
+        out[periods:] = x[:-periods]
+    return out
+
+
+def _diff(x, periods=1):
+    return x - _shift(x, periods)
+
+
+def sma(x, length):
+    """میانگین متحرک ساده با همان کانولوشن pandas_ta (nb_sma)، هر ستون جدا"""
+    out = np.full(x.shape, np.nan)
+    if len(x) >= length:
+        weights = np.ones(length) / length
+        for j in range(x.shape[1]):
+            out[length - 1:, j] = np.convolve(x[:, j], weights, 'valid')
+    return out
+
+
+def rolling_std(x, length, ddof=1):
+    """
+    انحراف معیار غلتان (rolling(length).std(ddof)) روی view پنجره‌ها، دسته‌به‌دسته.
+    پنجره‌ها روی ترانهاده پیوسته ساخته می‌شوند تا ترتیب جمع با حالت تک‌نماد یکی باشد.
+    """
+    out = np.full(x.shape, np.nan)
+    if len(x) < length:
+        return out
+    windows = sliding_window_view(np.ascontiguousarray(x.T), length, axis=1)
+    step = max(1, CHUNK_ROWS // x.shape[1])
+    for begin in range(0, windows.shape[1], step):
+        block = windows[:, begin:begin + step]
+        out[length - 1 + begin:length - 1 + begin + block.shape[1]] = block.std(axis=-1, ddof=ddof).T
+    return out
+
+
+# --- اندیکاتورها (ورودی/خروجی: آرایه float64 با شکل (time, symbols)؛ start = ردیف شروع هر نماد) ---
+def ema(close, length, start, backend="numpy"):
+    return _presma_ewm(close, length, 2.0 / (length + 1), backend, start)
+
+
+def rma(x, length, backend="numpy"):
+    return ewm(x, 1.0 / length, backend)
+
+
+def rsi(close, length=14, backend="numpy"):
+    if len(close) < length + 1:
+        return np.full(close.shape, np.nan)
+    change = _diff(close)
+    positive = np.where(change < 0, 0.0, change)
+    negative = np.where(change > 0, 0.0, change)
+    positive_avg = rma(positive, length, backend)
+    negative_avg = rma(negative, length, backend)
+    return 100 * positive_avg / (positive_avg + np.abs(negative_avg))
+
+
+def macd(close, start, fast=12, slow=26, signal=9, backend="numpy"):
+    """خروجی: (macd_line, macd_hist, macd_signal)؛ سیگنال از اولین مقدار معتبر خط MACD شروع می‌شود"""
+    line = ema(close, fast, start, backend) - ema(close, slow, start, backend)
+    signal_line = ema(line, signal, _first_valid(line), backend)
+    return line, line - signal_line, signal_line
+
+
+def true_range(high, low, close, start, prenan=False):
+    hl_range = high - low
+    # non_zero_range در pandas_ta: اگر جایی صفر باشد eps به کل سری (همان نماد) اضافه می‌شود
+    hl_range = hl_range + np.where((hl_range == 0).any(axis=0), EPSILON, 0.0)
+    prev_close = _shift(close)
+    tr = np.fmax(np.fmax(np.abs(hl_range), np.abs(high - prev_close)), np.abs(prev_close - low))
+    if prenan:
+        cols = np.flatnonzero(start < len(tr))
+        tr[start[cols], cols] = np.nan
+    return tr
+
+
+def atr(high, low, close, start, length=14, prenan=False, backend="numpy"):
+    return _presma_ewm(true_range(high, low, close, start, prenan), length, 1.0 / length, backend, start)
+
+
+def adx(high, low, close, start, length=14, backend="numpy"):
+    k = 100 / atr(high, low, close, start, length, prenan=True, backend=backend)
+    up = _diff(high)
+    dn = _shift(low) - low
+    positive = np.where((up > dn) & (up > 0), up, 0.0 * up)
+    negative = np.where((dn > up) & (dn > 0), dn, 0.0 * dn)
+    positive = np.where(np.abs(positive) < EPSILON, 0.0, positive)
+    negative = np.where(np.abs(negative) < EPSILON, 0.0, negative)
+
+    dmp = k * rma(positive, length, backend)
+    dmn = k * rma(negative, length, backend)
+    dx = 100 * np.abs(dmp - dmn) / (dmp + dmn)
+    return rma(dx, length, backend)
+
+
+def bbands(close, length=20, std=2.0):
+    """خروجی: (upper, lower) با میانگین ساده و انحراف معیار ddof=1"""
+    mid = sma(close, length)
+    deviation = std * rolling_std(close, length)
+    return mid + deviation, mid - deviation
+
+
+def obv(close, volume, start):
+    signed_volume = np.sign(_diff(close)) * volume
+    out = np.cumsum(np.nan_to_num(signed_volume), axis=0)
+    # کندل اول هر نماد علامت ندارد (NaN)، بقیه cumsum با skipna
+    out[np.arange(len(out))[:, None] < start] = np.nan
+    cols = np.flatnonzero(start < len(out))
+    out[start[cols], cols] = signed_volume[start[cols], cols]
+    return out
+
+
+def compute_all(high, low, close, volume, backend="numpy") -> dict:
+    """
+    همه ستون‌های TechnicalFeatures.add_all (قبل از dropna) به صورت آرایه.
+    ورودی (time,) برای یک نماد یا (time, symbols) برای پنل؛ خروجی هم‌شکل ورودی.
+    در پنل، NaNهای ابتدای هر ستون یعنی نماد هنوز داده نداشته و شروع آن نماد حساب می‌شود
+    (نتیجه هر ستون = add_all روی همان نماد به تنهایی).
+    """
+    shape = np.shape(close)
+    high, low, close, volume = (np.asarray(a, dtype=np.float64).reshape(shape[0], -1)
+                                for a in (high, low, close, volume))
+    start = _first_valid(close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sma_20 = sma(close, 20)
+        sma_50 = sma(close, 50)
+        rsi_14 = rsi(close, 14, backend)
+        macd_line, macd_hist, macd_signal = macd(close, start, 12, 26, 9, backend)
+        bb_upper, bb_lower = bbands(close, 20, 2.0)
+        features = {
+            'sma_20': sma_20,
+            'sma_50': sma_50,
+            'rsi': rsi_14,
+            'macd_line': macd_line,
+            'macd_hist': macd_hist,
+            'macd_signal': macd_signal,
+            'atr': atr(high, low, close, start, 14, backend=backend),
+            'bb_upper': bb_upper,
+            'bb_lower': bb_lower,
+            'adx': adx(high, low, close, start, 14, backend),
+            'obv': obv(close, volume, start),
+            'vol_ratio': volume / sma(volume, 20),
+            'price_sma_ratio': close / sma_50,
+            'volatility_ratio': close / _shift(close, 1),
+            'pct_change_1h': close / _shift(close, 1) - 1,
+            'pct_change_3h': close / _shift(close, 3) - 1,
+            'pct_change_24h': close / _shift(close, 24) - 1,
+            'rsi_diff': _diff(rsi_14),
+        }
+    return {name: values.reshape(shape) for name, values in features.items()}
@@ -0,0 +1,53 @@
+# src/features/multi_timeframe.py
+import pandas as pd
+
+from src.core.types import TimeFrame
+from src.features.incremental import IncrementalFeatures
+from src.ingest.resample import TimeFrameResampler, align_to_base
+
+# ستون‌های زمینه تایم‌فریم بالاتر (بدون مقیاس قیمت تا بین تایم‌فریم‌ها قابل مقایسه باشند)
+MTF_COLUMNS = ['rsi', 'macd_hist', 'adx', 'price_sma_ratio']
+
+
+class MultiTimeframeFeatures:
+    """
+    ویژگی‌های 4h/1d روی ایندکس سری پایه (1h) بدون دریافت جداگانه از شبکه:
+    کندل‌ها با TimeFrameResampler از سری پایه ساخته می‌شوند، اندیکاتورها با یک IncrementalFeatures
+    جدا برای هر تایم‌فریم (فقط کندل باز/جدید در هر چرخه) و نتیجه با align_to_base بدون نگاه به آینده
+    نگاشت می‌شود. نام ستون‌ها: h4_rsi، d1_adx، ...
+    """
+    def __init__(self, base=TimeFrame.H1, timeframes=(TimeFrame.H4, TimeFrame.D1), columns=MTF_COLUMNS,
+                 max_rows=2000):
+        self.resampler = TimeFrameResampler(base, timeframes)
+        self.columns = list(columns)
+        self._engines = {tf: IncrementalFeatures(max_rows=max_rows) for tf in self.resampler.targets}
+
+    @staticmethod
+    def prefix(timeframe):
+        return f"{timeframe.name.lower()}_"
+
+    def update(self, base_df: pd.DataFrame) -> dict:
+        """به‌روزرسانی کندل‌ها و اندیکاتورهای هر تایم‌فریم. خروجی: {timeframe: ویژگی‌ها روی ایندکس همان تایم‌فریم}"""
+        self.resampler.update(base_df)
+        features = {}
+        for tf, engine in self._engines.items():
+            if engine.last_timestamp is None:
+                frame = engine.seed(self.resampler.frame(tf, tail=engine.max_rows))
+            else:
+                # کندل باز قبلی (برای اصلاح/بسته شدن) + کندل‌های جدید
+                frame = engine.update_frame(self.resampler.frame(tf, tail=4))
+            features[tf] = frame.reindex(columns=self.columns)
+        return features
+
+    def transform(self, base_df: pd.DataFrame, index=None) -> pd.DataFrame:
+        """ستون‌های تایم‌فریم بالاتر روی index (پیش‌فرض: ایندکس base_df)"""
+        index = base_df.index if index is None else index
+        parts = [
+            align_to_base(features, tf, index, self.resampler.base).add_prefix(self.prefix(tf))
+            for tf, features in self.update(base_df).items()
+        ]
+        return pd.concat(parts, axis=1)
+
+    def join(self, df: pd.DataFrame, base_df: pd.DataFrame) -> pd.DataFrame:
+        """افزودن ستون‌های تایم‌فریم بالاتر به df (مثلاً خروجی IncrementalFeatures روی همان سری پایه)"""
+        return df.join(self.transform(base_df, df.index))
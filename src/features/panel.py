@@ -0,0 +1,110 @@
+# src/features/panel.py
+import numpy as np
+import pandas as pd
+
+from src.features import kernels
+from src.features.incremental import FEATURE_COLUMNS
+from src.ingest.store import PRICE_COLUMNS
+
+# کانال‌های تنسور: همان ستون‌های خروجی TechnicalFeatures.add_all روی کندل‌های OHLCV
+PANEL_COLUMNS = PRICE_COLUMNS + FEATURE_COLUMNS
+
+
+class FeaturePanel:
+    """
+    تنسور فشرده ویژگی‌های چند نماد: values با شکل (symbols, time, channels) و dtype پیش‌فرض float32.
+    valid[s, t] یعنی add_all این ردیف را نگه می‌داشت (هیچ کانالی NaN نیست).
+    stamps: زمان هر ردیف هر نماد (NaT برای ردیف‌های قبل از شروع تاریخچه آن نماد).
+    """
+    def __init__(self, values, valid, symbols, stamps, columns=PANEL_COLUMNS):
+        self.values = values
+        self.valid = valid
+        self.symbols = list(symbols)
+        self.stamps = stamps
+        self.columns = list(columns)
+        self._position = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.valid.nbytes + self.stamps.nbytes
+
+    def rows(self, symbol) -> np.ndarray:
+        """شماره ردیف‌های معتبر یک نماد (معمولاً یک بازه پیوسته در انتها)"""
+        return np.flatnonzero(self.valid[self._position[symbol]])
+
+    def frame(self, symbol) -> pd.DataFrame:
+        """
+        ویژگی‌های یک نماد مثل خروجی add_all (بعد از dropna)، با dtype تنسور.
+        اگر ردیف‌های معتبر پیوسته باشند (حالت عادی) view بدون کپی است.
+        """
+        s = self._position[symbol]
+        rows = self.rows(symbol)
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            rows = slice(rows[0], rows[-1] + 1)
+        index = pd.DatetimeIndex(self.stamps[s, rows], name='timestamp')
+        return pd.DataFrame(self.values[s, rows], index=index, columns=self.columns, copy=False)
+
+
+class PanelFeatures:
+    """
+    محاسبه همه اندیکاتورهای TechnicalFeatures.add_all برای چند نماد در یک پاس:
+    ورودی آرایه‌های (time, symbols) برای open/high/low/close/volume، هسته‌های src/features/kernels.py
+    روی محور زمان برای همه ستون‌ها با هم، خروجی یک FeaturePanel.
+    NaNهای ابتدای هر ستون یعنی نماد هنوز تاریخچه نداشته؛ نتیجه هر نماد بیت‌به‌بیت همان add_all روی
+    خود آن نماد است.
+    """
+    @staticmethod
+    def compute(open_, high, low, close, volume, symbols=None, stamps=None, dtype=np.float32,
+                backend=None) -> FeaturePanel:
+        backend = kernels.resolve_backend(backend)
+        if backend == "pandas_ta":
+            # pandas_ta فقط مسیر مرجع تک‌نماد است؛ پنل همیشه روی هسته‌ها اجرا می‌شود
+            backend = kernels.resolve_backend("auto")
+        prices = dict(zip(PRICE_COLUMNS, (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close, volume))))
+        n_rows, n_symbols = prices['close'].shape
+        symbols = list(range(n_symbols)) if symbols is None else list(symbols)
+        if stamps is None:
+            stamps = np.full((n_symbols, n_rows), np.datetime64('NaT', 'ns'))
+
+        features = kernels.compute_all(prices['high'], prices['low'], prices['close'], prices['volume'], backend)
+        channels = {**prices, **features}
+
+        # یک تخصیص برای کل تنسور؛ هر کانال (time, symbols) ترانهاده در جای خودش نوشته می‌شود
+        values = np.empty((n_symbols, n_rows, len(PANEL_COLUMNS)), dtype=dtype)
+        for c, name in enumerate(PANEL_COLUMNS):
+            values[:, :, c] = channels[name].T
+        valid = ~np.isnan(values).any(axis=2)
+        return FeaturePanel(values, valid, symbols, stamps)
+
+    @staticmethod
+    def stack(frames: dict, rows=None):
+        """
+        کندل‌های چند نماد ({symbol: DataFrame با ایندکس یا ستون timestamp}) به آرایه‌های (time, symbols).
+        هر نماد راست‌چین می‌شود (آخرین کندل‌ها در ردیف‌های آخر، کمبود تاریخچه = NaN در ابتدا)،
+        پس سری هر نماد پیوسته می‌ماند حتی اگر زمان کندل‌ها بین نمادها کمی فرق کند.
+        خروجی: (symbols، stamps با شکل (symbols, time)، {ستون: آرایه (time, symbols)})
+        """
+        symbols = list(frames)
+        n_rows = rows or max((len(df) for df in frames.values()), default=0)
+
+        # فقط دسترسی ستونی (بدون set_index/reindex هر نماد)
+        arrays = {col: np.full((n_rows, len(symbols)), np.nan) for col in PRICE_COLUMNS}
+        stamps = np.full((len(symbols), n_rows), np.datetime64('NaT', 'ns'))
+        for j, df in enumerate(frames.values()):
+            n = min(len(df), n_rows)
+            if not n:
+                continue
+            for col in PRICE_COLUMNS:
+                arrays[col][n_rows - n:, j] = df[col].to_numpy(dtype=np.float64)[-n:]
+            times = df['timestamp'] if 'timestamp' in df.columns else df.index
+            stamps[j, n_rows - n:] = np.asarray(times, dtype='datetime64[ns]')[-n:]
+        return symbols, stamps, arrays
+
+    @staticmethod
+    def from_frames(frames: dict, rows=None, dtype=np.float32, backend=None) -> FeaturePanel:
+        symbols, stamps, arrays = PanelFeatures.stack(frames, rows)
+        return PanelFeatures.compute(*(arrays[col] for col in PRICE_COLUMNS), symbols=symbols, stamps=stamps,
+                                     dtype=dtype, backend=backend)
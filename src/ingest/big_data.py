@@ -2,20 +2,47 @@
 import pandas as pd
 import numpy as np
 import os
+import time
 from datetime import datetime, timedelta
+from src.ingest.store import CandleStore, STORE_ROOT, PRICE_COLUMNS
+from src.ingest.buffer import HistoryBuffer
+
 
 class BigDataManager:
-    def __init__(self, csv_path="data/history_50k.csv"):
+    def __init__(self, csv_path="data/history_50k.csv", symbol="ETHTMN", timeframe="1h",
+                 store_root=STORE_ROOT, max_rows=50000, persist_interval=300):
         self.csv_path = csv_path
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.store = CandleStore(store_root)
+        self.max_rows = max_rows
+        self.persist_interval = persist_interval
+        self._buffer = None
+        self._last_persist = time.time()
         os.makedirs("data", exist_ok=True)
 
     def get_combined_data(self, live_df: pd.DataFrame, target_size=50000):
         """
         ترکیب هوشمند داده‌ها با تضمین سلامت داده.
+        تاریخچه تمیز یک بار در حافظه ساخته می‌شود و هر بار فقط کندل‌های زنده جدید/هم‌پوشان ادغام می‌شوند.
+        خروجی یک view فقط-خواندنی روی بافر است.
         """
         # 1. تمیزکاری دیتای زنده
         live_df = self._clean_dataframe(live_df)
 
+        if self._buffer is None:
+            self._build_buffer(live_df)
+        elif not live_df.empty:
+            self._merge_delta(live_df)
+
+        self._maybe_persist()
+
+        combined_df = self._buffer.frame(tail=target_size)
+        print(f"📊 Data Merge Stats: Total={len(combined_df)} candles")
+        return combined_df
+
+    def _build_buffer(self, live_df):
+        """ساخت اولیه بافر (همان ادغام کامل قبلی، فقط یک بار)"""
         # 2. بارگذاری تاریخچه
         historical_df = self._load_history()
         historical_df = self._clean_dataframe(historical_df)
@@ -30,22 +57,76 @@ class BigDataManager:
 
         # 4. حذف تکراری‌ها و مرتب‌سازی
         combined_df = combined_df[~combined_df.index.duplicated(keep='last')]
-        combined_df.sort_index(inplace=True)
-        
+        combined_df = combined_df.sort_index()
+
         # 5. --- FIX: استفاده از ffill به جای interpolate ---
         # استفاده از interpolate(method='time') باعث ارور NotImplementedError می‌شد.
         # ffill (Forward Fill) داده‌های گم شده را با آخرین قیمت معتبر پر می‌کند که امن‌تر است.
-        combined_df = combined_df.ffill()
-        
+        combined_df = combined_df.reindex(columns=PRICE_COLUMNS).ffill()
+
         # حذف هرگونه NaN باقی‌مانده (مثلاً در ابتدای دیتا)
-        combined_df.dropna(inplace=True)
+        combined_df = combined_df.dropna()
 
-        # محدود کردن به سایز هدف (مثلا 50 هزار تا) برای جلوگیری از سنگین شدن
-        if len(combined_df) > target_size:
-            combined_df = combined_df.tail(target_size)
+        self._buffer = HistoryBuffer(self.max_rows)
+        self._buffer.load(combined_df)
 
-        print(f"📊 Data Merge Stats: Total={len(combined_df)} candles")
-        return combined_df
+    def _merge_delta(self, live_df):
+        """ادغام فقط کندل‌های زنده‌ای که از آخرین کندل بافر جدیدترند (یا با آن هم‌پوشانی دارند)"""
+        live_df = live_df[~live_df.index.duplicated(keep='last')].sort_index()
+        live_df = live_df.reindex(columns=PRICE_COLUMNS)
+        stamps = live_df.index.as_unit('ns').asi8
+
+        last = self._buffer.last_timestamp
+        if last is not None:
+            # کندل‌های قدیمی‌تر از ابتدای بافر دیگر مهم نیستند
+            keep = stamps >= self._buffer.first_timestamp
+            live_df, stamps = live_df[keep], stamps[keep]
+
+        old = stamps <= last if last is not None else np.zeros(len(stamps), dtype=bool)
+        if old.any():
+            values = live_df[old].ffill().to_numpy(dtype=np.float64).T
+            if np.isnan(values).any() or not self._buffer.overwrite(stamps[old], values):
+                # درج در وسط تاریخچه (نادر): ساخت دوباره از مسیر کامل
+                history = self._buffer.frame().copy()
+                self._buffer = None
+                merged = pd.concat([history, live_df])
+                merged = merged[~merged.index.duplicated(keep='last')].sort_index().ffill().dropna()
+                self._buffer = HistoryBuffer(self.max_rows)
+                self._buffer.load(merged)
+                return
+
+        new_df = live_df[~old]
+        if new_df.empty:
+            return
+        # ffill ادامه آخرین ردیف بافر
+        prev = self._buffer.last_row
+        if prev is not None:
+            new_df = pd.concat([pd.DataFrame([prev], columns=PRICE_COLUMNS), new_df.reset_index(drop=True)]).ffill().iloc[1:]
+        new_df = new_df.to_numpy(dtype=np.float64)
+        valid = ~np.isnan(new_df).any(axis=1)
+        self._buffer.append(stamps[~old][valid], new_df[valid].T)
+
+    def _maybe_persist(self, force=False):
+        """هر persist_interval ثانیه کندل‌های جدید بافر به انبار اضافه می‌شوند تا تاریخچه رشد کند"""
+        if self._buffer is None or not len(self._buffer):
+            return
+        if not force and time.time() - self._last_persist < self.persist_interval:
+            return
+        last = self.store.last_timestamp(self.symbol, self.timeframe)
+        df = self._buffer.frame()
+        if last is not None:
+            df = df[df.index >= last]
+        try:
+            added = self.store.append(self.symbol, self.timeframe, df)
+            if added:
+                print(f"💾 History grew by {added} candles.")
+        except Exception as e:
+            print(f"⚠️ History persist failed: {e}")
+        self._last_persist = time.time()
+
+    def flush(self):
+        """ذخیره فوری کندل‌های جدید (مثلاً هنگام خروج)"""
+        self._maybe_persist(force=True)
 
     def _clean_dataframe(self, df):
         """
@@ -54,6 +135,10 @@ class BigDataManager:
         if df is None or df.empty:
             return pd.DataFrame()
 
+        # دیتای زنده Wallex زمان را در ستون timestamp دارد (ایندکس RangeIndex است)
+        if 'timestamp' in df.columns and not isinstance(df.index, pd.DatetimeIndex):
+            df = df.set_index('timestamp')
+
         # اطمینان از اینکه ایندکس زمان است
         if not isinstance(df.index, pd.DatetimeIndex):
             try:
@@ -61,7 +146,7 @@ class BigDataManager:
                 df.index = pd.to_datetime(df.index)
             except:
                 return pd.DataFrame() # اگر تبدیل نشد، دیتای خراب برگردان
-        
+
         # حذف تایم‌زون
         if df.index.tz is not None:
             df.index = df.index.tz_localize(None)
@@ -74,20 +159,26 @@ class BigDataManager:
 
         # حذف ردیف‌هایی که قیمت یا حجم ندارند (NaN شدند)
         df.dropna(subset=['close', 'volume'], inplace=True)
-        
+
         return df
 
+    def load_history(self):
+        """تاریخچه کامل از انبار ستونی (memmap، بدون parse)"""
+        self._load_history()
+        return self.store.load(self.symbol, self.timeframe)
+
     def _load_history(self):
-        if os.path.exists(self.csv_path):
+        # مهاجرت یک‌باره از CSV قدیمی به انبار ستونی
+        if not self.store.exists(self.symbol, self.timeframe) and os.path.exists(self.csv_path):
             try:
-                # خواندن CSV با پارس کردن صحیح ایندکس
-                df = pd.read_csv(self.csv_path, index_col=0, parse_dates=True)
-                return df
+                self.store.migrate_csv(self.csv_path, self.symbol, self.timeframe)
             except Exception as e:
-                print(f"⚠️ Corrupt CSV: {e}. Starting fresh.")
-                # اگر فایل خراب بود حذفش کن
-                try:
-                    os.remove(self.csv_path)
-                except: pass
+                # CSV تنها نسخه تاریخچه است: نگه داشته می‌شود تا اجرای بعدی دوباره تلاش کند
+                print(f"⚠️ CSV migration failed: {e}. Keeping {self.csv_path}, will retry on next start.")
                 return pd.DataFrame()
-        return pd.DataFrame()
\ No newline at end of file
+
+        try:
+            return self.store.load(self.symbol, self.timeframe, tail=self.max_rows)
+        except Exception as e:
+            print(f"⚠️ Store read failed: {e}")
+            return pd.DataFrame()
@@ -0,0 +1,111 @@
+# src/ingest/buffer.py
+import numpy as np
+import pandas as pd
+
+from src.ingest.store import PRICE_COLUMNS
+
+
+class CompactingBuffer:
+    """
+    پایه بافرهای پیوسته زمانی: زمان‌ها (int64) و مقادیر یک بار با ظرفیت 2×capacity رزرو می‌شوند و
+    ردیف‌های زنده بازه [start, end) هستند. وقتی انتها پر شد، capacity ردیف آخر به ابتدا منتقل می‌شود
+    (هزینه سرشکن O(1)) تا برش‌ها همیشه view پیوسته و بدون کپی باشند.
+    time_axis: محور زمان در _data (0: ردیف‌ها × ستون‌ها، 1: ستون‌ها × ردیف‌ها)
+    """
+    time_axis = 0
+
+    def _allocate(self, capacity, n_columns, dtype):
+        self.capacity = capacity
+        self._ts = np.empty(2 * capacity, dtype=np.int64)
+        shape = (2 * capacity, n_columns) if self.time_axis == 0 else (n_columns, 2 * capacity)
+        self._data = np.empty(shape, dtype=dtype)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _rows(self, start, stop):
+        rows = slice(start, stop)
+        return rows if self.time_axis == 0 else (slice(None), rows)
+
+    def _make_room(self, n):
+        """جا برای n ردیف جدید در انتها (n <= capacity)؛ در صورت نیاز capacity ردیف آخر به ابتدا می‌روند"""
+        if self.end + n > len(self._ts):
+            keep = min(len(self), self.capacity)
+            self._ts[:keep] = self._ts[self.end - keep:self.end]
+            self._data[self._rows(0, keep)] = self._data[self._rows(self.end - keep, self.end)]
+            self.start, self.end = 0, keep
+
+    def _advance(self, n):
+        """ثبت n ردیف نوشته‌شده در انتها؛ قدیمی‌ترها از بازه زنده بیرون می‌روند"""
+        self.end += n
+        if len(self) > self.capacity:
+            self.start = self.end - self.capacity
+
+
+class HistoryBuffer(CompactingBuffer):
+    """
+    بافر پیوسته برای تاریخچه تمیز و مرتب OHLCV (ستون‌ها روی محور 0، زمان روی محور 1).
+    استفاده: BigDataManager و TimeFrameResampler.
+    """
+    time_axis = 1
+
+    def __init__(self, capacity, columns=PRICE_COLUMNS):
+        self.columns = list(columns)
+        self._allocate(capacity, len(self.columns), np.float64)
+
+    @property
+    def last_timestamp(self):
+        return int(self._ts[self.end - 1]) if len(self) else None
+
+    @property
+    def first_timestamp(self):
+        return int(self._ts[self.start]) if len(self) else None
+
+    @property
+    def last_row(self):
+        return self._data[:, self.end - 1] if len(self) else None
+
+    def load(self, df: pd.DataFrame):
+        df = df.tail(self.capacity)
+        n = len(df)
+        self._ts[:n] = df.index.as_unit('ns').asi8
+        for j, col in enumerate(self.columns):
+            self._data[j, :n] = df[col].to_numpy(dtype=np.float64)
+        self.start, self.end = 0, n
+
+    def overwrite(self, stamps, values) -> bool:
+        """بازنویسی ردیف‌های موجود؛ اگر زمانی در بافر نبود (درج وسط) False برمی‌گرداند"""
+        ts = self._ts[self.start:self.end]
+        pos = np.searchsorted(ts, stamps)
+        inside = pos < len(ts)
+        if not inside.all() or not np.array_equal(ts[pos], stamps):
+            return False
+        self._data[:, self.start + pos] = values
+        return True
+
+    def append(self, stamps, values):
+        n = len(stamps)
+        if n == 0:
+            return
+        if n >= self.capacity:
+            self._ts[:self.capacity] = stamps[-self.capacity:]
+            self._data[:, :self.capacity] = values[:, -self.capacity:]
+            self.start, self.end = 0, self.capacity
+            return
+        self._make_room(n)
+        self._ts[self.end:self.end + n] = stamps
+        self._data[:, self.end:self.end + n] = values
+        self._advance(n)
+
+    def frame(self, tail=None) -> pd.DataFrame:
+        """دیتافریم فقط-خواندنی روی بافر (بدون کپی ستون‌ها)"""
+        start = max(self.start, self.end - tail) if tail else self.start
+        data = {}
+        for j, col in enumerate(self.columns):
+            view = self._data[j, start:self.end]
+            view.flags.writeable = False
+            data[col] = view
+        index = pd.DatetimeIndex(self._ts[start:self.end].view('datetime64[ns]'), name='timestamp')
+        return pd.DataFrame(data, index=index, copy=False)
@@ -0,0 +1,121 @@
+# src/ingest/ratelimit.py
+import asyncio
+import bisect
+import random
+import threading
+import time
+
+# مرزهای هیستوگرام تأخیر (میلی‌ثانیه)
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, float("inf")]
+
+# وضعیت‌هایی که ارزش تلاش دوباره دارند
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# سقف تأخیر هر تلاش دوباره (ثانیه)
+BACKOFF_CAP = 20.0
+
+
+class TokenBucket:
+    """
+    محدودکننده نرخ سطل توکن (rate درخواست در ثانیه، حداکثر burst پشت سر هم).
+    حسابداری با threading.Lock انجام می‌شود و انتظار بیرون از قفل است،
+    پس یک سطل بین تردها، event loopها و کد sync (مثل miner) مشترک است.
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate=5.0, burst=10):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, name, rate=5.0, burst=10):
+        """یک سطل سراسری برای هر نام (مثلاً یک صرافی)"""
+        with cls._shared_lock:
+            if name not in cls._shared:
+                cls._shared[name] = cls(rate, burst)
+            return cls._shared[name]
+
+    def _reserve(self):
+        """یک توکن رزرو می‌کند و مدت انتظار لازم (ثانیه) را برمی‌گرداند"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def acquire_sync(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class ConnectorMetrics:
+    """شمارنده‌ها و هیستوگرام تأخیر درخواست‌ها (thread-safe)"""
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def shared(cls, name):
+        with cls._shared_lock:
+            if name not in cls._shared:
+                cls._shared[name] = cls()
+            return cls._shared[name]
+
+    def reset(self):
+        with self._lock:
+            self.counters = {
+                "requests": 0, "retries": 0, "status_429": 0, "status_5xx": 0,
+                "timeouts": 0, "errors": 0, "coalesced": 0, "throttled": 0,
+            }
+            self.latency_hist = [0] * len(LATENCY_BUCKETS_MS)
+            self.latency_sum_ms = 0.0
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, latency_ms):
+        with self._lock:
+            self.latency_hist[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            self.latency_sum_ms += latency_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            observed = sum(self.latency_hist)
+            return {
+                **self.counters,
+                "latency_hist": {
+                    ("+Inf" if bound == float("inf") else f"<={bound}ms"): count
+                    for bound, count in zip(LATENCY_BUCKETS_MS, self.latency_hist)
+                },
+                "latency_avg_ms": self.latency_sum_ms / observed if observed else 0.0,
+            }
+
+
+def backoff_delay(attempt, base=0.5, cap=BACKOFF_CAP, retry_after=None):
+    """
+    تأخیر تلاش دوباره: exponential با full jitter؛ اگر سرور Retry-After داد همان رعایت می‌شود.
+    """
+    if retry_after is not None:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,202 @@
+# src/ingest/resample.py
+import numpy as np
+import pandas as pd
+
+from src.core.types import TimeFrame
+from src.ingest.buffer import HistoryBuffer
+from src.ingest.store import PRICE_COLUMNS
+
+TIMEFRAME_MINUTES = {
+    TimeFrame.M1: 1, TimeFrame.M5: 5, TimeFrame.M15: 15,
+    TimeFrame.H1: 60, TimeFrame.H4: 240, TimeFrame.D1: 1440,
+}
+# طول هر تایم‌فریم (نانوثانیه). مرز کندل‌ها از epoch حساب می‌شود (روزانه: نیمه‌شب UTC)
+TIMEFRAME_NS = {tf: minutes * 60 * 10**9 for tf, minutes in TIMEFRAME_MINUTES.items()}
+
+# جایگاه ستون‌ها در آرایه (len(PRICE_COLUMNS), n)
+OPEN, HIGH, LOW, CLOSE, VOLUME = (PRICE_COLUMNS.index(c) for c in ['open', 'high', 'low', 'close', 'volume'])
+
+
+def to_timeframe(timeframe) -> TimeFrame:
+    return timeframe if isinstance(timeframe, TimeFrame) else TimeFrame(timeframe)
+
+
+def _aggregate(stamps, values, period):
+    """
+    تجمیع برداری کندل‌های مرتب به کندل‌های period (بدون groupby).
+    خروجی: (زمان باز شدن هر کندل، آرایه (len(PRICE_COLUMNS), n_bars))
+    """
+    if len(stamps) == 0:
+        return np.empty(0, dtype=np.int64), np.empty((len(PRICE_COLUMNS), 0))
+    buckets = stamps - stamps % period
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(stamps)] - 1
+
+    bars = np.empty((len(PRICE_COLUMNS), len(starts)))
+    bars[OPEN] = values[OPEN, starts]
+    bars[HIGH] = np.maximum.reduceat(values[HIGH], starts)
+    bars[LOW] = np.minimum.reduceat(values[LOW], starts)
+    bars[CLOSE] = values[CLOSE, ends]
+    bars[VOLUME] = np.add.reduceat(values[VOLUME], starts)
+    return buckets[starts], bars
+
+
+def _values(df):
+    return df.reindex(columns=PRICE_COLUMNS).to_numpy(dtype=np.float64).T
+
+
+def _frame(stamps, values):
+    index = pd.DatetimeIndex(np.asarray(stamps).view('datetime64[ns]'), name='timestamp')
+    return pd.DataFrame(values.T, index=index, columns=PRICE_COLUMNS)
+
+
+def resample_ohlcv(df: pd.DataFrame, timeframe) -> pd.DataFrame:
+    """
+    تبدیل یک‌باره کندل‌ها به تایم‌فریم بالاتر (ایندکس = زمان باز شدن کندل).
+    کندل آخر ممکن است باز (ناقص) باشد؛ برای حالت زنده از TimeFrameResampler استفاده کنید.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+    stamps, bars = _aggregate(df.index.as_unit('ns').asi8, _values(df), TIMEFRAME_NS[to_timeframe(timeframe)])
+    return _frame(stamps, bars)
+
+
+def partial_bars(df: pd.DataFrame, timeframe) -> pd.DataFrame:
+    """
+    کندل در حال شکل‌گیری تایم‌فریم بالاتر «تا همین ردیف» برای هر ردیف سری پایه.
+    ردیف i فقط از ردیف‌های <= i استفاده می‌کند (بدون نگاه به آینده)؛ هم‌ایندکس با df.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+    stamps = df.index.as_unit('ns').asi8
+    period = TIMEFRAME_NS[to_timeframe(timeframe)]
+    buckets = stamps - stamps % period
+    values = _values(df)
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    lengths = np.diff(np.r_[starts, len(stamps)])
+    groups = np.repeat(np.arange(len(starts)), lengths)
+
+    running = pd.DataFrame({'high': values[HIGH], 'low': values[LOW], 'volume': values[VOLUME]}).groupby(groups)
+    return pd.DataFrame({
+        'open': np.repeat(values[OPEN, starts], lengths),
+        'high': running['high'].cummax().to_numpy(),
+        'low': running['low'].cummin().to_numpy(),
+        'close': values[CLOSE],
+        'volume': running['volume'].cumsum().to_numpy(),
+    }, index=df.index)[PRICE_COLUMNS]
+
+
+def align_to_base(htf: pd.DataFrame, timeframe, base_index: pd.DatetimeIndex, base_timeframe) -> pd.DataFrame:
+    """
+    نگاشت ستون‌های تایم‌فریم بالاتر (ایندکس = زمان باز شدن کندل) روی ایندکس سری پایه بدون نگاه به آینده:
+    هر ردیف پایه آخرین کندل بالاتری را می‌بیند که تا زمان بسته شدن همان ردیف بسته شده است
+    (کندل 4h ساعت 08:00 از ردیف 1h ساعت 11:00 به بعد دیده می‌شود، نه زودتر).
+    """
+    ready = htf.index.as_unit('ns').asi8 + TIMEFRAME_NS[to_timeframe(timeframe)]
+    base_close = base_index.as_unit('ns').asi8 + TIMEFRAME_NS[to_timeframe(base_timeframe)]
+    pos = np.searchsorted(ready, base_close, side='right') - 1
+
+    # dtype ورودی حفظ می‌شود (float32 برای FeatureBlock)
+    values = htf.to_numpy(dtype=np.result_type(np.float32, *htf.dtypes))
+    aligned = np.full((len(base_index), htf.shape[1]), np.nan, dtype=values.dtype)
+    known = pos >= 0
+    aligned[known] = values[pos[known]]
+    return pd.DataFrame(aligned, index=base_index, columns=htf.columns)
+
+
+class TimeFrameResampler:
+    """
+    نگهداری افزایشی تایم‌فریم‌های بالاتر از یک سری پایه (مثلاً 1h یا 1m از CandleStore) بدون درخواست شبکه.
+    هر سطح از سطح ریزتر قبلی ساخته می‌شود (15m → 1h → 4h → 1d). در هر update فقط کندل‌هایی که
+    ممکن است تغییر کرده باشند (از ابتدای کندل باز هر سطح) دوباره تجمیع و در بافر بازنویسی/اضافه می‌شوند.
+    آخرین کندل هر سطح تا رسیدن داده پایه دوره بعد «باز» است (closed_only در frame).
+    """
+    def __init__(self, base=TimeFrame.H1, targets=None, max_rows=50000, revise_rows=3):
+        self.base = to_timeframe(base)
+        base_minutes = TIMEFRAME_MINUTES[self.base]
+        if targets is None:
+            targets = [tf for tf in TimeFrame if TIMEFRAME_MINUTES[tf] > base_minutes]
+        self.targets = sorted({to_timeframe(tf) for tf in targets}, key=TIMEFRAME_MINUTES.get)
+
+        previous = self.base
+        for tf in self.targets:
+            if TIMEFRAME_MINUTES[tf] <= TIMEFRAME_MINUTES[previous] or TIMEFRAME_NS[tf] % TIMEFRAME_NS[previous]:
+                raise ValueError(f"Cannot build {tf.value} from {previous.value} candles")
+            previous = tf
+
+        self.max_rows = max_rows
+        # چند ردیف آخر پایه همیشه دوباره خوانده می‌شوند (کندل باز / اصلاح هم‌پوشانی دریافت زنده)
+        self.revise_rows = revise_rows
+        self._buffers = {tf: HistoryBuffer(max_rows) for tf in self.targets}
+        self._base_last = None
+
+    def update(self, base_df: pd.DataFrame) -> dict:
+        """
+        base_df: کل سری پایه مرتب (مثلاً view خروجی BigDataManager.get_combined_data)؛ فقط انتهای آن خوانده می‌شود.
+        خروجی: {timeframe: زمان اولین کندلی که دوباره محاسبه شد}
+        """
+        if base_df is None or base_df.empty:
+            return {}
+        stamps = base_df.index.as_unit('ns').asi8
+        rebuild = self._base_last is None or stamps[-1] < self._base_last
+        if rebuild:
+            since = int(stamps[0])
+        else:
+            since = int(stamps[max(0, np.searchsorted(stamps, self._base_last) - self.revise_rows)])
+
+        changed = {}
+        source = base_df
+        for tf in self.targets:
+            since = self._update_level(tf, source, since, rebuild)
+            changed[tf] = pd.Timestamp(since)
+            source = self._buffers[tf].frame()
+        self._base_last = int(stamps[-1])
+        return changed
+
+    def _update_level(self, tf, source, since, rebuild):
+        period = TIMEFRAME_NS[tf]
+        src_stamps = source.index.as_unit('ns').asi8
+        buffer = self._buffers[tf]
+
+        if rebuild or not len(buffer):
+            stamps, bars = _aggregate(src_stamps, _values(source), period)
+            if len(stamps) and src_stamps[0] % period:
+                # اولین کندل از وسط دوره شروع شده (ابتدای داده)؛ ناقص است و کنار گذاشته می‌شود
+                stamps, bars = stamps[1:], bars[:, 1:]
+            buffer.load(_frame(stamps, bars))
+            return int(stamps[0]) if len(stamps) else since
+
+        start = since - since % period
+        tail = source.iloc[np.searchsorted(src_stamps, start):]
+        stamps, bars = _aggregate(tail.index.as_unit('ns').asi8, _values(tail), period)
+        old = stamps <= buffer.last_timestamp
+        if old.any() and not buffer.overwrite(stamps[old], bars[:, old]):
+            return self._update_level(tf, source, since, rebuild=True)
+        buffer.append(stamps[~old], bars[:, ~old])
+        return start
+
+    def is_closed(self, timeframe, bar_start, now=None) -> bool:
+        """
+        آیا کندل bar_start از این تایم‌فریم بسته شده است؟ کندل‌های قبل از آخرین همیشه بسته‌اند؛
+        آخرین کندل فقط وقتی که داده پایه تا انتهای دوره رسیده و now (UTC) هم از پایان آن گذشته باشد.
+        """
+        tf = to_timeframe(timeframe)
+        buffer = self._buffers[tf]
+        start = pd.Timestamp(bar_start).value
+        if not len(buffer) or start < buffer.last_timestamp:
+            return True
+        end = start + TIMEFRAME_NS[tf]
+        base_end = self._base_last + TIMEFRAME_NS[self.base]
+        return now is not None and base_end >= end and pd.Timestamp(now).value >= end
+
+    def frame(self, timeframe, tail=None, closed_only=False, now=None) -> pd.DataFrame:
+        """کندل‌های یک تایم‌فریم (view فقط-خواندنی)؛ closed_only کندل باز آخر را حذف می‌کند"""
+        tf = to_timeframe(timeframe)
+        buffer = self._buffers[tf]
+        if not len(buffer):
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+        bars = buffer.frame(tail=tail)
+        if closed_only and not self.is_closed(tf, bars.index[-1], now):
+            bars = bars.iloc[:-1]
+        return bars
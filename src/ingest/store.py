@@ -0,0 +1,188 @@
+# src/ingest/store.py
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.core.utils import LOGGER
+
+STORE_ROOT = "data/store"
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class CandleStore:
+    """
+    انبار ستونی و فقط-افزودنی کندل‌ها (جایگزین history_50k.csv).
+    هر symbol/timeframe یک پوشه دارد: یک فایل باینری خام برای هر ستون + meta.json.
+    بارگذاری با np.memmap انجام می‌شود (بدون parse و بدون کپی ستون‌ها).
+    """
+    def __init__(self, root=STORE_ROOT):
+        self.root = root
+
+    def _dir(self, symbol, timeframe):
+        return os.path.join(self.root, symbol.upper(), timeframe)
+
+    def _read_meta(self, symbol, timeframe):
+        path = os.path.join(self._dir(symbol, timeframe), "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, symbol, timeframe, meta):
+        # نوشتن اتمیک: تعداد ردیف‌ها فقط بعد از نوشتن کامل ستون‌ها به‌روز می‌شود
+        folder = self._dir(symbol, timeframe)
+        tmp = os.path.join(folder, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(folder, "meta.json"))
+
+    def exists(self, symbol, timeframe):
+        return self._read_meta(symbol, timeframe) is not None
+
+    def count(self, symbol, timeframe):
+        meta = self._read_meta(symbol, timeframe)
+        return meta['rows'] if meta else 0
+
+    def _column(self, symbol, timeframe, name, dtype, rows):
+        path = os.path.join(self._dir(symbol, timeframe), f"{name}.bin")
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+    def last_timestamp(self, symbol, timeframe):
+        rows = self.count(symbol, timeframe)
+        if rows == 0:
+            return None
+        ts = self._column(symbol, timeframe, "timestamp", np.int64, rows)
+        return pd.Timestamp(int(ts[-1]))
+
+    def load(self, symbol, timeframe, tail=None) -> pd.DataFrame:
+        """
+        دیتافریم با ایندکس زمانی؛ ستون‌ها view فقط-خواندنی روی memmap هستند.
+        :param tail: فقط n ردیف آخر (بدون خواندن بقیه فایل)
+        """
+        meta = self._read_meta(symbol, timeframe)
+        if not meta or meta['rows'] == 0:
+            return pd.DataFrame()
+
+        rows = meta['rows']
+        start = max(0, rows - tail) if tail else 0
+
+        ts = self._column(symbol, timeframe, "timestamp", np.int64, rows)[start:]
+        data = {
+            col: self._column(symbol, timeframe, col, np.float64, rows)[start:]
+            for col in meta['columns']
+        }
+        index = pd.DatetimeIndex(np.asarray(ts).view('datetime64[ns]'), name='timestamp')
+        return pd.DataFrame(data, index=index, copy=False)
+
+    def append(self, symbol, timeframe, df: pd.DataFrame) -> int:
+        """
+        فقط ردیف‌های جدیدتر از آخرین کندل ذخیره‌شده نوشته می‌شوند.
+        اگر اولین ردیف هم‌زمان با آخرین کندل ذخیره‌شده باشد (کندل باز)، همان ردیف بازنویسی می‌شود.
+        خروجی: تعداد ردیف‌های جدید.
+        """
+        if df is None or df.empty:
+            return 0
+
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        folder = self._dir(symbol, timeframe)
+        os.makedirs(folder, exist_ok=True)
+
+        meta = self._read_meta(symbol, timeframe) or {'rows': 0, 'columns': PRICE_COLUMNS}
+        columns = meta['columns']
+        rows = meta['rows']
+        stamps = df.index.as_unit('ns').asi8
+
+        if rows:
+            last = int(self._column(symbol, timeframe, "timestamp", np.int64, rows)[-1])
+            if stamps[0] <= last and last in stamps:
+                # اصلاح کندل باز: بازنویسی درجا
+                pos = (rows - 1) * 8
+                row = df.iloc[int(np.flatnonzero(stamps == last)[0])]
+                for col in columns:
+                    with open(os.path.join(folder, f"{col}.bin"), "r+b") as f:
+                        f.seek(pos)
+                        f.write(np.float64(row[col]).tobytes())
+            keep = stamps > last
+            df = df[keep]
+            stamps = stamps[keep]
+
+        if df.empty:
+            return 0
+
+        # اگر append قبلی نیمه‌کاره مانده، بایت‌های اضافه (بعد از rows) دور ریخته می‌شوند
+        for name in ["timestamp"] + columns:
+            path = os.path.join(folder, f"{name}.bin")
+            if os.path.exists(path) and os.path.getsize(path) != rows * 8:
+                with open(path, "r+b") as f:
+                    f.truncate(rows * 8)
+
+        with open(os.path.join(folder, "timestamp.bin"), "ab") as f:
+            f.write(np.ascontiguousarray(stamps, dtype=np.int64).tobytes())
+        for col in columns:
+            values = df[col].to_numpy(dtype=np.float64) if col in df.columns else np.full(len(df), np.nan)
+            with open(os.path.join(folder, f"{col}.bin"), "ab") as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+
+        meta['rows'] = rows + len(df)
+        self._write_meta(symbol, timeframe, meta)
+        return len(df)
+
+    def replace(self, symbol, timeframe, df: pd.DataFrame) -> int:
+        """
+        بازنویسی کامل یک symbol/timeframe (مثلاً بعد از اضافه شدن تاریخچه قدیمی‌تر).
+        در پوشه موقت نوشته و سپس جابه‌جا می‌شود تا خواننده‌ها هیچ‌وقت نیمه‌کاره نبینند.
+        """
+        tmp_store = self._tmp_store(symbol, timeframe)
+        rows = tmp_store.append(symbol, timeframe, df)
+        self._swap_in(tmp_store, symbol, timeframe)
+        return rows
+
+    def _tmp_store(self, symbol, timeframe):
+        """انبار موقت خالی (data/store/_tmp) برای ساختن یک symbol/timeframe قبل از جابه‌جایی"""
+        tmp_store = CandleStore(os.path.join(self.root, "_tmp"))
+        shutil.rmtree(tmp_store._dir(symbol, timeframe), ignore_errors=True)
+        return tmp_store
+
+    def _swap_in(self, tmp_store, symbol, timeframe):
+        folder = self._dir(symbol, timeframe)
+        old = folder + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(folder):
+            os.replace(folder, old)
+        os.makedirs(os.path.dirname(folder), exist_ok=True)
+        os.replace(tmp_store._dir(symbol, timeframe), folder)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def migrate_csv(self, csv_path, symbol, timeframe) -> int:
+        """
+        انتقال یک‌باره history_50k.csv به انبار ستونی.
+        در پوشه موقت ساخته می‌شود و فقط اگر تعداد ردیف‌های meta.json با CSV یکی باشد جابه‌جا می‌شود؛
+        در غیر این صورت خطا می‌دهد و پوشه نهایی دست نمی‌خورد (CSV هم هیچ‌وقت اینجا حذف نمی‌شود).
+        """
+        if self.exists(symbol, timeframe) or not os.path.exists(csv_path):
+            return 0
+        df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        df.index = pd.to_datetime(df.index)
+        if df.index.tz is not None:
+            df.index = df.index.tz_localize(None)
+        for col in PRICE_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        expected = int((~df.index.duplicated()).sum())
+
+        tmp_store = self._tmp_store(symbol, timeframe)
+        try:
+            added = tmp_store.append(symbol, timeframe, df)
+            written = tmp_store.count(symbol, timeframe)
+            if written != expected:
+                raise IOError(f"migrated {written} rows, CSV has {expected}")
+        except Exception:
+            shutil.rmtree(tmp_store._dir(symbol, timeframe), ignore_errors=True)
+            raise
+        self._swap_in(tmp_store, symbol, timeframe)
+        LOGGER.info(f"STORE: Migrated {added} candles from {csv_path} to {self._dir(symbol, timeframe)}")
+        return added
@@ -1,31 +1,166 @@
 # src/ingest/wallex.py
+import asyncio
 import pandas as pd
 import time
 import aiohttp
 import requests
 from .base import BaseConnector
+from .ratelimit import TokenBucket, ConnectorMetrics, backoff_delay, RETRY_STATUSES, BACKOFF_CAP
 from src.core.types import OHLCV_COLUMNS
 from src.core.utils import LOGGER
 
+WALLEX_API = "https://api.wallex.ir"
+TIMEFRAME_MINUTES = {'15m': 15, '1h': 60, '4h': 240}
+# مهلت هر تلاش (ثانیه)؛ مهلت کل با تلاش‌های دوباره: WallexConnector.retry_budget
+OHLCV_TIMEOUT = 15
+MACRO_TIMEOUT = 10
+# منابعی که از _get_json (با تلاش دوباره) می‌گذرند
+RETRIED_SOURCES = ("ohlcv", "macro")
+
+
+class WallexRequestError(Exception):
+    """خطای نهایی یک درخواست (بعد از تمام تلاش‌ها)"""
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
 class WallexConnector(BaseConnector):
-    def __init__(self):
+    def __init__(self, api_root=WALLEX_API, rate=5.0, burst=10, max_retries=4, backoff_base=0.5):
         super().__init__("Wallex")
-        self.base_url = "https://api.wallex.ir/v1/udf/history"
-        self.market_url = "https://api.wallex.ir/v1/markets"
+        self.api_root = api_root.rstrip('/')
+        self.base_url = f"{self.api_root}/v1/udf/history"
+        self.market_url = f"{self.api_root}/v1/markets"
         # تنظیمات اتصال (بدون پروکسی برای سرور ایران)
         self.proxies = {"http": None, "https": None}
 
+        # محدودکننده نرخ و آمار مشترک بین همه نمونه‌ها/تردهایی که به همین آدرس وصل می‌شوند
+        self.limiter = TokenBucket.shared(self.api_root, rate, burst)
+        self.metrics = ConnectorMetrics.shared(self.api_root)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        # درخواست‌های یکسان در حال اجرا (coalescing)
+        self._inflight = {}
+
+    def retry_budget(self, timeout):
+        """
+        بیشترین زمان یک _get_json با مهلت timeout برای هر تلاش: max_retries+1 تلاش به علاوه سقف
+        backoff تصادفی بین آن‌ها. asyncio.wait_for بیرونی باید حداقل این باشد وگرنه تلاش دوباره‌ای اجرا نمی‌شود.
+        """
+        backoff = sum(min(BACKOFF_CAP, self.backoff_base * 2 ** attempt) for attempt in range(self.max_retries))
+        return (self.max_retries + 1) * timeout + backoff
+
+    def fetch_budgets(self, timeouts):
+        """مهلت کل هر منبع ({نام: مهلت هر تلاش}): منابع RETRIED_SOURCES با retry_budget، بقیه همان مهلت"""
+        return {name: self.retry_budget(timeout) if name in RETRIED_SOURCES else timeout
+                for name, timeout in timeouts.items()}
+
+    async def _get_json(self, url, params=None, timeout=OHLCV_TIMEOUT):
+        """GET با محدودیت نرخ و تلاش دوباره (429/5xx/timeout) با backoff تصادفی"""
+        if not self.session:
+            raise RuntimeError("Session not started.")
+
+        for attempt in range(self.max_retries + 1):
+            if await self.limiter.acquire() > 0:
+                self.metrics.inc("throttled")
+            self.metrics.inc("requests")
+            start = time.perf_counter()
+            retry_after = None
+            try:
+                async with self.session.get(url, params=params,
+                                            timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    self.metrics.observe((time.perf_counter() - start) * 1000)
+                    if response.status == 200:
+                        return await response.json(content_type=None)
+                    if response.status not in RETRY_STATUSES:
+                        self.metrics.inc("errors")
+                        raise WallexRequestError(f"HTTP {response.status}", response.status)
+                    self.metrics.inc("status_429" if response.status == 429 else "status_5xx")
+                    retry_after = response.headers.get("Retry-After")
+                    error = WallexRequestError(f"HTTP {response.status}", response.status)
+            except asyncio.TimeoutError:
+                self.metrics.inc("timeouts")
+                error = WallexRequestError("Timeout")
+            except aiohttp.ClientConnectionError as e:
+                self.metrics.inc("errors")
+                error = WallexRequestError(f"Connection error: {e}")
+
+            if attempt == self.max_retries:
+                raise error
+            self.metrics.inc("retries")
+            delay = backoff_delay(attempt, self.backoff_base, retry_after=retry_after)
+            LOGGER.warning(f"WALLEX RETRY {attempt + 1}/{self.max_retries} in {delay:.2f}s: {error}")
+            await asyncio.sleep(delay)
+
+    def get_json_sync(self, url, params=None, timeout=10, headers=None):
+        """همان _get_json برای کد sync (requests)؛ از همان سطل توکن مشترک استفاده می‌کند"""
+        for attempt in range(self.max_retries + 1):
+            if self.limiter.acquire_sync() > 0:
+                self.metrics.inc("throttled")
+            self.metrics.inc("requests")
+            start = time.perf_counter()
+            retry_after = None
+            try:
+                res = requests.get(url, params=params, timeout=timeout, headers=headers, proxies=self.proxies)
+                self.metrics.observe((time.perf_counter() - start) * 1000)
+                if res.status_code == 200:
+                    return res.json()
+                if res.status_code not in RETRY_STATUSES:
+                    self.metrics.inc("errors")
+                    raise WallexRequestError(f"HTTP {res.status_code}", res.status_code)
+                self.metrics.inc("status_429" if res.status_code == 429 else "status_5xx")
+                retry_after = res.headers.get("Retry-After")
+                error = WallexRequestError(f"HTTP {res.status_code}", res.status_code)
+            except requests.Timeout:
+                self.metrics.inc("timeouts")
+                error = WallexRequestError("Timeout")
+            except requests.ConnectionError as e:
+                self.metrics.inc("errors")
+                error = WallexRequestError(f"Connection error: {e}")
+
+            if attempt == self.max_retries:
+                raise error
+            self.metrics.inc("retries")
+            delay = backoff_delay(attempt, self.backoff_base, retry_after=retry_after)
+            LOGGER.warning(f"WALLEX RETRY {attempt + 1}/{self.max_retries} in {delay:.2f}s: {error}")
+            time.sleep(delay)
+
+    async def _coalesce(self, key, factory):
+        """
+        اگر درخواست یکسانی در حال اجراست، همان نتیجه به اشتراک گذاشته می‌شود.
+        shield: لغو شدن (مثلاً timeout) یک فراخوان، بقیه را لغو نمی‌کند.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.metrics.inc("coalesced")
+        return await asyncio.shield(task)
+
+    def get_metrics(self) -> dict:
+        return self.metrics.snapshot()
+
     async def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 100) -> pd.DataFrame:
         # --- FIX: تغییر پیش‌فرض به تومان (TMN) ---
         clean_symbol = symbol.upper().replace('-', '').replace('/', '')
-        
+
         # اگر کاربر نگفت چی، پیش‌فرض تومان بگذار
         if not clean_symbol.endswith('USDT') and not clean_symbol.endswith('TMN'):
             clean_symbol += 'TMN'
 
+        minutes = TIMEFRAME_MINUTES.get(timeframe, 60)
+
+        df = await self._coalesce(
+            ("ohlcv", clean_symbol, minutes, limit),
+            lambda: self._fetch_ohlcv(clean_symbol, minutes, limit)
+        )
+        # هر فراخوان کپی خودش را می‌گیرد (نتیجه بین درخواست‌های ادغام‌شده مشترک است)
+        return df.copy()
+
+    async def _fetch_ohlcv(self, clean_symbol, minutes, limit):
         to_ts = int(time.time())
-        tf_map = {'15m': 15, '1h': 60, '4h': 240}
-        minutes = tf_map.get(timeframe, 60)
         from_ts = to_ts - (minutes * 60 * (limit + 50)) # کمی بیشتر بگیر
 
         params = {
@@ -34,59 +169,86 @@ class WallexConnector(BaseConnector):
             'from': from_ts,
             'to': to_ts
         }
-        
-        LOGGER.info(f"INGEST: Requesting {clean_symbol} (Toman Base)...") 
-        
-        if not self.session:
-            raise RuntimeError("Session not started.")
+
+        LOGGER.info(f"INGEST: Requesting {clean_symbol} (Toman Base)...")
 
         try:
-            async with self.session.get(self.base_url, params=params, timeout=15) as response:
-                if response.status != 200: raise Exception(f"HTTP {response.status}")
-                data = await response.json()
-                if data.get('s') != 'ok': raise Exception("API Error")
-
-                df = pd.DataFrame({
-                    'timestamp': pd.to_datetime(data['t'], unit='s'),
-                    'open': data['o'], 'high': data['h'], 'low': data['l'], 
-                    'close': data['c'], 'volume': data['v']
-                })
-                
-                # تبدیل به float
-                cols = ['open', 'high', 'low', 'close', 'volume']
-                df[cols] = df[cols].astype(float)
-                
-                return df[OHLCV_COLUMNS].tail(limit)
+            data = await self._get_json(self.base_url, params=params, timeout=OHLCV_TIMEOUT)
+            if data.get('s') != 'ok': raise Exception("API Error")
+            return self._to_frame(data).tail(limit)
         except Exception as e:
             LOGGER.critical(f"WALLEX FAIL: {e}")
             raise
 
+    async def fetch_range(self, symbol: str, timeframe: str, from_ts: int, to_ts: int) -> pd.DataFrame:
+        """
+        کندل‌های بازه [from_ts, to_ts] (ثانیه یونیکس) برای miner.
+        اگر صرافی برای این بازه داده‌ای نداشت (no_data)، دیتافریم خالی برمی‌گردد.
+        """
+        params = {
+            'symbol': symbol.upper(),
+            'resolution': str(TIMEFRAME_MINUTES[timeframe]),
+            'from': int(from_ts),
+            'to': int(to_ts)
+        }
+        data = await self._get_json(self.base_url, params=params, timeout=OHLCV_TIMEOUT)
+        if data.get('s') == 'no_data':
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+        if data.get('s') != 'ok':
+            raise WallexRequestError(f"API Error: {data.get('s')}")
+        return self._to_frame(data)
+
+    @staticmethod
+    def _to_frame(data):
+        df = pd.DataFrame({
+            'timestamp': pd.to_datetime(data['t'], unit='s'),
+            'open': data['o'], 'high': data['h'], 'low': data['l'],
+            'close': data['c'], 'volume': data['v']
+        })
+
+        # تبدیل به float
+        cols = ['open', 'high', 'low', 'close', 'volume']
+        df[cols] = df[cols].astype(float)
+
+        return df[OHLCV_COLUMNS]
+
     def get_macro_prices(self):
         """دریافت قیمت لحظه‌ای دلار و طلا به تومان"""
         print("📊 Fetching Macro Data (Toman)...")
-        macro = {"USDT_IRT": 0, "GOLD_IRT": 0} # نام‌ها را به IRT تغییر دادیم
+        try:
+            return self._parse_macro(self.get_json_sync(self.market_url, timeout=10))
+        except Exception as e:
+            LOGGER.error(f"MACRO ERROR: {e}")
+            return {"USDT_IRT": 0, "GOLD_IRT": 0}
 
+    async def fetch_macro_prices(self, timeout=MACRO_TIMEOUT):
+        """نسخه async روی همان session (برای اجرای هم‌زمان با OHLCV)"""
         try:
-            res = requests.get(self.market_url, timeout=10, proxies=self.proxies)
-            data = res.json()
-            
-            if data['success']:
-                symbols = data['result']['symbols']
-                
-                # 1. قیمت دلار (USDTTMN)
-                if 'USDTTMN' in symbols:
-                    macro['USDT_IRT'] = float(symbols['USDTTMN']['stats']['lastPrice'])
-                
-                # 2. قیمت طلا (PAXGTMN)
-                # اگر جفت ارز مستقیم طلا/تومان بود:
-                if 'PAXGTMN' in symbols:
-                    macro['GOLD_IRT'] = float(symbols['PAXGTMN']['stats']['lastPrice'])
-                # اگر نبود، محاسبه کن: PAXGUSDT * USDTTMN
-                elif 'PAXGUSDT' in symbols:
-                    paxg_usd = float(symbols['PAXGUSDT']['stats']['lastPrice'])
-                    macro['GOLD_IRT'] = paxg_usd * macro['USDT_IRT']
-            
-            return macro
+            data = await self._coalesce(
+                ("markets",), lambda: self._get_json(self.market_url, timeout=timeout))
+            return self._parse_macro(data)
         except Exception as e:
             LOGGER.error(f"MACRO ERROR: {e}")
-            return macro
\ No newline at end of file
+            return {"USDT_IRT": 0, "GOLD_IRT": 0}
+
+    @staticmethod
+    def _parse_macro(data):
+        macro = {"USDT_IRT": 0, "GOLD_IRT": 0} # نام‌ها را به IRT تغییر دادیم
+
+        if data['success']:
+            symbols = data['result']['symbols']
+            
+            # 1. قیمت دلار (USDTTMN)
+            if 'USDTTMN' in symbols:
+                macro['USDT_IRT'] = float(symbols['USDTTMN']['stats']['lastPrice'])
+            
+            # 2. قیمت طلا (PAXGTMN)
+            # اگر جفت ارز مستقیم طلا/تومان بود:
+            if 'PAXGTMN' in symbols:
+                macro['GOLD_IRT'] = float(symbols['PAXGTMN']['stats']['lastPrice'])
+            # اگر نبود، محاسبه کن: PAXGUSDT * USDTTMN
+            elif 'PAXGUSDT' in symbols:
+                paxg_usd = float(symbols['PAXGUSDT']['stats']['lastPrice'])
+                macro['GOLD_IRT'] = paxg_usd * macro['USDT_IRT']
+        
+        return macro
\ No newline at end of file
@@ -1,6 +1,9 @@
 # src/ml/dataset.py
+import warnings
+
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import RobustScaler # استفاده از اسکیلر مقاوم‌تر
 
 SEQUENCE_LENGTH = 24
@@ -13,53 +16,86 @@ class DataLabeler:
         return df0.ewm(span=span0).std()
 
     @staticmethod
-    def apply_triple_barrier(close, volatility, t_events, pt=1, sl=1, min_ret=0.002):
+    def first_touch(close_values, positions, upper, lower, horizon=24, batch_size=100_000):
+        """
+        اولین برخورد با سدهای بالا/پایین برای هر موقعیت، کاملاً برداری.
+        پنجره‌های رو به جلو با sliding_window_view ساخته می‌شوند (بدون کپی کل آرایه)
+        و برای محدود ماندن حافظه، در دسته‌های batch_size پردازش می‌شوند.
+        خروجی: (first_up, first_down) فاصله از کندل ورود؛ horizon یعنی برخوردی نبوده.
+        """
+        close_values = np.asarray(close_values, dtype=float)
+        positions = np.asarray(positions)
+        upper = np.asarray(upper, dtype=float)
+        lower = np.asarray(lower, dtype=float)
+
+        # پنجره i شامل close[i : i+horizon] است (مثل close[t:].head(horizon))
+        padded = np.concatenate([close_values, np.full(horizon - 1, np.nan)])
+        windows = sliding_window_view(padded, horizon)
+
+        first_up = np.full(len(positions), horizon)
+        first_down = np.full(len(positions), horizon)
+        for start in range(0, len(positions), batch_size):
+            stop = start + batch_size
+            pos = positions[start:stop]
+            path = windows[pos]
+            base = close_values[pos][:, None]
+
+            up_hit = path > base * (1 + upper[start:stop][:, None])
+            down_hit = path < base * (1 + lower[start:stop][:, None])
+
+            first_up[start:stop] = np.where(up_hit.any(axis=1), up_hit.argmax(axis=1), horizon)
+            first_down[start:stop] = np.where(down_hit.any(axis=1), down_hit.argmax(axis=1), horizon)
+
+        return first_up, first_down
+
+    @staticmethod
+    def apply_triple_barrier(close, volatility, t_events, pt=1, sl=1, min_ret=0.002,
+                             horizon=24, vertical_label=0, batch_size=100_000):
         """
         Triple Barrier Method (Marcos Lopez de Prado)
         تعیین هدف بر اساس نوسان بازار (نه درصد ثابت)
+        نسخه برداری: ایندکس close باید مرتب (صعودی) باشد.
+        :param horizon: سد عمودی (تعداد کندل، پیش‌فرض 24 ساعت)
+        :param vertical_label: برچسب وقتی هیچ سدی لمس نشود (None یعنی حذف آن ردیف)
         """
         # 1. حد بالا (سود) و پایین (ضرر) بر اساس نوسان لحظه‌ای
         upper = volatility * pt # Profit Take
         lower = -volatility * sl # Stop Loss
-        
-        labels = pd.Series(index=t_events)
-        
-        for t in t_events:
-            path = close[t:] # مسیر قیمت از این لحظه به بعد
-            # افق زمانی: حداکثر 24 ساعت
-            path = path.head(24) 
-            
-            # اولین جایی که به حد سود یا ضرر می‌رسد
-            break_up = path[path > close[t] * (1 + upper[t])].index.min()
-            break_down = path[path < close[t] * (1 + lower[t])].index.min()
-            
-            if pd.isna(break_up) and pd.isna(break_down):
-                labels[t] = 0 # خنثی (به زمان خوردیم)
-            elif pd.isna(break_down):
-                labels[t] = 1 # سود (اول به بالا خورد)
-            elif pd.isna(break_up):
-                labels[t] = 0 # ضرر (اول به پایین خورد - ما کلاس 0 می‌گذاریم که نخریم)
-            else:
-                # هر کدام زودتر اتفاق افتاد
-                labels[t] = 1 if break_up < break_down else 0
-                
+
+        positions = close.index.get_indexer(t_events)
+        first_up, first_down = DataLabeler.first_touch(
+            close.to_numpy(dtype=float), positions,
+            upper.to_numpy(dtype=float)[positions], lower.to_numpy(dtype=float)[positions],
+            horizon=horizon, batch_size=batch_size
+        )
+
+        # سود فقط اگر سد بالا زودتر (یا تنها) لمس شود؛ در غیر این صورت 0 (نخریم)
+        labels = np.where(first_up < first_down, 1.0, 0.0)
+        untouched = (first_up == horizon) & (first_down == horizon)
+        labels[untouched] = np.nan if vertical_label is None else vertical_label
+
+        labels = pd.Series(labels, index=t_events)
         return labels.dropna()
 
     @staticmethod
-    def prepare(df: pd.DataFrame):
-        data = df.copy()
-        
+    def prepare(df: pd.DataFrame, scale=True):
+        """
+        ماتریس ویژگی نرمال‌شده و برچسب‌ها بدون کپی کل دیتافریم ورودی.
+        dtype خروجی همان dtype ستون‌های ورودی است (float32 برای FeatureBlock، float64 برای add_all)؛
+        نوسان و سدهای برچسب همیشه با float64 محاسبه می‌شوند.
+        scale=False: ویژگی‌های خام و scaler=None (مثلاً تیونر که scaler را فقط روی آموزش هر فولد fit می‌کند).
+        """
+        close = df['close'].astype(np.float64)
+
         # محاسبه نوسان پویا
-        data['volatility'] = DataLabeler.get_volatility(data['close'])
+        volatility = DataLabeler.get_volatility(close)
         
         # برچسب‌گذاری پیشرفته (Triple Barrier)
         # هدف: سود 2 برابر نوسان، ضرر 1 برابر نوسان (Risk/Reward 1:2)
         labels = DataLabeler.apply_triple_barrier(
-            data['close'], data['volatility'], data.index, pt=2, sl=1
+            close, volatility, df.index, pt=2, sl=1
         )
         
-        data['target'] = labels
-        
         # ویژگی‌های ورودی (شامل ویژگی‌های جدید فراکتالی در آینده)
         feature_cols = [
             'close', 'rsi', 'macd_hist', 'sma_50', 'obv', 
@@ -67,25 +103,125 @@ class DataLabeler:
             'volatility' # نوسان هم به عنوان ورودی مهم است
         ]
         
-        # همگام‌سازی
-        data = data.loc[labels.index]
-        available_cols = [c for c in feature_cols if c in data.columns]
-        data.dropna(subset=available_cols, inplace=True)
+        # همگام‌سازی: یک ماتریس پیوسته فقط از ستون‌ها و ردیف‌های لازم
+        available_cols = [c for c in feature_cols if c in df.columns or c == 'volatility']
+        dtype = np.result_type(*[df[c].dtype for c in available_cols if c != 'volatility'])
+        rows = df.index.get_indexer(labels.index)
+        values = np.empty((len(rows), len(available_cols)), dtype=dtype)
+        for j, col in enumerate(available_cols):
+            source = volatility if col == 'volatility' else df[col]
+            values[:, j] = source.to_numpy()[rows]
+
+        valid = ~np.isnan(values).any(axis=1)
+        if not valid.all():
+            values = values[valid]
         
-        # نرمال‌سازی مقاوم (Robust Scaler بهتر از MinMax در مالی است)
-        scaler = RobustScaler()
-        scaled_data = scaler.fit_transform(data[available_cols])
+        # نرمال‌سازی مقاوم (Robust Scaler بهتر از MinMax در مالی است)؛ همان transform، اما درجا روی همین ماتریس
+        scaler = None
+        if scale:
+            scaler = RobustScaler().fit(values)
+            values -= scaler.center_.astype(dtype)
+            values /= scaler.scale_.astype(dtype)
         
-        df_scaled = pd.DataFrame(scaled_data, columns=available_cols, index=data.index)
-        return df_scaled, data['target'], scaler
+        df_scaled = pd.DataFrame(values, columns=available_cols, index=labels.index[valid], copy=False)
+        return df_scaled, labels[valid].rename('target'), scaler
+
+    @staticmethod
+    def prepare_panel(panel):
+        """
+        نسخه چندنمادی prepare برای مسیر پیش‌بینی (بدون برچسب) روی FeaturePanel (src/features/panel.py).
+        همان ستون‌ها، همان نوسان و همان RobustScaler، اما center/scale هر نماد روی محور زمان و برای همه
+        نمادها با هم حساب می‌شود. خروجی: (X با شکل (symbols, time, features) و dtype پنل، valid، ستون‌ها)
+        """
+        feature_cols = [
+            'close', 'rsi', 'macd_hist', 'sma_50', 'obv',
+            'price_sma_ratio', 'volatility_ratio', 'pct_change_3h', 'volatility'
+        ]
+        channels = [panel.columns.index(c) for c in feature_cols[:-1]]
+        dtype = panel.values.dtype
+        X = np.empty(panel.values.shape[:2] + (len(feature_cols),), dtype=dtype)
+        X[:, :, :-1] = panel.values[:, :, channels]
+
+        # نوسان فقط روی ردیف‌های معتبر هر نماد (مثل prepare روی خروجی add_all)؛ ewm ستونی pandas برای همه نمادها
+        close = np.where(panel.valid, panel.values[:, :, panel.columns.index('close')], np.nan).T
+        volatility = DataLabeler.get_volatility(pd.DataFrame(close, dtype=np.float64))
+        X[:, :, -1] = volatility.to_numpy().T
+
+        valid = panel.valid & ~np.isnan(X).any(axis=2)
+        X[~valid] = np.nan
+
+        # RobustScaler برداری: میانه و IQR هر نماد/ستون روی ردیف‌های معتبر همان نماد
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # نمادهای بدون ردیف معتبر
+            center = np.nanmedian(X, axis=1, keepdims=True)
+            q25, q75 = np.nanpercentile(X, [25, 75], axis=1, keepdims=True)
+        scale = q75 - q25
+        scale[scale < 10 * np.finfo(scale.dtype).eps] = 1.0   # مثل _handle_zeros_in_scale
+        X -= center.astype(dtype)
+        X /= scale.astype(dtype)
+        return X, valid, feature_cols
+
+    @staticmethod
+    def panel_sequences(X, valid):
+        """
+        آخرین پنجره هر نماد از خروجی prepare_panel (مثل last_sequence روی ردیف‌های معتبر همان نماد).
+        خروجی: (پنجره‌ها N×L×F، آخرین ردیف‌ها N×F، شماره نمادها)؛ نماد با کمتر از L+1 ردیف معتبر کنار می‌رود.
+        """
+        window = SEQUENCE_LENGTH + 1
+        counts = valid.sum(axis=1)
+        full_tail = valid[:, -window:].all(axis=1) & (counts >= window)
+        symbols = np.flatnonzero(full_tail)
+        tails = X[symbols, -window:]
+        # ردیف نامعتبر در انتها (نادر): فقط همان نماد فشرده می‌شود
+        ragged = np.flatnonzero(~full_tail & (counts >= window))
+        if len(ragged):
+            tails = np.concatenate([tails, np.stack([X[s, valid[s]][-window:] for s in ragged])])
+            symbols = np.r_[symbols, ragged]
+        return tails[:, :-1], tails[:, -1], symbols
 
     @staticmethod
     def create_sequences(X, y):
-        # (کد قبلی برای توالی‌سازی)
-        X_values = X.values
-        y_values = y.values
-        X_seq, y_target = [], []
-        for i in range(SEQUENCE_LENGTH, len(X_values)):
-            X_seq.append(X_values[i - SEQUENCE_LENGTH : i])
-            y_target.append(y_values[i])
-        return np.array(X_seq), np.array(y_target)
\ No newline at end of file
+        """
+        توالی‌سازی بدون کپی: پنجره i برابر X[i : i+SEQUENCE_LENGTH] و هدفش y[i+SEQUENCE_LENGTH].
+        خروجی view فقط-خواندنی (sliding_window_view) است؛ برای Keras از materialize استفاده کنید.
+        """
+        X_values = np.asarray(X.values if hasattr(X, 'values') else X)
+        y_values = np.asarray(y.values if hasattr(y, 'values') else y)
+        count = len(X_values) - SEQUENCE_LENGTH
+        if count <= 0:
+            return np.empty((0, SEQUENCE_LENGTH, X_values.shape[1])), np.empty(0)
+
+        windows = sliding_window_view(X_values, SEQUENCE_LENGTH, axis=0).transpose(0, 2, 1)
+        return windows[:count], y_values[SEQUENCE_LENGTH:]
+
+    @staticmethod
+    def last_sequence(X):
+        """
+        مسیر سریع پیش‌بینی: فقط آخرین پنجره create_sequences (شکل 1×L×F، بدون کپی).
+        برای پنجره به len(X) > SEQUENCE_LENGTH نیاز است؛ در غیر این صورت None.
+        """
+        X_values = np.asarray(X.values if hasattr(X, 'values') else X)
+        if len(X_values) <= SEQUENCE_LENGTH:
+            return None
+        return X_values[-(SEQUENCE_LENGTH + 1):-1][np.newaxis, ...]
+
+    @staticmethod
+    def materialize(X_seq, dtype=np.float32):
+        """تبدیل view پنجره‌ها به آرایه پیوسته (float32 برای Keras)"""
+        return np.ascontiguousarray(X_seq, dtype=dtype)
+
+    @staticmethod
+    def iter_batches(X_seq, y=None, batch_size=256, dtype=np.float32, shuffle=False, seed=None):
+        """
+        ساخت تنبل دسته‌ها: هر بار فقط batch_size پنجره کپی می‌شود.
+        shuffle: ترتیب تصادفی پنجره‌ها (مثل shuffle پیش‌فرض model.fit روی آرایه).
+        """
+        y = None if y is None else np.asarray(y)
+        order = np.random.default_rng(seed).permutation(len(X_seq)) if shuffle else None
+        for start in range(0, len(X_seq), batch_size):
+            rows = slice(start, start + batch_size) if order is None else order[start:start + batch_size]
+            X_batch = DataLabeler.materialize(X_seq[rows], dtype)
+            if y is None:
+                yield X_batch
+            else:
+                yield X_batch, y[rows]
@@ -3,16 +3,24 @@ from sklearn.linear_model import LogisticRegression
 from src.ml.model import MarketPredictor 
 from src.ml.lstm_model import LSTM_Predictor 
 from src.ml.dataset import DataLabeler 
+from src.ml.leaderboard import load_best_params, LEADERBOARD_PATH
 import pandas as pd
 import numpy as np
 import joblib
 import os
 
+# مدل درختی کمکی: "hist" (چندهسته‌ای، ده‌ها برابر سریع‌تر با precision/AUC هم‌سطح، tools/bench_gbm.py) یا "gbm"
+AUX_BACKEND = "hist"
+
 class EnsemblePredictor:
-    def __init__(self):
+    def __init__(self, leaderboard_path=LEADERBOARD_PATH):
+        # ابرپارامترهای تیون‌شده (src/ml/tuner.py)؛ بدون leaderboard همان مقادیر پیش‌فرض
+        self.tuned_params = load_best_params(leaderboard_path)
         self.predictor_A = None # LSTM
-        self.predictor_B = LogisticRegression(random_state=42, solver='liblinear')
-        self.aux_predictor = MarketPredictor() 
+        self.predictor_B = LogisticRegression(
+            **{"random_state": 42, "solver": 'liblinear', **self.tuned_params.get("logistic", {})}
+        )
+        self.aux_predictor = MarketPredictor(self.tuned_params.get(AUX_BACKEND), backend=AUX_BACKEND) 
         self.is_trained = False
         self.model_file_b = "model_logistic.pkl"
         self.model_file_aux = "model_aux.pkl"
@@ -21,7 +29,7 @@ class EnsemblePredictor:
         """تلاش برای بارگذاری مدل‌ها به جای آموزش مجدد"""
         try:
             # بارگذاری LSTM
-            self.predictor_A = LSTM_Predictor(sequence_length, num_features)
+            self.predictor_A = LSTM_Predictor(sequence_length, num_features, **self.tuned_params.get("lstm", {}))
             lstm_loaded = self.predictor_A.load()
             
             # بارگذاری مدل‌های دیگر
@@ -55,7 +63,7 @@ class EnsemblePredictor:
         X_flat_train = X.iloc[sequence_length : len(X)] 
         
         # 1. LSTM
-        self.predictor_A = LSTM_Predictor(sequence_length, num_features)
+        self.predictor_A = LSTM_Predictor(sequence_length, num_features, **self.tuned_params.get("lstm", {}))
         self.predictor_A.train(X_seq, y_target)
         
         # 2. Logistic (با حفظ نام ستون‌ها برای رفع هشدار)
@@ -68,19 +76,48 @@ class EnsemblePredictor:
         
         self.is_trained = True
 
+    def predict_batch(self, samples) -> np.ndarray:
+        """
+        پیش‌بینی دسته‌ای برای چند نمونه (مثلاً چند نماد) در یک forward pass.
+        هر نمونه مثل ورودی predict_combined است (حداقل SEQUENCE_LENGTH + 1 ردیف).
+        خروجی: احتمال نهایی هر نمونه؛ NaN برای نمونه‌های کوتاه.
+        """
+        probs = np.full(len(samples), np.nan)
+        if not self.is_trained or not samples: return probs
+
+        seqs = [DataLabeler.last_sequence(X) for X in samples]
+        valid = [i for i, seq in enumerate(seqs) if seq is not None]
+        if not valid: return probs
+
+        # Logistic: آخرین ردیف هر نمونه (DataFrame برای حفظ نام ستون‌ها)
+        X_flat_last = pd.concat([samples[i].iloc[[-1]] for i in valid])
+        probs[valid] = self._blend(np.concatenate([seqs[i] for i in valid]), X_flat_last)
+        return probs
+
+    def predict_panel(self, X, valid, columns) -> np.ndarray:
+        """
+        پیش‌بینی همه نمادهای یک تنسور (symbols, time, features) از DataLabeler.prepare_panel در یک دسته.
+        خروجی: احتمال نهایی هر نماد؛ NaN برای نمادهایی که SEQUENCE_LENGTH + 1 ردیف معتبر ندارند.
+        """
+        probs = np.full(len(X), np.nan)
+        if not self.is_trained or not len(X): return probs
+
+        windows, last_rows, symbols = DataLabeler.panel_sequences(X, valid)
+        if not len(symbols): return probs
+        probs[symbols] = self._blend(windows, pd.DataFrame(last_rows, columns=columns))
+        return probs
+
+    def _blend(self, windows, X_flat_last):
+        """LSTM روی همه پنجره‌ها در یک فراخوانی + Logistic روی آخرین ردیف‌ها"""
+        prob_A = self.predictor_A.predict_batch(windows)
+        prob_B = self.predictor_B.predict_proba(X_flat_last)[:, 1]
+        return (0.70 * prob_A) + (0.30 * prob_B)
+
     def predict_combined(self, X_sample) -> tuple:
         if not self.is_trained: return 0, 0.5
-            
-        # LSTM Prediction
-        X_sample_seq = DataLabeler.create_sequences(X_sample, pd.Series([0]*len(X_sample)))[0]
-        if len(X_sample_seq) == 0: return 0, 0.5 # محافظت
-        
-        X_sample_seq_last = X_sample_seq[-1].reshape(1, X_sample_seq.shape[1], X_sample_seq.shape[2]) 
-        prob_A = self.predictor_A.model.predict(X_sample_seq_last, verbose=0)[0][0]
-        
-        # Logistic Prediction (ارسال DataFrame برای حفظ نام ستون‌ها)
-        X_flat_last = X_sample.iloc[[-1]] # حفظ فرمت DataFrame
-        prob_B = self.predictor_B.predict_proba(X_flat_last)[0][1]
-        
-        final_prob = (0.70 * prob_A) + (0.30 * prob_B)
-        return 1 if final_prob >= 0.5 else 0, final_prob
\ No newline at end of file
+
+        # فقط آخرین پنجره LSTM ساخته می‌شود
+        final_prob = self.predict_batch([X_sample])[0]
+        if np.isnan(final_prob): return 0, 0.5 # محافظت
+
+        return 1 if final_prob >= 0.5 else 0, final_prob
@@ -0,0 +1,357 @@
+# src/ml/inference.py
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+import numpy as np
+import pandas as pd
+
+from src.core.utils import LOGGER
+
+# اجرای مستقل (python -m src.ml.inference): کلید احراز هویت به صورت hex (کلید پیش‌فرض عمومی وجود ندارد)
+# و آدرس اختیاری (بدون آن new_address)؛ آدرس نهایی در stdout چاپ می‌شود تا به کلاینت داده شود
+AUTHKEY_ENV = "PIED_PIPER_INFERENCE_AUTHKEY"
+ADDRESS_ENV = "PIED_PIPER_INFERENCE_ADDRESS"
+
+
+def new_address():
+    """
+    آدرس یکتای هر سرور (شامل pid پروسه سازنده): سوکت یونیکس روی لینوکس/مک، named pipe روی ویندوز.
+    دو نمونه برنامه هیچ‌وقت سوکت یکدیگر را نمی‌گیرند.
+    """
+    name = f"pied_piper_inference_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+    if os.name == "nt":
+        return rf"\\.\pipe\{name}"
+    return os.path.join(tempfile.gettempdir(), f"{name}.sock")
+
+
+def _is_answering(address):
+    """آیا سروری (با هر کلیدی) روی این آدرس گوش می‌دهد؟"""
+    try:
+        Client(address, authkey=os.urandom(32)).close()
+    except (AuthenticationError, EOFError):
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _percentiles(values):
+    if not values:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    arr = np.asarray(values)
+    return {
+        "count": len(arr),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "max_ms": float(arr.max()),
+    }
+
+
+class _BatchingService:
+    """
+    هسته سرور: مدل‌ها یک بار گرم می‌شوند و درخواست‌های هم‌زمان (از چند اتصال/نماد)
+    تا max_batch یا max_wait_ms جمع و در یک forward pass پیش‌بینی می‌شوند.
+    """
+    def __init__(self, max_batch=64, max_wait_ms=5, history=1000):
+        from src.ml.ensemble import EnsemblePredictor
+        from src.ml.dataset import SEQUENCE_LENGTH
+
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.ensemble = EnsemblePredictor()
+        self.ensemble.load_if_exists(SEQUENCE_LENGTH, None)
+        self.batch_sizes = deque(maxlen=history)
+        self.infer_ms = deque(maxlen=history)
+        self.queue_ms = deque(maxlen=history)
+        self.running = True
+
+    def reload(self):
+        """بارگذاری دوباره مدل‌ها از دیسک (بعد از آموزش مجدد)"""
+        from src.ml.ensemble import EnsemblePredictor
+        from src.ml.dataset import SEQUENCE_LENGTH
+
+        ensemble = EnsemblePredictor()
+        loaded = ensemble.load_if_exists(SEQUENCE_LENGTH, None)
+        if loaded:
+            self.ensemble = ensemble
+        return loaded
+
+    def stats(self):
+        return {
+            "trained": self.ensemble.is_trained,
+            "queue": _percentiles(list(self.queue_ms)),
+            "inference": _percentiles(list(self.infer_ms)),
+            "mean_batch": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+        }
+
+    def _collect(self):
+        """اولین درخواست را منتظر می‌ماند و بقیه را تا پر شدن دسته یا پایان مهلت جمع می‌کند"""
+        try:
+            batch = [self.requests.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run_batches(self):
+        while self.running:
+            batch = self._collect()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            samples = [pd.DataFrame(item["X"], columns=item["columns"]) for item in batch]
+            try:
+                probs = self.ensemble.predict_batch(samples)
+                aux = self._aux_probs(samples)
+                error = None
+            except Exception as e:
+                LOGGER.error(f"INFERENCE: Batch failed: {e}")
+                probs = aux = np.full(len(batch), np.nan)
+                error = str(e)
+            infer_ms = (time.perf_counter() - start) * 1000
+
+            self.batch_sizes.append(len(batch))
+            self.infer_ms.append(infer_ms)
+            for item, prob, aux_prob in zip(batch, probs, aux):
+                queue_ms = (start - item["received"]) * 1000
+                self.queue_ms.append(queue_ms)
+                item["reply"]({
+                    "id": item["id"],
+                    "prob": float(prob),
+                    "aux_prob": float(aux_prob),
+                    "batch_size": len(batch),
+                    "queue_ms": queue_ms,
+                    "infer_ms": infer_ms,
+                    "error": error,
+                })
+
+    def _aux_probs(self, samples):
+        """احتمال مدل GBM کمکی روی آخرین ردیف هر نمونه (برای مقایسه در خروجی)"""
+        aux = self.ensemble.aux_predictor
+        if not aux.is_trained:
+            return np.full(len(samples), np.nan)
+        last_rows = pd.concat([X.iloc[[-1]] for X in samples])
+        return aux.model.predict_proba(last_rows)[:, 1]
+
+
+def _serve_connection(service, conn):
+    """خواندن درخواست‌های یک اتصال؛ پاسخ‌ها از ترد دسته‌ساز با قفل همین اتصال ارسال می‌شوند"""
+    lock = threading.Lock()
+
+    def reply(message):
+        with lock:
+            try:
+                conn.send(message)
+            except (OSError, EOFError):
+                pass
+
+    try:
+        while service.running:
+            message = conn.recv()
+            op = message.get("op")
+            if op == "predict":
+                message["received"] = time.perf_counter()
+                message["reply"] = reply
+                service.requests.put(message)
+            elif op == "stats":
+                reply({"id": message.get("id"), "stats": service.stats()})
+            elif op == "reload":
+                reply({"id": message.get("id"), "reloaded": service.reload()})
+            elif op == "shutdown":
+                service.running = False
+                reply({"id": message.get("id"), "stopped": True})
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def serve(address, authkey, max_batch=64, max_wait_ms=5, announce=False):
+    """
+    حلقه اصلی پروسه سرور استنتاج (تا دریافت shutdown).
+    اگر سرور دیگری روی همین آدرس پاسخ می‌دهد شروع نمی‌شود؛ فقط سوکت رهاشده (بدون شنونده) پاک می‌شود.
+    """
+    if _is_answering(address):
+        raise RuntimeError(f"Another inference server is already serving on {address}")
+    if os.name != "nt" and os.path.exists(address):
+        os.remove(address)
+
+    service = _BatchingService(max_batch=max_batch, max_wait_ms=max_wait_ms)
+    listener = Listener(address, authkey=authkey)
+    LOGGER.info(f"INFERENCE: Serving on {address} (models trained: {service.ensemble.is_trained})")
+    if announce:
+        print(f"INFERENCE ADDRESS: {address}", flush=True)
+
+    def accept_loop():
+        while service.running:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError):
+                continue  # کلاینت با کلید نادرست (یا بررسی _is_answering)
+            except Exception:
+                break
+            threading.Thread(target=_serve_connection, args=(service, conn), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    try:
+        service.run_batches()
+    finally:
+        listener.close()
+        LOGGER.info("INFERENCE: Stopped.")
+
+
+class InferenceServer:
+    """
+    راه‌اندازی سرور استنتاج در یک پروسه جدا (spawn).
+    هر نمونه آدرس یکتا و کلید تصادفی خودش را دارد؛ کلاینت‌ها با (address, authkey) همین نمونه وصل می‌شوند.
+    """
+    def __init__(self, address=None, authkey=None, max_batch=64, max_wait_ms=5):
+        self.address = address or new_address()
+        self.authkey = authkey or os.urandom(32)
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.process = None
+
+    def start(self, timeout=120):
+        if _is_answering(self.address):
+            raise RuntimeError(f"Another inference server is already serving on {self.address}")
+        context = multiprocessing.get_context("spawn")
+        self.process = context.Process(
+            target=serve, args=(self.address, self.authkey, self.max_batch, self.max_wait_ms),
+            name="inference-server", daemon=True)
+        self.process.start()
+
+        # منتظر آماده شدن (بارگذاری TensorFlow و مدل‌ها زمان‌بر است)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self.process.is_alive():
+                raise RuntimeError("Inference server exited during startup.")
+            try:
+                InferenceClient(self.address, self.authkey).close()
+                return self
+            except (FileNotFoundError, ConnectionRefusedError, OSError):
+                time.sleep(0.2)
+        raise TimeoutError("Inference server did not start in time.")
+
+    def stop(self, timeout=10):
+        if self.process is None:
+            return
+        try:
+            client = InferenceClient(self.address, self.authkey)
+            client.shutdown()
+            client.close()
+        except Exception:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+
+
+class InferenceClient:
+    """
+    کلاینت سبک (بدون TensorFlow) برای ورکرها/اسکنر.
+    رابط predict هم‌شکل EnsemblePredictor.predict_combined است.
+    """
+    def __init__(self, address, authkey, history=1000):
+        from src.ml.dataset import SEQUENCE_LENGTH
+
+        self.window = SEQUENCE_LENGTH + 1
+        self.conn = Client(address, authkey=authkey)
+        self.lock = threading.Lock()
+        self.latency_ms = deque(maxlen=history)
+        self.last = None
+        self._next_id = 0
+
+    def close(self):
+        self.conn.close()
+
+    def _request(self, message):
+        with self.lock:
+            self._next_id += 1
+            message["id"] = self._next_id
+            self.conn.send(message)
+            return self.conn.recv()
+
+    def predict_many(self, samples):
+        """
+        ارسال چند نمونه پشت سر هم (تا سرور همه را در یک دسته ببیند) و دریافت پاسخ‌ها.
+        خروجی: لیست (pred, prob) هم‌ترتیب ورودی.
+        """
+        start = time.perf_counter()
+        with self.lock:
+            ids = []
+            for X_sample in samples:
+                self._next_id += 1
+                ids.append(self._next_id)
+                self.conn.send({
+                    "op": "predict",
+                    "id": self._next_id,
+                    "X": np.asarray(X_sample.values[-self.window:], dtype=np.float64),
+                    "columns": list(X_sample.columns),
+                })
+            replies = {}
+            while len(replies) < len(ids):
+                message = self.conn.recv()
+                replies[message["id"]] = message
+
+        latency = (time.perf_counter() - start) * 1000
+        results = []
+        for request_id in ids:
+            message = replies[request_id]
+            message["latency_ms"] = latency
+            self.latency_ms.append(latency)
+            self.last = message
+            prob = message["prob"]
+            if message["error"] or np.isnan(prob):
+                results.append((0, 0.5))
+            else:
+                results.append((1 if prob >= 0.5 else 0, prob))
+        return results
+
+    def predict_combined(self, X_sample):
+        return self.predict_many([X_sample])[0]
+
+    def stats(self):
+        """آمار سمت سرور به همراه تأخیر رفت‌وبرگشت همین کلاینت"""
+        stats = self._request({"op": "stats"})["stats"]
+        stats["client_latency"] = _percentiles(list(self.latency_ms))
+        return stats
+
+    def reload(self):
+        return self._request({"op": "reload"})["reloaded"]
+
+    def shutdown(self):
+        return self._request({"op": "shutdown"})
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Standalone batching inference server")
+    parser.add_argument("--address", default=os.environ.get(ADDRESS_ENV),
+                        help=f"socket path / pipe name (default: ${ADDRESS_ENV} or a new unique address)")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+    if not os.environ.get(AUTHKEY_ENV):
+        raise SystemExit(f"Set {AUTHKEY_ENV} to a hex key (e.g. python -c \"import os; print(os.urandom(32).hex())\").")
+    serve(args.address or new_address(), bytes.fromhex(os.environ[AUTHKEY_ENV]),
+          args.max_batch, args.max_wait_ms, announce=True)
@@ -0,0 +1,19 @@
+# src/ml/leaderboard.py
+# خواندن نتیجه تیونر (src/ml/tuner.py) بدون import خود تیونر؛ این ماژول هیچ اثر جانبی در import ندارد
+import json
+import os
+
+LEADERBOARD_PATH = "data/tuning/leaderboard.json"
+
+
+def load_best_params(path=LEADERBOARD_PATH) -> dict:
+    """بهترین پارامترهای هر سر از leaderboard (head → params)؛ اگر فایل نباشد {}"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            board = json.load(f)
+        return {head: entries[0]["params"] for head, entries in board["heads"].items() if entries}
+    except Exception as e:
+        print(f"⚠️ Leaderboard unreadable ({e}). Using default parameters.")
+        return {}
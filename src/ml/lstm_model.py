@@ -1,25 +1,33 @@
 # src/ml/lstm_model.py
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense, Dropout, Input
+# TensorFlow فقط هنگام ساخت/بارگذاری مدل import می‌شود (چند ثانیه؛ نه در شروع برنامه)
 from sklearn.metrics import precision_score
-from sklearn.model_selection import train_test_split
+from src.ml.dataset import DataLabeler
 import numpy as np
 import os
 
 class LSTM_Predictor:
-    def __init__(self, sequence_length=None, num_features=None, model_path="lstm_model.keras"):
+    def __init__(self, sequence_length=None, num_features=None, model_path="lstm_model.keras",
+                 units=50, dropout=0.2, epochs=15, batch_size=32):
         self.model_path = model_path
         self.sequence_length = sequence_length
         self.num_features = num_features
+        # ابرپارامترها (قابل تنظیم از leaderboard تیونر)
+        self.units = units
+        self.dropout = dropout
+        self.epochs = epochs
+        self.batch_size = batch_size
         self.model = None
         self.is_trained = False
 
     def build_model(self):
         """ساخت معماری استاندارد بدون هشدار"""
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import LSTM, Dense, Dropout, Input
+
         model = Sequential([
             Input(shape=(self.sequence_length, self.num_features)), # FIX: لایه ورودی صریح
-            LSTM(50, return_sequences=False),
-            Dropout(0.2),
+            LSTM(self.units, return_sequences=False),
+            Dropout(self.dropout),
             Dense(1, activation='sigmoid') 
         ])
         model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
@@ -30,21 +38,37 @@ class LSTM_Predictor:
         if self.model is None:
             self.model = self.build_model()
 
-        X_train, X_test, y_train, y_test = train_test_split(X_seq, y_target, test_size=0.2, shuffle=False)
+        # تقسیم زمانی 80/20 روی view پنجره‌ها؛ هر دسته جداگانه کپی می‌شود (بدون کپی کل مجموعه)
+        y_target = np.asarray(y_target)
+        n_test = int(np.ceil(0.2 * len(X_seq)))
+        X_train, X_test = X_seq[:-n_test], X_seq[-n_test:]
+        y_train, y_test = y_target[:-n_test], y_target[-n_test:]
         
         print(f"🤖 Training LSTM on {len(X_train)} sequences...")
-        self.model.fit(X_train, y_train, epochs=15, batch_size=32, verbose=0)
+        self.model.fit(self._batches(X_train, y_train), epochs=self.epochs, verbose=0)
         
         # ذخیره مدل آموزش دیده
         self.model.save(self.model_path)
         self.is_trained = True
         
-        preds = (self.model.predict(X_test, verbose=0) > 0.5).astype(int)
-        return precision_score(y_test, preds, zero_division=0)
+        probs = np.concatenate([self.predict_batch(batch) for batch in DataLabeler.iter_batches(X_test)])
+        return precision_score(y_test, (probs > 0.5).astype(int), zero_division=0)
+
+    def _batches(self, X_seq, y):
+        """tf.data روی iter_batches؛ هر epoch مولد از نو با ترتیب تصادفی تازه ساخته می‌شود"""
+        import tensorflow as tf
+
+        signature = (tf.TensorSpec((None, self.sequence_length, self.num_features), tf.float32),
+                     tf.TensorSpec((None,), tf.as_dtype(y.dtype)))
+        return tf.data.Dataset.from_generator(
+            lambda: DataLabeler.iter_batches(X_seq, y, batch_size=self.batch_size, shuffle=True),
+            output_signature=signature,
+        ).prefetch(1)
 
     def load(self):
         """بارگذاری مدل ذخیره شده برای جلوگیری از آموزش مجدد"""
         if os.path.exists(self.model_path):
+            from tensorflow.keras.models import load_model
             try:
                 self.model = load_model(self.model_path)
                 self.is_trained = True
@@ -53,9 +77,17 @@ class LSTM_Predictor:
                 return False
         return False
         
+    def predict_batch(self, X_seq):
+        """
+        احتمال برای دسته‌ای از پنجره‌ها (N×L×F) در یک forward pass.
+        فراخوانی مستقیم model(x, training=False) سربار ثابت predict (ساخت dataset/callback) را ندارد.
+        """
+        X_seq = DataLabeler.materialize(X_seq)
+        return np.asarray(self.model(X_seq, training=False)).reshape(-1)
+
     def predict(self, X_sample):
         if not self.is_trained: return 0, 0.5
         if X_sample.ndim == 2:
             X_sample = np.expand_dims(X_sample, axis=0)
-        prob = self.model.predict(X_sample, verbose=0)[0][0]
+        prob = self.predict_batch(X_sample)[0]
         return (prob > 0.5).astype(int), prob
\ No newline at end of file
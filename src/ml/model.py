@@ -1,22 +1,70 @@
 # src/ml/model.py
-from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
 from sklearn.metrics import precision_score
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
-import shap 
 
 class MarketPredictor:
-    def __init__(self):
-        self.model = GradientBoostingClassifier(
+    """
+    مدل GBM کمکی. TreeExplainer فقط یک بار برای هر مدل آموزش‌دیده/بارگذاری‌شده ساخته می‌شود
+    و توضیح هر ردیف با هش بایت‌های همان ردیف کش می‌شود؛ با آموزش یا ست کردن model هر دو پاک می‌شوند.
+    backend:
+      "gbm"  → GradientBoostingClassifier دقیق (تک‌هسته‌ای)
+      "hist" → HistGradientBoostingClassifier (چندهسته‌ای، پشتیبانی داخلی NaN، توقف زودهنگام روی
+               انتهای زمانی داده آموزش به جای تقسیم تصادفی)
+    """
+    BACKENDS = {
+        "gbm": (GradientBoostingClassifier, dict(
             n_estimators=200,       
             learning_rate=0.01,     
             max_depth=4,            
             min_samples_split=20,   
             subsample=0.9,          
             random_state=42
-        )
+        )),
+        "hist": (HistGradientBoostingClassifier, dict(
+            max_iter=800,
+            learning_rate=0.02,
+            max_leaf_nodes=15,
+            min_samples_leaf=100,
+            l2_regularization=1.0,
+            max_features=0.7,
+            early_stopping=True,
+            n_iter_no_change=50,
+            random_state=42
+        )),
+    }
+    VALIDATION_FRACTION = 0.1
+
+    def __init__(self, params=None, backend="gbm", explain_cache_size=4096):
+        self.explain_cache_size = explain_cache_size
+        self._explainer = None
+        self._explanations = OrderedDict()
+        self.backend = backend
+        # params: ابرپارامترهای تیون‌شده (مثلا از leaderboard) روی مقادیر پیش‌فرض همان backend
+        model_class, defaults = self.BACKENDS[backend]
+        self.model = model_class(**{**defaults, **(params or {})})
         self.is_trained = False
 
+    @property
+    def model(self):
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        # مدل جدید (مثلا joblib.load در EnsemblePredictor) → explainer و کش قبلی معتبر نیستند
+        self._model = model
+        self.invalidate_explainer()
+
+    def invalidate_explainer(self):
+        self._explainer = None
+        self._explanations.clear()
+
+    @staticmethod
+    def _split(data, stop):
+        return (data.iloc[:stop], data.iloc[stop:]) if hasattr(data, 'iloc') else (data[:stop], data[stop:])
+
     def train(self, X, y):
         """آموزش مدل با گزارش‌دهی بدون فیلتر (Raw Precision)"""
         print(f"🤖 Training AI model on {len(X)} samples...")
@@ -33,7 +81,15 @@ class MarketPredictor:
         else:
             y_train, y_test = y[:split], y[split:]
         
-        self.model.fit(X_train, y_train)
+        if getattr(self.model, 'early_stopping', False) is True:
+            # اعتبارسنجی توقف زودهنگام: آخرین بخش زمانی داده آموزش (نه نمونه تصادفی)
+            stop = int(len(X_train) * (1 - self.VALIDATION_FRACTION))
+            X_fit, X_val = self._split(X_train, stop)
+            y_fit, y_val = self._split(y_train, stop)
+            self.model.fit(X_fit, y_fit, X_val=X_val, y_val=y_val)
+        else:
+            self.model.fit(X_train, y_train)
+        self.invalidate_explainer()
         self.is_trained = True
         
         # --- FIX: گزارش دقت واقعی (بدون فیلتر 55%) ---
@@ -60,19 +116,84 @@ class MarketPredictor:
             print(f"Prediction Error: {e}")
             return 0, 0.5
 
+    def _native_contributions(self, X):
+        """
+        مسیر سریع: محاسبه SHAP داخلی خود مدل اگر وجود داشته باشد
+        (LightGBM: pred_contrib، XGBoost: pred_contribs). ستون آخر (bias) حذف می‌شود. وگرنه None.
+        """
+        if hasattr(self.model, 'booster_'):
+            contrib = self.model.predict(X, pred_contrib=True)
+        elif hasattr(self.model, 'get_booster'):
+            import xgboost
+            contrib = self.model.get_booster().predict(xgboost.DMatrix(X), pred_contribs=True)
+        else:
+            return None
+        return np.asarray(contrib)[:, :-1]
+
+    def _shap_values(self, X):
+        contrib = self._native_contributions(X)
+        if contrib is not None:
+            return contrib
+        if self._explainer is None:
+            import shap   # ~0.5s؛ فقط اولین توضیح (یا warm-up پس‌زمینه) هزینه‌اش را می‌دهد
+            self._explainer = shap.TreeExplainer(self.model)
+        values = self._explainer.shap_values(X)
+        # طبقه‌بندهای دو کلاسه بعضی مدل‌ها لیست/آرایه سه‌بعدی برمی‌گردانند: کلاس مثبت
+        if isinstance(values, list):
+            values = values[-1]
+        values = np.asarray(values)
+        return values[..., -1] if values.ndim == 3 else values
+
+    def explain_batch(self, X) -> np.ndarray:
+        """
+        مقادیر SHAP چند ردیف (مثلا آخرین ردیف چند نماد) در یک فراخوانی explainer.
+        فقط ردیف‌هایی که در کش نیستند محاسبه می‌شوند. خروجی: آرایه (n_rows, n_features)
+        """
+        values = X.to_numpy(dtype=np.float64) if hasattr(X, 'to_numpy') else np.asarray(X, dtype=np.float64)
+        values = np.atleast_2d(values)
+        keys = [row.tobytes() for row in values]   # بایت‌های خود ردیف (72 بایت برای 9 ویژگی)، بدون خطر برخورد هش
+        cached = [self._explanations.get(key) for key in keys]
+        missing = [i for i, hit in enumerate(cached) if hit is None]
+
+        if missing:
+            X_missing = X.iloc[missing] if hasattr(X, 'iloc') else values[missing]
+            for i, row in zip(missing, self._shap_values(X_missing)):
+                cached[i] = row
+                self._explanations[keys[i]] = row
+            while len(self._explanations) > self.explain_cache_size:
+                self._explanations.popitem(last=False)
+        for key in keys:
+            if key in self._explanations:
+                self._explanations.move_to_end(key)
+        return np.vstack(cached)
+
+    @staticmethod
+    def _top_features(feature_names, shap_row, top=5):
+        importance = {name: float(np.abs(val)) for name, val in zip(feature_names, shap_row)}
+        return sorted(importance.items(), key=lambda x: x[1], reverse=True)[:top]
+
     def get_feature_importance(self, X_sample):
         if not self.is_trained or (hasattr(X_sample, 'empty') and X_sample.empty):
             return []
         try:
-            explainer = shap.TreeExplainer(self.model)
-            shap_values = explainer.shap_values(X_sample)[0] 
+            shap_values = self.explain_batch(X_sample.iloc[[0]] if hasattr(X_sample, 'iloc') else X_sample[:1])[0]
             
             if hasattr(X_sample, 'columns'):
                 feature_names = X_sample.columns.tolist()
             else:
                 feature_names = [f"F{i}" for i in range(X_sample.shape[1])]
 
-            importance = {name: float(np.abs(val)) for name, val in zip(feature_names, shap_values)}
-            return sorted(importance.items(), key=lambda x: x[1], reverse=True)[:5]
+            return self._top_features(feature_names, shap_values)
         except:
-            return []
\ No newline at end of file
+            return []
+
+    def get_feature_importance_batch(self, X_rows: pd.DataFrame, top=5):
+        """مهم‌ترین ویژگی‌ها برای هر ردیف (مثلا یک ردیف برای هر نماد) با یک فراخوانی explainer"""
+        if not self.is_trained or X_rows.empty:
+            return [[] for _ in range(len(X_rows))]
+        try:
+            shap_values = self.explain_batch(X_rows)
+        except Exception:
+            return [[] for _ in range(len(X_rows))]
+        feature_names = X_rows.columns.tolist()
+        return [self._top_features(feature_names, row, top) for row in shap_values]
\ No newline at end of file
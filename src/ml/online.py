@@ -0,0 +1,298 @@
+# src/ml/online.py
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import log_loss
+
+from src.core.utils import LOGGER
+from src.ml.dataset import DataLabeler, SEQUENCE_LENGTH
+
+# فاصله به‌روزرسانی هر سر (ثانیه)
+UPDATE_INTERVALS = {"logistic": 3600, "lstm": 6 * 3600, "tree": 24 * 3600}
+HOLDOUT_ROWS = 168      # یک هفته کندل ساعتی آخرِ برچسب‌خورده برای مقایسه مدل فعلی و جدید
+MIN_NEW_ROWS = 24       # حداقل ردیف برچسب‌خورده جدید برای به‌روزرسانی افزایشی
+MIN_HOLDOUT_ROWS = 24   # حداقل ردیف holdout که مدل فعلی هنوز ندیده (وگرنه مقایسه انجام نمی‌شود)
+REPLAY_ROWS = 500       # نمونه تصادفی از داده قدیمی‌تر در کنار داده جدید (جلوگیری از فراموشی)
+LSTM_EPOCHS = 3
+
+
+def _candidate_path(path):
+    root, ext = os.path.splitext(path)
+    return f"{root}.candidate{ext}"
+
+
+def _trained_path(model_path):
+    return f"{model_path}.trained.json"
+
+
+def trained_through(model_path):
+    """
+    زمان آخرین ردیفی که مدل فعلی در آموزش دیده (UTC بدون تایم‌زون، هم‌مبنای ایندکس کندل‌ها).
+    بعد از جایگزینی در فایل کناری ثبت می‌شود؛ اگر فایل کناری نباشد یا مدل بعد از آن بازنویسی شده باشد
+    (train_all، جلسه قبل) زمان ذخیره فایل مدل مبناست: مدل نمی‌تواند ردیفی بعد از آن را دیده باشد.
+    """
+    mtime = os.path.getmtime(model_path)
+    try:
+        with open(_trained_path(model_path), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["model_mtime"] == mtime:
+            return pd.Timestamp(meta["trained_through"])
+    except (OSError, ValueError, KeyError):
+        pass
+    return pd.Timestamp(mtime, unit='s')
+
+
+def _record_trained_through(model_path, timestamp):
+    tmp = _trained_path(model_path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"trained_through": pd.Timestamp(timestamp).isoformat(),
+                   "model_mtime": os.path.getmtime(model_path)}, f)
+    os.replace(tmp, _trained_path(model_path))
+
+
+def _loss(y_true, probs):
+    return log_loss(y_true, np.clip(probs, 1e-6, 1 - 1e-6), labels=[0, 1])
+
+
+# --- کارهای آموزش (در پروسه پس‌زمینه) ---
+def _update_logistic(model_path, X_train, y_train, X_hold, y_hold, new_rows, replay, seed):
+    """به‌روزرسانی افزایشی سر لجستیک با SGD (log loss) از ضرایب فعلی"""
+    current = joblib.load(model_path)
+    X_fit, y_fit = _recent_with_replay(X_train, y_train, new_rows, replay, seed)
+    if isinstance(current, SGDClassifier):
+        candidate = joblib.load(model_path)
+        for _ in range(5):
+            candidate.partial_fit(X_fit, y_fit)
+    else:
+        # LogisticRegression → SGDClassifier هم‌شکل که از همان ضرایب شروع می‌کند
+        candidate = SGDClassifier(loss='log_loss', alpha=1e-4, learning_rate='constant', eta0=0.01,
+                                  max_iter=5, tol=None, random_state=seed)
+        candidate.fit(X_fit, y_fit, coef_init=current.coef_, intercept_init=current.intercept_)
+    return (_loss(y_hold, current.predict_proba(X_hold)[:, 1]),
+            _loss(y_hold, candidate.predict_proba(X_hold)[:, 1]),
+            lambda path: joblib.dump(candidate, path), len(X_fit))
+
+
+def _update_tree(model_path, X_train, y_train, X_hold, y_hold, params, backend):
+    """آموزش کامل مدل درختی روی پنجره اخیر (ارزان با backend=hist)"""
+    from src.ml.model import MarketPredictor
+
+    current = joblib.load(model_path)
+    candidate = MarketPredictor(params, backend=backend)
+    candidate.train(X_train, y_train)
+    return (_loss(y_hold, current.predict_proba(X_hold)[:, 1]),
+            _loss(y_hold, candidate.model.predict_proba(X_hold)[:, 1]),
+            lambda path: joblib.dump(candidate.model, path), len(X_train))
+
+
+def _update_lstm(model_path, X_values, y_values, train_stop, hold_start, new_rows, replay, seed):
+    """warm-start: ادامه آموزش همان وزن‌ها چند epoch روی پنجره‌های جدید + نمونه replay"""
+    from tensorflow.keras.models import load_model
+
+    # پنجره i هدف ردیف i + SEQUENCE_LENGTH را پیش‌بینی می‌کند
+    X_seq, y_seq = DataLabeler.create_sequences(X_values, y_values)
+    train_windows = max(0, train_stop - SEQUENCE_LENGTH)
+    hold = slice(hold_start - SEQUENCE_LENGTH, len(X_seq))
+    current = load_model(model_path)
+    candidate = load_model(model_path)
+
+    rng = np.random.default_rng(seed)
+    recent = np.arange(max(0, train_windows - new_rows), train_windows)
+    older = np.arange(0, recent[0] if len(recent) else 0)
+    picked = np.sort(np.concatenate([recent, rng.choice(older, min(replay, len(older)), replace=False)]))
+    candidate.fit(DataLabeler.materialize(X_seq[picked]), y_seq[picked], epochs=LSTM_EPOCHS,
+                  batch_size=32, verbose=0)
+
+    X_hold = DataLabeler.materialize(X_seq[hold])
+    y_hold = y_seq[hold]
+    return (_loss(y_hold, np.asarray(current(X_hold, training=False)).reshape(-1)),
+            _loss(y_hold, np.asarray(candidate(X_hold, training=False)).reshape(-1)),
+            candidate.save, len(picked))
+
+
+def _recent_with_replay(X, y, new_rows, replay, seed):
+    rng = np.random.default_rng(seed)
+    start = max(0, len(X) - new_rows)
+    older = rng.choice(start, min(replay, start), replace=False) if start else np.empty(0, dtype=int)
+    picked = np.sort(np.concatenate([older, np.arange(start, len(X))]))
+    return X.iloc[picked], y.iloc[picked]
+
+
+def run_update(head, model_path, X_values, y_values, columns, train_stop, hold_start, new_rows,
+               replay=REPLAY_ROWS, params=None, backend="hist", seed=42):
+    """
+    یک کار به‌روزرسانی (اجرا در پروسه پس‌زمینه): ساخت مدل کاندید، سنجش مدل فعلی و کاندید روی
+    holdout اخیر (log loss) و ذخیره کاندید کنار فایل اصلی. تصمیم جایگزینی با پروسه اصلی است.
+    """
+    start = time.perf_counter()
+    X = pd.DataFrame(X_values, columns=columns)
+    y = pd.Series(y_values)
+    X_train, y_train = X.iloc[:train_stop], y.iloc[:train_stop]
+    X_hold, y_hold = X.iloc[hold_start:], y.iloc[hold_start:]
+
+    if head == "logistic":
+        current_loss, candidate_loss, save, rows = _update_logistic(
+            model_path, X_train, y_train, X_hold, y_hold, new_rows, replay, seed)
+    elif head == "tree":
+        current_loss, candidate_loss, save, rows = _update_tree(
+            model_path, X_train, y_train, X_hold, y_hold, params, backend)
+    else:
+        current_loss, candidate_loss, save, rows = _update_lstm(
+            model_path, X_values, y_values, train_stop, hold_start, new_rows, replay, seed)
+
+    candidate_path = _candidate_path(model_path)
+    save(candidate_path)
+    return {
+        "head": head,
+        "candidate_path": candidate_path,
+        "current_loss": float(current_loss),
+        "candidate_loss": float(candidate_loss),
+        "rows": int(rows),
+        "train_s": time.perf_counter() - start,
+    }
+
+
+class OnlineTrainer:
+    """
+    زمان‌بند به‌روزرسانی افزایشی مدل‌های EnsemblePredictor:
+      logistic → partial-fit (SGD) روی ردیف‌های تازه برچسب‌خورده، هر ساعت
+      lstm     → warm-start چند epoch روی پنجره‌های جدید، هر ۶ ساعت
+      tree     → آموزش کامل روی پنجره اخیر، روزانه
+    همه آموزش‌ها در یک پروسه پس‌زمینه (spawn) اجرا می‌شوند؛ چرخه زنده فقط کار ثبت می‌کند و
+    نتیجه آماده را بدون انتظار برمی‌دارد. مدل جدید فقط اگر روی holdout اخیر (log loss) از مدل فعلی
+    بهتر باشد جایگزین می‌شود: فایل مدل اتمیک عوض می‌شود و نمونه زنده در ensemble تعویض می‌شود.
+    ردیف‌های holdout تا خروج از پنجره holdout وارد آموزش نمی‌شوند (تأخیری به اندازه holdout).
+    holdout فقط ردیف‌های بعد از trained_through مدل فعلی است (داده‌ای که مدل فعلی در آموزش ندیده)؛
+    تا حداقل min_holdout چنین ردیفی نباشد آن سر به‌روزرسانی نمی‌شود.
+    """
+    def __init__(self, ensemble, intervals=None, holdout=HOLDOUT_ROWS, min_new_rows=MIN_NEW_ROWS,
+                 replay=REPLAY_ROWS, inference_client=None, min_holdout=MIN_HOLDOUT_ROWS):
+        self.ensemble = ensemble
+        self.intervals = {**UPDATE_INTERVALS, **(intervals or {})}
+        self.holdout = holdout
+        self.min_new_rows = min_new_rows
+        self.min_holdout = min_holdout
+        self.replay = replay
+        self.inference_client = inference_client
+        self._pool = None
+        self._pending = {}      # head → (future, زمان آخرین ردیف آموزش)
+        self._last_run = {head: time.monotonic() for head in self.intervals}
+        self.history = []
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: پروسه آموزش وضعیت TensorFlow پروسه اصلی را به ارث نمی‌برد
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _model_path(self, head):
+        if head == "logistic":
+            return self.ensemble.model_file_b
+        if head == "tree":
+            return self.ensemble.model_file_aux
+        return self.ensemble.predictor_A.model_path
+
+    def schedule(self, X: pd.DataFrame, y: pd.Series):
+        """
+        فراخوانی در هر چرخه (ارزان): ثبت کار برای سرهایی که موعدشان رسیده و داده جدید دارند.
+        خروجی: لیست سرهای ثبت‌شده.
+        """
+        if not self.ensemble.is_trained:
+            return []
+        # فقط ردیف‌هایی که سد عمودی‌شان کامل شده برچسب قطعی دارند
+        labeled = len(X) - SEQUENCE_LENGTH
+        if labeled - self.holdout - SEQUENCE_LENGTH <= SEQUENCE_LENGTH * 4:
+            return []
+
+        scheduled = []
+        now = time.monotonic()
+        for head, interval in self.intervals.items():
+            if head in self._pending or now - self._last_run[head] < interval:
+                continue
+            if not os.path.exists(self._model_path(head)):
+                continue
+            # holdout: آخرین ردیف‌های برچسب‌خورده، ولی فقط بعد از آخرین ردیفی که مدل فعلی دیده
+            seen = trained_through(self._model_path(head))
+            hold_start = max(labeled - self.holdout, int((X.index <= seen).sum()))
+            train_stop = hold_start - SEQUENCE_LENGTH   # purge بین آموزش و holdout
+            if labeled - hold_start < self.min_holdout or train_stop <= SEQUENCE_LENGTH * 4:
+                continue
+            train_until = X.index[train_stop - 1]
+            new_rows = int((X.index[:train_stop] > seen).sum())
+            if head != "tree" and new_rows < self.min_new_rows:
+                continue
+
+            self._last_run[head] = now
+            future = self._get_pool().submit(
+                run_update, head, self._model_path(head),
+                X.iloc[:labeled].to_numpy(dtype=np.float64), y.iloc[:labeled].to_numpy(dtype=np.float64),
+                list(X.columns), train_stop, hold_start, new_rows, self.replay,
+                self.ensemble.tuned_params.get(self.ensemble.aux_predictor.backend),
+                self.ensemble.aux_predictor.backend,
+            )
+            self._pending[head] = (future, train_until)
+            scheduled.append(head)
+            LOGGER.info(f"ONLINE: {head} update scheduled ({new_rows} new rows, {labeled - hold_start} holdout rows)")
+        return scheduled
+
+    def apply_ready(self):
+        """
+        برداشتن نتایج آماده (بدون انتظار) و جایگزینی مدل‌های بهتر.
+        باید بین چرخه‌ها روی همان تردی اجرا شود که ensemble را استفاده می‌کند.
+        خروجی: لیست نتایج (با کلید swapped)
+        """
+        events = []
+        for head, (future, train_until) in list(self._pending.items()):
+            if not future.done():
+                continue
+            del self._pending[head]
+            try:
+                result = future.result()
+            except Exception as e:
+                LOGGER.error(f"ONLINE: {head} update failed: {e!r}")
+                events.append({"head": head, "swapped": False, "error": repr(e)})
+                continue
+
+            result["swapped"] = result["candidate_loss"] < result["current_loss"]
+            if result["swapped"]:
+                self._swap(head, result["candidate_path"])
+                _record_trained_through(self._model_path(head), train_until)
+            else:
+                os.remove(result["candidate_path"])
+            LOGGER.info(f"ONLINE: {head} {'SWAPPED' if result['swapped'] else 'kept current'} "
+                        f"(holdout loss {result['current_loss']:.4f} → {result['candidate_loss']:.4f}, "
+                        f"{result['rows']} rows, {result['train_s']:.1f}s)")
+            self.history.append(result)
+            events.append(result)
+
+        if self.inference_client is not None and any(e.get("swapped") for e in events):
+            try:
+                self.inference_client.reload()
+            except Exception as e:
+                LOGGER.warning(f"ONLINE: inference server reload failed: {e!r}")
+        return events
+
+    def _swap(self, head, candidate_path):
+        """جایگزینی اتمیک فایل مدل و نمونه زنده در ensemble"""
+        path = self._model_path(head)
+        os.replace(candidate_path, path)
+        if head == "logistic":
+            self.ensemble.predictor_B = joblib.load(path)
+        elif head == "tree":
+            self.ensemble.aux_predictor.model = joblib.load(path)
+        else:
+            self.ensemble.predictor_A.load()
+
+    def close(self):
+        for future, _ in self._pending.values():
+            future.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
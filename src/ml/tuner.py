@@ -6,74 +6,396 @@ import os
 # این خط باعث می‌شود پایتون پوشه اصلی پروژه را پیدا کند
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
+import argparse
+import hashlib
+import inspect
+import json
+import math
+import multiprocessing
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import TimeSeriesSplit, RandomizedSearchCV
-from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import precision_score, roc_auc_score
+from sklearn.preprocessing import RobustScaler
 
 # اکنون ایمپورت‌ها بدون خطا کار می‌کنند
 from src.ingest.big_data import BigDataManager
+from src.ingest.store import PRICE_COLUMNS
+from src.features import kernels
 from src.features.indicators import TechnicalFeatures
-from src.ml.dataset import DataLabeler
+from src.ml.dataset import DataLabeler, SEQUENCE_LENGTH
+from src.ml.leaderboard import LEADERBOARD_PATH
 
-def run_tuning():
-    print("🧪 Starting Hyperparameter Tuning (Optimization)...")
-    
-    # 1. بارگذاری داده‌ها
-    mgr = BigDataManager()
-    # اگر فایل دیتا نبود، ارور نده، بلکه تلاش کن بسازی یا لود کنی
-    if not os.path.exists("data/history_50k.csv"):
-        print("❌ Data file not found. Please run the main app first to generate data.")
-        return
+CACHE_ROOT = "data/cache/features"
+FEATURE_CONFIG_VERSION = 2
 
-    # بارگذاری کل دیتا برای تیونینگ
-    print("📂 Loading 50k dataset...")
-    df = pd.read_csv("data/history_50k.csv", index_col=0, parse_dates=True)
-    print(f"   Data loaded: {len(df)} rows")
-    
-    # 2. پردازش
-    print("⚙️ Calculating Indicators...")
-    df = TechnicalFeatures.add_all(df)
-    
-    print("🏷️ Labeling & Scaling...")
-    labeler = DataLabeler()
-    # توجه: اینجا فقط به X و y نیاز داریم، Scaler را نادیده می‌گیریم
-    X, y, _ = labeler.prepare(df)
-    
-    # 3. تعریف فضای جستجو (Grid)
-    param_dist = {
+# فضای جستجوی هر سر EnsemblePredictor
+SEARCH_SPACES = {
+    "gbm": {
         'n_estimators': [200, 400, 600, 800],
         'learning_rate': [0.01, 0.03, 0.05, 0.1],
         'max_depth': [3, 4, 5, 6],
         'min_samples_split': [10, 20, 50],
         'subsample': [0.8, 0.9, 1.0]
+    },
+    "hist": {
+        'learning_rate': [0.01, 0.02, 0.05, 0.1],
+        'max_leaf_nodes': [8, 15, 31],
+        'min_samples_leaf': [20, 50, 100, 200],
+        'l2_regularization': [0.0, 1.0, 5.0],
+        'max_features': [0.7, 1.0]
+    },
+    "logistic": {
+        'C': [0.01, 0.1, 1.0, 10.0],
+        'penalty': ['l1', 'l2'],
+        'class_weight': [None, 'balanced']
+    },
+    "lstm": {
+        'units': [32, 50, 64],
+        'dropout': [0.1, 0.2, 0.3],
+        'epochs': [15, 30],
+        'batch_size': [32, 64]
+    },
+}
+# تنظیمات فعلی مدل‌ها؛ همیشه به عنوان مبنای مقایسه در جستجو هستند
+BASELINES = {
+    "gbm": {'n_estimators': 200, 'learning_rate': 0.01, 'max_depth': 4, 'min_samples_split': 20, 'subsample': 0.9},
+    "hist": {'learning_rate': 0.02, 'max_leaf_nodes': 15, 'min_samples_leaf': 100, 'l2_regularization': 1.0,
+             'max_features': 0.7},
+    "logistic": {'C': 1.0, 'penalty': 'l2', 'class_weight': None},
+    "lstm": {'units': 50, 'dropout': 0.2, 'epochs': 15, 'batch_size': 32},
+}
+
+
+class FeatureCache:
+    """
+    کش دیسکی X/y آماده (اندیکاتورها + برچسب Triple Barrier).
+    X نرمال‌نشده است: scaler هر فولد فقط روی ردیف‌های آموزش همان فولد fit می‌شود (بدون نشت آمار دوره تست).
+    کلید = هش داده خام + هش پیکربندی ویژگی‌ها (سورس add_all/prepare)، پس تغییر هر کدام کش را باطل می‌کند.
+    آرایه‌ها .npy هستند تا پروسه‌های تیونر آن‌ها را با mmap (بدون کپی) بخوانند.
+    """
+    def __init__(self, root=CACHE_ROOT):
+        self.root = root
+
+    @staticmethod
+    def feature_config():
+        # backend اندیکاتورها هم بخشی از کلید است (خروجی‌ها در حد 1e-12 متفاوت‌اند)
+        parts = [str(FEATURE_CONFIG_VERSION), str(SEQUENCE_LENGTH), kernels.resolve_backend()]
+        for fn in (TechnicalFeatures.add_all, DataLabeler.prepare, DataLabeler.apply_triple_barrier):
+            parts.append(inspect.getsource(fn))
+        parts.append(inspect.getsource(kernels))
+        return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def key(self, df: pd.DataFrame):
+        digest = hashlib.sha1()
+        digest.update(df.index.to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+        digest.update(np.ascontiguousarray(df[PRICE_COLUMNS].to_numpy(dtype=np.float64)).tobytes())
+        digest.update(self.feature_config().encode("utf-8"))
+        return digest.hexdigest()[:20]
+
+    def load_or_build(self, df: pd.DataFrame):
+        """خروجی: (مسیر کش، X، y)؛ فقط در اولین اجرا برای این داده/پیکربندی محاسبه می‌شود"""
+        folder = os.path.join(self.root, self.key(df))
+        if os.path.exists(os.path.join(folder, "meta.json")):
+            print(f"♻️ Feature cache hit: {folder}")
+            X, y = self.load(folder)
+            return folder, X, y
+
+        print("⚙️ Calculating Indicators...")
+        features = TechnicalFeatures.add_all(df)
+        print("🏷️ Labeling...")
+        X, y, _ = DataLabeler.prepare(features, scale=False)
+
+        tmp = folder + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "X.npy"), X.to_numpy(dtype=np.float64))
+        np.save(os.path.join(tmp, "y.npy"), y.to_numpy(dtype=np.float64))
+        np.save(os.path.join(tmp, "index.npy"), X.index.to_numpy(dtype='datetime64[ns]').view(np.int64))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"columns": X.columns.tolist(), "rows": len(X),
+                       "created": datetime.now().isoformat(timespec="seconds")}, f)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.replace(tmp, folder)
+        return folder, X, y
+
+    @staticmethod
+    def load(folder, mmap_mode=None):
+        with open(os.path.join(folder, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = pd.DatetimeIndex(np.load(os.path.join(folder, "index.npy")).view('datetime64[ns]'))
+        X = pd.DataFrame(np.load(os.path.join(folder, "X.npy"), mmap_mode=mmap_mode),
+                         columns=meta["columns"], index=index)
+        y = pd.Series(np.load(os.path.join(folder, "y.npy"), mmap_mode=mmap_mode), index=index)
+        return X, y
+
+
+def walk_forward_folds(n_rows, n_splits=4, purge=SEQUENCE_LENGTH, embargo=0.01):
+    """
+    فولدهای walk-forward با پنجره آموزش رو به گسترش: [(train_stop, test_start, test_stop), ...]
+    purge: برچسب ردیف t تا horizon کندل بعد را می‌بیند، پس این تعداد ردیف آخر آموزش حذف می‌شود.
+    embargo: فاصله اضافه (کسری از داده) بین آموزش و تست برای همبستگی سریالی ویژگی‌ها.
+    """
+    test_size = n_rows // (n_splits + 1)
+    gap = purge + int(math.ceil(embargo * n_rows))
+    folds = []
+    for k in range(n_splits):
+        test_start = n_rows - (n_splits - k) * test_size
+        train_stop = test_start - gap
+        if train_stop > SEQUENCE_LENGTH * 4:
+            folds.append((train_stop, test_start, test_start + test_size))
+    return folds
+
+
+def sample_candidates(head, n, seed=42):
+    """مبنا + نمونه‌های تصادفی یکتا از فضای جستجو"""
+    space = SEARCH_SPACES[head]
+    rng = np.random.default_rng(seed)
+    candidates = [dict(BASELINES[head])]
+    seen = {json.dumps(candidates[0], sort_keys=True)}
+    total = int(np.prod([len(v) for v in space.values()]))
+    while len(candidates) < min(n, total):
+        params = {name: values[rng.integers(len(values))] for name, values in space.items()}
+        params = {k: (v.item() if hasattr(v, 'item') else v) for k, v in params.items()}
+        key = json.dumps(params, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+
+# --- ارزیابی (داخل پروسه‌های pool) ---
+_DATA = {}
+
+
+def _load_cached(folder):
+    if folder not in _DATA:
+        X, y = FeatureCache.load(folder, mmap_mode='r')
+        _DATA[folder] = (X.to_numpy(), y.to_numpy())
+    return _DATA[folder]
+
+
+def _scale_fold(X_values, train_stop):
+    """RobustScaler فقط روی ردیف‌های آموزش فولد؛ خروجی کپی نرمال‌شده کل X (تست با همان آمار آموزش)"""
+    scaler = RobustScaler().fit(X_values[:train_stop])
+    return (X_values - scaler.center_) / scaler.scale_
+
+
+def _fit_gbm(params, X_train, y_train, X_test):
+    # توقف زودهنگام: درخت‌های اضافه روی validation داخلی ساخته نمی‌شوند
+    model = GradientBoostingClassifier(random_state=42, n_iter_no_change=10, validation_fraction=0.1, **params)
+    model.fit(X_train, y_train)
+    return model.predict_proba(X_test)[:, 1], {"n_estimators": int(model.n_estimators_)}
+
+
+def _fit_hist(params, X_train, y_train, X_test):
+    # توقف زودهنگام روی انتهای زمانی داده آموزش (مثل MarketPredictor.train)
+    model = HistGradientBoostingClassifier(random_state=42, max_iter=800, early_stopping=True,
+                                           n_iter_no_change=50, **params)
+    stop = int(len(X_train) * 0.9)
+    model.fit(X_train[:stop], y_train[:stop], X_val=X_train[stop:], y_val=y_train[stop:])
+    return model.predict_proba(X_test)[:, 1], {"max_iter": int(model.n_iter_)}
+
+
+def _fit_logistic(params, X_train, y_train, X_test):
+    model = LogisticRegression(random_state=42, solver='liblinear', **params)
+    model.fit(X_train, y_train)
+    return model.predict_proba(X_test)[:, 1], {}
+
+
+def _fit_lstm(params, X_values, y_values, train_stop, test_start, test_stop):
+    from tensorflow.keras.callbacks import EarlyStopping
+    from src.ml.lstm_model import LSTM_Predictor
+
+    # پنجره‌های آموزش فقط از ردیف‌های آموزش؛ پنجره‌های تست از ویژگی‌های گذشته همان کندل‌ها
+    X_seq, y_seq = DataLabeler.create_sequences(X_values[:train_stop], y_values[:train_stop])
+    X_test_seq, _ = DataLabeler.create_sequences(X_values[test_start - SEQUENCE_LENGTH:test_stop],
+                                                 y_values[test_start - SEQUENCE_LENGTH:test_stop])
+    predictor = LSTM_Predictor(SEQUENCE_LENGTH, X_values.shape[1], **params)
+    predictor.model = predictor.build_model()
+    stopper = EarlyStopping(patience=3, restore_best_weights=True)
+    history = predictor.model.fit(DataLabeler.materialize(X_seq), y_seq, epochs=predictor.epochs,
+                                  batch_size=predictor.batch_size, validation_split=0.1,
+                                  callbacks=[stopper], verbose=0)
+    best_epoch = int(np.argmin(history.history['val_loss'])) + 1
+    return predictor.predict_batch(X_test_seq), {"epochs": best_epoch}
+
+
+def evaluate_fold(folder, head, params, fold, scoring="precision"):
+    """آموزش یک کاندید روی یک فولد و امتیاز آن روی بخش تست"""
+    X_values, y_values = _load_cached(folder)
+    train_stop, test_start, test_stop = fold
+    X_values = _scale_fold(X_values, train_stop)
+    y_test = np.asarray(y_values[test_start:test_stop])
+    start = time.perf_counter()
+
+    if head == "lstm":
+        probs, fitted = _fit_lstm(params, X_values, y_values, train_stop, test_start, test_stop)
+    else:
+        fit = {"gbm": _fit_gbm, "hist": _fit_hist, "logistic": _fit_logistic}[head]
+        probs, fitted = fit(params, X_values[:train_stop], y_values[:train_stop], X_values[test_start:test_stop])
+
+    precision = precision_score(y_test, probs >= 0.5, zero_division=0)
+    auc = roc_auc_score(y_test, probs) if len(np.unique(y_test)) > 1 else 0.5
+    return {
+        "score": precision if scoring == "precision" else auc,
+        "precision": precision,
+        "auc": auc,
+        "signals": int((probs >= 0.5).sum()),
+        "fit_s": time.perf_counter() - start,
+        "fitted": fitted,
+    }
+
+
+# --- جستجو ---
+class WalkForwardTuner:
+    """
+    جستجوی ابرپارامتر با Successive Halving: همه کاندیدها روی فولدهای اول (آموزش کوتاه و ارزان)،
+    سپس فقط بهترین 1/eta به فولدهای بعدی می‌روند تا بازماندگان روی همه فولدها سنجیده شوند.
+    ارزیابی‌های (کاندید، فولد) در یک ProcessPoolExecutor موازی اجرا می‌شوند.
+    """
+    def __init__(self, folder, folds, scoring="precision", eta=2, processes=None):
+        self.folder = folder
+        self.folds = folds
+        self.scoring = scoring
+        self.eta = eta
+        self.processes = processes or max(1, (os.cpu_count() or 2) - 1)
+
+    def _rungs(self):
+        rungs, used = [], 1
+        while used < len(self.folds):
+            rungs.append(used)
+            used *= self.eta
+        return rungs + [len(self.folds)]
+
+    def search(self, pool, head, candidates):
+        results = {i: {} for i in range(len(candidates))}  # candidate → {fold: نتیجه}
+        alive = list(range(len(candidates)))
+
+        for rung, n_folds in enumerate(self._rungs()):
+            futures = {
+                (i, f): pool.submit(evaluate_fold, self.folder, head, candidates[i], self.folds[f], self.scoring)
+                for i in alive for f in range(n_folds) if f not in results[i]
+            }
+            for (i, f), future in futures.items():
+                try:
+                    results[i][f] = future.result()
+                except Exception as e:
+                    print(f"   ❌ {head} {candidates[i]} fold {f}: {e}")
+                    results[i][f] = {"score": -1.0, "precision": 0.0, "auc": 0.0, "signals": 0,
+                                     "fit_s": 0.0, "fitted": {}}
+
+            ranked = sorted(alive, key=lambda i: -np.mean([r["score"] for r in results[i].values()]))
+            print(f"   {head} rung {rung}: {len(alive)} candidates × {n_folds} folds | "
+                  f"best {self.scoring}={np.mean([r['score'] for r in results[ranked[0]].values()]):.2%}")
+            if n_folds < len(self.folds):
+                alive = ranked[:max(1, math.ceil(len(alive) / self.eta))]
+
+        return self._leaderboard(candidates, results)
+
+    def _leaderboard(self, candidates, results):
+        entries = []
+        for i, params in enumerate(candidates):
+            runs = list(results[i].values())
+            tuned = dict(params)
+            # مقدار واقعی بعد از توقف زودهنگام (میانه فولدها) جایگزین سقف جستجو می‌شود
+            for name in ("n_estimators", "max_iter", "epochs"):
+                fitted = [r["fitted"][name] for r in runs if name in r["fitted"]]
+                if fitted:
+                    tuned[name] = int(np.median(fitted))
+            entries.append({
+                "params": tuned,
+                "searched": params,
+                "folds": len(runs),
+                "score": float(np.mean([r["score"] for r in runs])),
+                "precision": float(np.mean([r["precision"] for r in runs])),
+                "auc": float(np.mean([r["auc"] for r in runs])),
+                "signals": int(np.sum([r["signals"] for r in runs])),
+                "fit_s": float(np.sum([r["fit_s"] for r in runs])),
+            })
+        entries.sort(key=lambda e: (-e["folds"], -e["score"]))
+        for rank, entry in enumerate(entries, 1):
+            entry["rank"] = rank
+        return entries
+
+
+def run_tuning(heads=("hist", "logistic"), candidates=12, n_splits=4, embargo=0.01, eta=2,
+               scoring="precision", processes=None, leaderboard_path=LEADERBOARD_PATH, cache_root=CACHE_ROOT):
+    print("🧪 Starting Walk-Forward Hyperparameter Tuning...")
+
+    # 1. بارگذاری داده‌ها
+    mgr = BigDataManager()
+
+    # بارگذاری کل دیتا برای تیونینگ (از انبار ستونی؛ بار اول از CSV مهاجرت می‌کند)
+    print("📂 Loading 50k dataset...")
+    df = mgr.load_history()
+    if df.empty:
+        print("❌ Data file not found. Please run the main app first to generate data.")
+        return
+    print(f"   Data loaded: {len(df)} rows")
+
+    # 2. ویژگی‌ها و برچسب‌ها (از کش اگر داده و پیکربندی تغییر نکرده باشد)
+    folder, X, y = FeatureCache(cache_root).load_or_build(df)
+    folds = walk_forward_folds(len(X), n_splits=n_splits, embargo=embargo)
+    if not folds:
+        print("❌ Not enough rows for walk-forward folds.")
+        return
+    print(f"   {len(X)} samples | {len(folds)} folds | purge={SEQUENCE_LENGTH} embargo={embargo:.1%}")
+
+    # 3. جستجو برای هر سر
+    tuner = WalkForwardTuner(folder, folds, scoring=scoring, eta=eta, processes=processes)
+    board = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "data_key": os.path.basename(folder),
+        "rows": len(X),
+        "folds": folds,
+        "purge": SEQUENCE_LENGTH,
+        "embargo": embargo,
+        "scoring": scoring,
+        "heads": {},
     }
-    
-    # 4. مدل پایه
-    model = GradientBoostingClassifier(random_state=42)
-    
-    # 5. جستجوی تصادفی (Random Search)
-    tscv = TimeSeriesSplit(n_splits=3)
-    
-    search = RandomizedSearchCV(
-        estimator=model,
-        param_distributions=param_dist,
-        n_iter=10, # تعداد تست‌ها (می‌توانید بیشتر کنید، مثلا 20)
-        scoring='precision', 
-        cv=tscv,
-        verbose=1,
-        n_jobs=-1
-    )
-    
-    print("🚀 Tuning in progress... (This may take a few minutes)")
-    search.fit(X, y)
-    
-    print("\n✅ Optimization Complete!")
-    print(f"🏆 Best Precision Score: {search.best_score_:.2%}")
-    print("🏆 Best Parameters:")
-    print(search.best_params_)
-    
-    return search.best_params_
+    previous = {}
+    if os.path.exists(leaderboard_path):
+        with open(leaderboard_path, "r", encoding="utf-8") as f:
+            previous = json.load(f).get("heads", {})
+
+    print("🚀 Tuning in progress...")
+    start = time.time()
+    # spawn: پروسه‌ها وضعیت TensorFlow پروسه اصلی را به ارث نمی‌برند
+    with ProcessPoolExecutor(max_workers=tuner.processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for head in heads:
+            board["heads"][head] = tuner.search(pool, head, sample_candidates(head, candidates))
+            best = board["heads"][head][0]
+            print(f"🏆 {head}: {scoring}={best['score']:.2%} auc={best['auc']:.3f} | {best['params']}")
+
+    # سرهایی که این بار تیون نشدند از leaderboard قبلی حفظ می‌شوند
+    for head, entries in previous.items():
+        board["heads"].setdefault(head, entries)
+
+    os.makedirs(os.path.dirname(leaderboard_path) or ".", exist_ok=True)
+    with open(leaderboard_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(board, f, indent=2)
+    os.replace(leaderboard_path + ".tmp", leaderboard_path)
+
+    print(f"\n✅ Optimization Complete in {time.time() - start:.0f}s → {leaderboard_path}")
+    return {head: entries[0]["params"] for head, entries in board["heads"].items()}
 
 if __name__ == "__main__":
-    run_tuning()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Walk-forward hyperparameter search for EnsemblePredictor")
+    parser.add_argument("--heads", nargs="+", default=["hist", "logistic"], choices=list(SEARCH_SPACES))
+    parser.add_argument("--candidates", type=int, default=12, help="candidates per head (incl. baseline)")
+    parser.add_argument("--splits", type=int, default=4)
+    parser.add_argument("--embargo", type=float, default=0.01)
+    parser.add_argument("--eta", type=int, default=2, help="successive halving factor")
+    parser.add_argument("--scoring", choices=["precision", "auc"], default="precision")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    run_tuning(args.heads, args.candidates, args.splits, args.embargo, args.eta,
+               args.scoring, args.processes)
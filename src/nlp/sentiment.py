@@ -21,8 +21,13 @@ class NewsAnalyzer:
         """
         دریافت اخبار واقعی. اگر خبری نبود، لیست خالی برمی‌گرداند (بدون فیک).
         """
-        news_list = self.fetch_real_news()
-        
+        return self._score(self.fetch_real_news())
+
+    async def analyze_headlines_async(self, session) -> dict:
+        """همان analyze_headlines اما با aiohttp روی session مشترک ورکر"""
+        return self._score(await self.fetch_real_news_async(session))
+
+    def _score(self, news_list) -> dict:
         if not news_list:
             LOGGER.warning("NLP: No real news fetched. Returning empty list.")
             # --- تغییر مهم: دیگر خبری از simulate_data نیست ---
@@ -47,33 +52,45 @@ class NewsAnalyzer:
             # تایم‌اوت کم (5 ثانیه) تا اگر اینترنت قطع بود سریع رد شود و برنامه را کند نکند
             response = requests.get(self.rss_url, headers=self.headers, timeout=5, verify=False, proxies=self.proxies)
             if response.status_code != 200: return None
+            return self._parse_feed(response.content)
+        except Exception as e:
+            LOGGER.error(f"NLP Error: {e}")
+            return None
+
+    async def fetch_real_news_async(self, session, timeout=5):
+        try:
+            async with session.get(self.rss_url, headers=self.headers, timeout=timeout, ssl=False) as response:
+                if response.status != 200: return None
+                content = await response.read()
+            return self._parse_feed(content)
+        except Exception as e:
+            LOGGER.error(f"NLP Error: {e}")
+            return None
+
+    def _parse_feed(self, content):
+        root = ET.fromstring(content)
+        news_items = []
+        
+        for item in root.findall('./channel/item')[:15]: # 15 خبر آخر
+            title = item.find('title').text
+            pub_date = item.find('pubDate').text
             
-            root = ET.fromstring(response.content)
-            news_items = []
+            try:
+                dt = datetime.strptime(pub_date, "%a, %d %b %Y %H:%M:%S %z")
+                time_str = dt.strftime("%H:%M")
+            except:
+                time_str = datetime.now().strftime("%H:%M")
             
-            for item in root.findall('./channel/item')[:15]: # 15 خبر آخر
-                title = item.find('title').text
-                pub_date = item.find('pubDate').text
-                
-                try:
-                    dt = datetime.strptime(pub_date, "%a, %d %b %Y %H:%M:%S %z")
-                    time_str = dt.strftime("%H:%M")
-                except:
-                    time_str = datetime.now().strftime("%H:%M")
-                
-                sentiment = 'neutral'
-                t_lower = title.lower()
-                if any(w in t_lower for w in self.bullish_keywords): sentiment = 'positive'
-                elif any(w in t_lower for w in self.bearish_keywords): sentiment = 'negative'
-                
-                news_items.append({
-                    'title': title, 
-                    'source': 'CoinTelegraph', 
-                    'time': time_str, 
-                    'sentiment': sentiment
-                })
+            sentiment = 'neutral'
+            t_lower = title.lower()
+            if any(w in t_lower for w in self.bullish_keywords): sentiment = 'positive'
+            elif any(w in t_lower for w in self.bearish_keywords): sentiment = 'negative'
             
-            return news_items
-        except Exception as e:
-            LOGGER.error(f"NLP Error: {e}")
-            return None
\ No newline at end of file
+            news_items.append({
+                'title': title, 
+                'source': 'CoinTelegraph', 
+                'time': time_str, 
+                'sentiment': sentiment
+            })
+        
+        return news_items
\ No newline at end of file
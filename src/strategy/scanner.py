@@ -0,0 +1,329 @@
+# src/strategy/scanner.py
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.ingest.wallex import WallexConnector, OHLCV_TIMEOUT, MACRO_TIMEOUT
+from src.nlp.sentiment import NewsAnalyzer
+from src.core.persistence import DBManager
+from src.core.utils import LOGGER
+
+# بازارهای تومانی تحت نظر
+WATCHLIST = [
+    "BTCTMN", "ETHTMN", "USDTTMN", "BNBTMN", "XRPTMN", "ADATMN", "DOGETMN", "SOLTMN",
+    "TRXTMN", "DOTTMN", "LTCTMN", "BCHTMN", "LINKTMN", "AVAXTMN", "MATICTMN", "ATOMTMN",
+    "XLMTMN", "ETCTMN", "FILTMN", "UNITMN", "SHIBTMN", "TONTMN", "NOTTMN", "PAXGTMN",
+]
+
+# مهلت هر تلاش (ثانیه)؛ مهلت کل هر دریافت exchange.fetch_budgets(SCAN_TIMEOUTS) است
+SCAN_TIMEOUTS = {"ohlcv": OHLCV_TIMEOUT, "macro": MACRO_TIMEOUT, "news": 5}
+
+# وضعیت هر پروسه کارگر (مدل‌ها یک بار در هر پروسه بارگذاری می‌شوند)
+_ENSEMBLE = None
+_STRATEGY = None
+_CLIENT = None
+
+
+def _worker_ensemble(num_features):
+    """بارگذاری تنبل مدل‌های ذخیره‌شده در پروسه کارگر؛ اگر مدلی نبود False (در اسکن آموزش نمی‌دهیم)"""
+    global _ENSEMBLE
+    if _ENSEMBLE is None:
+        from src.ml.ensemble import EnsemblePredictor
+        from src.ml.dataset import SEQUENCE_LENGTH
+        _ENSEMBLE = EnsemblePredictor()
+        if not _ENSEMBLE.load_if_exists(SEQUENCE_LENGTH, num_features):
+            LOGGER.warning("SCANNER: No saved models found. AI disabled in scan.")
+    return _ENSEMBLE if _ENSEMBLE.is_trained else None
+
+
+def _worker_client(address, authkey):
+    """اتصال پروسه کارگر به سرور استنتاج مشترک (به جای بارگذاری مدل‌ها در هر پروسه)"""
+    global _CLIENT
+    if _CLIENT is None:
+        from src.ml.inference import InferenceClient
+        _CLIENT = InferenceClient(address, authkey)
+    return _CLIENT
+
+
+def analyze_symbol(symbol, live_df, macro_data=None, sentiment_score=50, inference_address=None,
+                   inference_authkey=None):
+    """
+    تحلیل کامل یک نماد (اجرا در ProcessPoolExecutor؛ باید در سطح ماژول باشد تا pickle شود).
+    اگر inference_address داده شود، پیش‌بینی از سرور استنتاج گرفته می‌شود
+    (inference_authkey: کلید همان InferenceServer).
+    خروجی: dict سطر جدول رتبه‌بندی
+    """
+    global _STRATEGY
+    from src.features.indicators import TechnicalFeatures
+    from src.features.block import FeatureBlock, budget_from_env
+    from src.ml.dataset import DataLabeler, SEQUENCE_LENGTH
+    from src.strategy.scoring import SmartStrategy
+
+    start = time.perf_counter()
+    if _STRATEGY is None:
+        _STRATEGY = SmartStrategy()
+
+    df = live_df.set_index('timestamp') if 'timestamp' in live_df.columns else live_df
+    df_processed = TechnicalFeatures.add_all(df)
+    if df_processed.empty:
+        raise ValueError(f"{symbol}: not enough candles for indicators")
+    # بلوک فشرده float32 برای بقیه مسیر (سقف حافظه هر نماد با PIED_PIPER_FEATURE_MB)
+    df_processed = FeatureBlock.from_frame(df_processed, budget_mb=budget_from_env()).frame()
+
+    strat_res = _STRATEGY.analyze(df_processed.tail(100), macro_data, sentiment_score)
+
+    ai_conf = 0.5
+    X, _, _ = DataLabeler.prepare(df_processed)
+    if inference_address:
+        predictor = _worker_client(inference_address, inference_authkey)
+    else:
+        predictor = _worker_ensemble(X.shape[1])
+    if predictor is not None and len(X) > SEQUENCE_LENGTH:
+        _, ai_conf = predictor.predict_combined(X.tail(SEQUENCE_LENGTH + 1))
+
+    # قیمت دقیق float64 (نه بلوک float32)
+    return _result_row(symbol, strat_res, ai_conf, float(df['close'].iloc[-1]), start)
+
+
+def analyze_panel(frames, macro_data=None, sentiment_score=50, inference_address=None, inference_authkey=None):
+    """
+    تحلیل دسته‌ای چند نماد ({symbol: DataFrame}) در یک فراخوانی پروسه کارگر:
+    اندیکاتورهای همه نمادها با PanelFeatures در یک پاس و پیش‌بینی همه در یک دسته (به جای سربار
+    add_all و predict جدا برای هر نماد). analyze_ms هر سطر زمان کل همین دسته است.
+    خروجی: لیست سطرهای جدول (مثل analyze_symbol)؛ نماد بدون کندل کافی با error.
+    """
+    global _STRATEGY
+    from src.features.panel import PanelFeatures
+    from src.ml.dataset import DataLabeler
+    from src.strategy.scoring import SmartStrategy
+
+    start = time.perf_counter()
+    if _STRATEGY is None:
+        _STRATEGY = SmartStrategy()
+
+    panel = PanelFeatures.from_frames(frames)
+    X, valid, columns = DataLabeler.prepare_panel(panel)
+    probs = np.full(len(panel), np.nan)
+    if inference_address:
+        windows, last_rows, symbols = DataLabeler.panel_sequences(X, valid)
+        samples = [pd.DataFrame(np.vstack([windows[i], last_rows[i]]), columns=columns) for i in range(len(symbols))]
+        probs[symbols] = [prob for _, prob in _worker_client(inference_address, inference_authkey).predict_many(samples)]
+    else:
+        predictor = _worker_ensemble(len(columns))
+        if predictor is not None:
+            probs = predictor.predict_panel(X, valid, columns)
+
+    rows = []
+    for s, symbol in enumerate(panel.symbols):
+        df_processed = panel.frame(symbol)
+        if df_processed.empty:
+            rows.append({"symbol": symbol, "error": f"{symbol}: not enough candles for indicators"})
+            continue
+        strat_res = _STRATEGY.analyze(df_processed.tail(100), macro_data, sentiment_score)
+        ai_conf = 0.5 if np.isnan(probs[s]) else probs[s]
+        rows.append(_result_row(symbol, strat_res, ai_conf, float(frames[symbol]['close'].iloc[-1]), start))
+    return rows
+
+
+def _result_row(symbol, strat_res, ai_conf, price, start):
+    ai_conf = float(ai_conf)
+    ai_direction = "WAIT"
+    if ai_conf >= 0.55:
+        ai_direction = "BUY"
+    elif ai_conf <= 0.45:
+        ai_direction = "SELL"
+
+    # Consensus (همان منطق ورکر)
+    consensus = "WAIT"
+    if strat_res['action'] == "BUY" and ai_direction == "BUY":
+        consensus = "BUY"
+    elif strat_res['action'] == "SELL" and ai_direction == "SELL":
+        consensus = "SELL"
+
+    return {
+        "symbol": symbol,
+        "signal": consensus,
+        "strategy": strat_res['action'],
+        "score": strat_res['score'],
+        "ai": ai_direction,
+        "ai_conf": ai_conf,
+        "price": price,
+        "analyze_ms": (time.perf_counter() - start) * 1000,
+        "error": "",
+    }
+
+
+class MultiSymbolScanner:
+    """
+    اسکنر هم‌زمان چند نماد:
+    دریافت OHLCV همه نمادها روی یک session با سقف هم‌زمانی (Semaphore)،
+    محاسبه ویژگی‌ها و پیش‌بینی هر نماد در ProcessPoolExecutor،
+    و ذخیره همه سیگنال‌ها در یک تراکنش.
+    batched=True: اول همه نمادها دریافت و بعد یک‌جا با analyze_panel تحلیل می‌شوند (سربار هر نماد کمتر،
+    اما تحلیل منتظر کندترین دریافت می‌ماند).
+    """
+    def __init__(self, symbols=None, timeframe="1h", limit=500, max_concurrency=5, processes=None,
+                 inference_address=None, inference_authkey=None, batched=False):
+        self.symbols = [s.upper() for s in (symbols or WATCHLIST)]
+        self.timeframe = timeframe
+        self.limit = limit
+        self.max_concurrency = max_concurrency
+        self.processes = processes
+        self.inference_address = inference_address
+        self.inference_authkey = inference_authkey
+        self.batched = batched
+        self.nlp = NewsAnalyzer()
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: پروسه‌ها وضعیت TensorFlow پروسه اصلی را به ارث نمی‌برند
+            self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    async def _fetch_symbol(self, exchange, semaphore, symbol):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                df = await asyncio.wait_for(
+                    exchange.fetch_ohlcv(symbol, timeframe=self.timeframe, limit=self.limit),
+                    exchange.fetch_budgets(SCAN_TIMEOUTS)["ohlcv"])
+            except Exception as e:
+                LOGGER.warning(f"SCANNER: {symbol} fetch failed: {e!r}")
+                df = None
+            return df, (time.perf_counter() - start) * 1000
+
+    async def _scan_symbol(self, exchange, semaphore, symbol, context):
+        """دریافت و سپس تحلیل یک نماد؛ تحلیل هر نماد به محض رسیدن داده‌اش شروع می‌شود"""
+        cycle_start = time.perf_counter()
+        df, fetch_ms = await self._fetch_symbol(exchange, semaphore, symbol)
+        row = {"symbol": symbol, "signal": "ERROR", "fetch_ms": fetch_ms}
+        if df is None or df.empty:
+            row["error"] = "no data"
+        else:
+            # ماکرو و اخبار فقط یک بار در هر چرخه دریافت می‌شوند
+            macro_data, sentiment_score = await context
+            loop = asyncio.get_running_loop()
+            try:
+                row.update(await loop.run_in_executor(
+                    self._get_pool(), analyze_symbol, symbol, df, macro_data, sentiment_score,
+                    self.inference_address, self.inference_authkey))
+            except Exception as e:
+                LOGGER.warning(f"SCANNER: {symbol} analysis failed: {e!r}")
+                row["error"] = str(e)[:60]
+        row["total_ms"] = (time.perf_counter() - cycle_start) * 1000
+        return row
+
+    async def _scan_batched(self, exchange, semaphore, context):
+        """دریافت همه نمادها، سپس یک فراخوانی analyze_panel برای همه"""
+        cycle_start = time.perf_counter()
+        fetched = await asyncio.gather(*[self._fetch_symbol(exchange, semaphore, symbol) for symbol in self.symbols])
+        rows = {symbol: {"symbol": symbol, "signal": "ERROR", "fetch_ms": fetch_ms, "error": "no data"}
+                for symbol, (_, fetch_ms) in zip(self.symbols, fetched)}
+        frames = {symbol: df for symbol, (df, _) in zip(self.symbols, fetched) if df is not None and not df.empty}
+        if frames:
+            macro_data, sentiment_score = await context
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(
+                    self._get_pool(), analyze_panel, frames, macro_data, sentiment_score, self.inference_address,
+                    self.inference_authkey)
+                for result in results:
+                    rows[result["symbol"]].update(result)
+            except Exception as e:
+                LOGGER.warning(f"SCANNER: batch analysis failed: {e!r}")
+                for symbol in frames:
+                    rows[symbol]["error"] = str(e)[:60]
+        total_ms = (time.perf_counter() - cycle_start) * 1000
+        for row in rows.values():
+            row["total_ms"] = total_ms
+        return list(rows.values())
+
+    async def _context(self, exchange):
+        budgets = exchange.fetch_budgets(SCAN_TIMEOUTS)
+
+        async def fetch(name, coro, default):
+            try:
+                return await asyncio.wait_for(coro, budgets[name])
+            except Exception as e:
+                LOGGER.warning(f"SCANNER: {name} fetch failed: {e!r}")
+                return default
+
+        macro_data, sent_res = await asyncio.gather(
+            fetch("macro", exchange.fetch_macro_prices(), {"USDT_IRT": 0, "GOLD_IRT": 0}),
+            fetch("news", self.nlp.analyze_headlines_async(exchange.session), {"sentiment_score": 50}),
+        )
+        return macro_data, sent_res["sentiment_score"]
+
+    async def scan(self, exchange, db_manager=None) -> pd.DataFrame:
+        """
+        یک چرخه اسکن روی exchange باز (WallexConnector داخل async with).
+        خروجی: جدول رتبه‌بندی‌شده (بیشترین امتیاز بالاتر) با زمان‌بندی هر نماد.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        context = asyncio.ensure_future(self._context(exchange))
+        try:
+            if self.batched:
+                rows = await self._scan_batched(exchange, semaphore, context)
+            else:
+                rows = await asyncio.gather(*[
+                    self._scan_symbol(exchange, semaphore, symbol, context) for symbol in self.symbols
+                ])
+        finally:
+            context.cancel()
+
+        table = self.rank(rows)
+
+        ok = table[table["error"] == ""]
+        if db_manager is not None and not ok.empty:
+            db_manager.save_signals(ok[["symbol", "signal", "score", "price"]].itertuples(index=False, name=None))
+        return table
+
+    @staticmethod
+    def rank(rows) -> pd.DataFrame:
+        columns = ["symbol", "signal", "strategy", "score", "ai", "ai_conf", "price",
+                   "fetch_ms", "analyze_ms", "total_ms", "error"]
+        table = pd.DataFrame(list(rows)).reindex(columns=columns)
+        table["error"] = table["error"].fillna("")
+        table = table.sort_values(["score", "ai_conf"], ascending=False, na_position="last", kind="stable")
+        table.index = pd.RangeIndex(1, len(table) + 1, name="rank")
+        return table
+
+    async def run(self, cycles=None, interval=60):
+        """حلقه اسکن: یک session و یک استخر پروسه برای همه چرخه‌ها"""
+        db_manager = DBManager()
+        done = 0
+        try:
+            async with WallexConnector() as exchange:
+                while cycles is None or done < cycles:
+                    start = time.perf_counter()
+                    table = await self.scan(exchange, db_manager)
+                    done += 1
+                    print(table.to_string(float_format=lambda v: f"{v:,.2f}"))
+                    print(f"🔎 Scan #{done}: {len(self.symbols)} symbols in {time.perf_counter() - start:.2f}s")
+                    if cycles is None or done < cycles:
+                        await asyncio.sleep(interval)
+        finally:
+            self.close()
+            db_manager.close()
+
+
+if __name__ == "__main__":
+    import os
+    from src.ml.inference import ADDRESS_ENV, AUTHKEY_ENV
+
+    # سرور استنتاج مستقل (python -m src.ml.inference) با همان متغیرهای محیطی؛ بدون آن‌ها مدل‌ها در هر پروسه
+    address = os.environ.get(ADDRESS_ENV)
+    authkey = bytes.fromhex(os.environ[AUTHKEY_ENV]) if address and os.environ.get(AUTHKEY_ENV) else None
+    asyncio.run(MultiSymbolScanner(inference_address=address if authkey else None,
+                                   inference_authkey=authkey).run())
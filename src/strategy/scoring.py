@@ -1,5 +1,6 @@
 # src/strategy/scoring.py
 import pandas as pd
+import numpy as np
 
 class SmartStrategy:
     """
@@ -26,19 +27,17 @@ class SmartStrategy:
         else:
             tech_score -= 5
             
+        # زمینه تایم‌فریم بالاتر (ستون‌های MultiTimeframeFeatures، اگر موجود باشند)؛ فقط توضیح، بدون اثر روی امتیاز
+        for prefix, label in (("h4_", "4h"), ("d1_", "1d")):
+            ratio = current.get(f"{prefix}price_sma_ratio", np.nan)
+            if ratio > 1:
+                reasons.append(f"{label} Uptrend")
+            elif ratio < 1:
+                reasons.append(f"{label} Downtrend")
+
         # 2. تحلیل ماکرو (تومانی)
-        macro_score = 50
-        if macro_data:
-            usdt_tmn = macro_data.get('USDT_IRT', 0)
-            gold_tmn = macro_data.get('GOLD_IRT', 0)
-            
-            if usdt_tmn > 65000:
-                macro_score += 15
-                reasons.append(f"High USD Rate ({usdt_tmn:,.0f})")
-            
-            if gold_tmn > 180000000:
-                macro_score += 10
-                reasons.append("Gold Support")
+        macro_score, macro_reasons = self._macro_score(macro_data)
+        reasons.extend(macro_reasons)
 
         # 3. محاسبه امتیاز نهایی (بدون کوانتوم)
         # وزن‌ها را دوباره تنظیم می‌کنیم تا به 100 برسد
@@ -68,4 +67,52 @@ class SmartStrategy:
             "reasons": reasons,
             "color": color,
             "price": current['close']
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def _macro_score(macro_data: dict = None):
+        """امتیاز ماکرو (مستقل از کندل‌ها، پس برای کل سری ثابت است)"""
+        macro_score = 50
+        reasons = []
+        if macro_data:
+            usdt_tmn = macro_data.get('USDT_IRT', 0)
+            gold_tmn = macro_data.get('GOLD_IRT', 0)
+            
+            if usdt_tmn > 65000:
+                macro_score += 15
+                reasons.append(f"High USD Rate ({usdt_tmn:,.0f})")
+            
+            if gold_tmn > 180000000:
+                macro_score += 10
+                reasons.append("Gold Support")
+        return macro_score, reasons
+
+    def analyze_vectorized(self, df: pd.DataFrame, macro_data: dict = None, sentiment_score: float = 50) -> pd.DataFrame:
+        """
+        نسخه برداری analyze: همان قوانین، اما برای تمام ردیف‌ها در یک پاس NumPy.
+        خروجی: ستون‌های score و action هم‌ایندکس با df (ردیف i == analyze(df.iloc[:i+1]))
+        """
+        if df is None or df.empty:
+            return pd.DataFrame({"score": [], "action": []})
+
+        rsi = df['rsi'].to_numpy(dtype=float)
+        macd_hist = df['macd_hist'].to_numpy(dtype=float)
+
+        # 1. تکنیکال (مقایسه با NaN همیشه False است، دقیقاً مثل حالت تک‌ردیفی)
+        tech_score = np.full(len(df), 50.0)
+        tech_score += np.where(rsi < 30, 20, np.where(rsi > 70, -20, 0))
+        tech_score += np.where(macd_hist > 0, 10, -5)
+
+        # 2. ماکرو
+        macro_score, _ = self._macro_score(macro_data)
+
+        # 3. امتیاز نهایی با همان وزن‌ها
+        final_score = (
+            (0.5 * tech_score) + 
+            (0.3 * macro_score) + 
+            (0.2 * sentiment_score)
+        )
+
+        action = np.where(final_score >= 60, "BUY", np.where(final_score <= 40, "SELL", "HOLD"))
+
+        return pd.DataFrame({"score": np.round(final_score, 1), "action": action}, index=df.index)
\ No newline at end of file
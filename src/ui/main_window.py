@@ -2,12 +2,13 @@
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                                QPushButton, QLabel, QTabWidget, QTextEdit, QSplitter, 
                                QLineEdit, QMessageBox)
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QFont
 
-from src.ui.worker import AnalysisWorker
+# worker (TensorFlow/sklearn/aiohttp) و گزارش علمی تنبل import می‌شوند تا پنجره فوراً نمایش داده شود
 from src.ui.widgets import NewsMonitorWidget, DataMatrixWidget, AdvancedChartWidget, AIPerformanceWidget
-from src.reporting.scientific import ScientificReporter 
+from src.ui.warmup import WarmupThread
+from src.core.startup import STARTUP
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -28,6 +29,10 @@ class MainWindow(QMainWindow):
 
         # --- FIX: حذف تایمر QTimer (چون Worker خودش لوپ دارد) ---
         self.worker = None 
+        # warm-up پس‌زمینه بعد از اولین فریم؛ START قبل از پایان آن منتظر می‌ماند (UI قفل نمی‌شود)
+        self.warmup = None
+        self._first_frame = False
+        self._start_pending = False
 
         self.setup_ui()
 
@@ -64,6 +69,12 @@ class MainWindow(QMainWindow):
         self.btn_report.setCursor(Qt.PointingHandCursor)
         self.btn_report.setStyleSheet("QPushButton { background-color: #6C5CE7; color: white; padding: 10px 15px; font-weight: bold; border-radius: 5px; border: none; font-size: 13px; } QPushButton:hover { background-color: #5649B9; }")
         self.btn_report.clicked.connect(self.generate_scientific_report)
+
+        self.btn_profile = QPushButton("🔬 PROFILE")
+        self.btn_profile.setCursor(Qt.PointingHandCursor)
+        self.btn_profile.setToolTip("Profile the next 5 analysis cycles (cProfile + tracemalloc)")
+        self.btn_profile.setStyleSheet("QPushButton { background-color: #333; color: white; padding: 10px 15px; font-weight: bold; border-radius: 5px; border: none; font-size: 13px; } QPushButton:hover { background-color: #444; }")
+        self.btn_profile.clicked.connect(self.request_profile)
         
         self.lbl_status = QLabel("System Ready")
         self.lbl_status.setStyleSheet("color: gray; margin-left: 15px; font-size: 13px;")
@@ -74,6 +85,7 @@ class MainWindow(QMainWindow):
         header.addWidget(self.input_symbol)
         header.addWidget(self.btn_run)
         header.addWidget(self.btn_report)
+        header.addWidget(self.btn_profile)
         header.addWidget(self.lbl_status)
         header.addStretch()
         header.addWidget(self.lbl_macro)
@@ -125,7 +137,66 @@ class MainWindow(QMainWindow):
             self.input_symbol.setEnabled(True)
             self.stop_worker()
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._first_frame:
+            self._first_frame = True
+            # بعد از تمام شدن همین چرخه paint (پنجره کامل روی صفحه است)
+            QTimer.singleShot(0, self._after_first_frame)
+
+    def _after_first_frame(self):
+        STARTUP.mark("first_frame")
+        if self._check_startup_exit("first_frame"):
+            return
+        self.start_warmup()
+        if STARTUP.exit_target() == "first_signal":
+            self.btn_run.click()
+
+    def start_warmup(self):
+        if self.warmup is not None:
+            return
+        self.warmup = WarmupThread()
+        self.warmup.progress.connect(self.on_warmup_progress)
+        self.warmup.finished.connect(self.on_warmup_done)
+        self.warmup.start()
+
+    def on_warmup_progress(self, label, percent):
+        if self.worker is None:
+            self.lbl_status.setText(f"⏳ Loading {label}... {percent}%")
+
+    def on_warmup_done(self):
+        if self.worker is None:
+            self.lbl_status.setText("System Ready")
+        self._check_startup_exit("warm")
+        if self._start_pending:
+            self._start_pending = False
+            if self.btn_run.isChecked():
+                self.start_worker()
+
+    def _check_startup_exit(self, mark):
+        """حالت بنچمارک (PIED_PIPER_STARTUP_EXIT): ذخیره گزارش و بستن برنامه بعد از مرحله هدف"""
+        if STARTUP.exit_target() != mark:
+            return False
+        STARTUP.save()
+        QTimer.singleShot(0, self.close)
+        return True
+
+    def closeEvent(self, event):
+        # ترد ورکر/warm-up نباید در حال اجرا از بین برود (import در حال اجرا قابل قطع نیست؛ صبر می‌کنیم)
+        self.stop_worker()
+        if self.warmup is not None:
+            self.warmup.wait()
+        super().closeEvent(event)
+
     def start_worker(self):
+        if self.warmup is not None and self.warmup.isRunning():
+            self._start_pending = True
+            self.lbl_status.setText("⏳ Loading AI engine...")
+            return
+
+        from src.ui.worker import AnalysisWorker
+
+        STARTUP.mark("worker_start")
         symbol = self.input_symbol.text().upper()
         self.worker = AnalysisWorker(symbol)
         
@@ -137,12 +208,21 @@ class MainWindow(QMainWindow):
         self.worker.start()
 
     def stop_worker(self):
+        self._start_pending = False
         if self.worker:
             self.lbl_status.setText("Stopping...")
             self.worker.stop()
             self.worker.wait() # صبر تا ترد کامل بسته شود
             self.lbl_status.setText("System Stopped")
 
+    def request_profile(self):
+        """ضبط پروفایل چند چرخه بعدی؛ گزارش در data/profiles ذخیره می‌شود"""
+        if self.worker is None or not self.worker.isRunning():
+            self.lbl_status.setText("Start the system to profile cycles")
+            return
+        self.worker.profiler.request()
+        self.lbl_status.setText("🔬 Profiling next cycles...")
+
     def update_status(self, msg):
         self.lbl_status.setText(msg)
 
@@ -153,6 +233,8 @@ class MainWindow(QMainWindow):
 
     def on_data_ready(self, result):
         """دریافت داده از حلقه ورکر"""
+        if STARTUP.mark("first_signal"):
+            QTimer.singleShot(0, lambda: self._check_startup_exit("first_signal"))
         self.lbl_status.setText("✅ Live Monitoring")
         self.lbl_status.setStyleSheet("color: #00E676;")
         
@@ -181,6 +263,8 @@ class MainWindow(QMainWindow):
 
     def generate_scientific_report(self):
         # ... (بدون تغییر) ...
+        from src.reporting.scientific import ScientificReporter
+
         reporter = ScientificReporter()
         filename, content = reporter.generate_full_report()
         if content == "Error":
@@ -0,0 +1,56 @@
+# src/ui/warmup.py
+import importlib
+import time
+
+from PySide6.QtCore import QThread, Signal
+
+from src.core.startup import STARTUP
+from src.core.utils import LOGGER
+
+
+def _warm_indicators():
+    """بارگذاری کش (یا کامپایل) هسته numba اندیکاتورها"""
+    import numpy as np
+    from src.features import kernels
+
+    kernels.ewm(np.ones(8), 0.5, kernels.resolve_backend())
+
+
+# ترتیب: آنچه چرخه اول زودتر لازم دارد اول؛ هدف = نام ماژول یا تابع
+WARMUP_STEPS = [
+    ("pandas", "pandas"),
+    ("network", "src.ingest.wallex"),
+    ("features", "src.features.indicators"),
+    ("indicators", _warm_indicators),
+    ("sklearn", "src.ml.ensemble"),
+    ("worker", "src.ui.worker"),
+    ("tensorflow", "tensorflow"),
+    ("shap", "shap"),
+]
+
+
+class WarmupThread(QThread):
+    """
+    import ماژول‌های سنگین در پس‌زمینه بعد از نمایش پنجره (پنجره منتظر TensorFlow/sklearn نمی‌ماند).
+    شکست یک مرحله (مثلاً نبودن TensorFlow) فقط هشدار است؛ همان import بعداً در مسیر اصلی خطای واقعی را می‌دهد.
+    progress: (نام مرحله، درصد پیشرفت)
+    """
+    progress = Signal(str, int)
+
+    def __init__(self, steps=None):
+        super().__init__()
+        self.steps = list(WARMUP_STEPS if steps is None else steps)
+
+    def run(self):
+        for i, (label, target) in enumerate(self.steps, 1):
+            start = time.perf_counter()
+            try:
+                if callable(target):
+                    target()
+                else:
+                    importlib.import_module(target)
+            except Exception as e:
+                LOGGER.warning(f"WARMUP: {label} failed: {e!r}")
+            STARTUP.record_import(label, (time.perf_counter() - start) * 1000)
+            self.progress.emit(label, int(100 * i / len(self.steps)))
+        STARTUP.mark("warm")
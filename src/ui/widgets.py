@@ -4,7 +4,6 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QTableWidget, QTableWidgetI
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QColor, QFont
 import pyqtgraph as pg
-import pandas as pd
 
 class NewsMonitorWidget(QWidget):
     def __init__(self):
@@ -131,27 +130,48 @@ class AIPerformanceWidget(QWidget):
         self.table.setHorizontalHeaderLabels(cols)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.table)
+        self.max_rows = 500
+        self._rows = {} # id ردیف دیتابیس -> شماره سطر جدول
+        self._max_id = 0
 
     def update_history(self, df, accuracy):
+        """
+        ادغام تغییرات (ردیف‌های جدید یا اعتبارسنجی‌شده) در جدول، به جای ساخت دوباره کل جدول.
+        جدید‌ترین ردیف پایین جدول است و حداکثر max_rows ردیف نگه داشته می‌شود.
+        """
         self.lbl_stats.setText(f"🎯 AI ACCURACY: {accuracy:.1f}%")
-        self.table.setRowCount(len(df))
-        for i in range(len(df)):
-            row_idx = len(df) - 1 - i
-            row_data = df.iloc[row_idx]
-            self.table.setItem(i, 0, QTableWidgetItem(str(row_data['timestamp'])))
-            
-            sig_text = f"{row_data['predicted_direction']} ({row_data['confidence']})"
-            sig_item = QTableWidgetItem(sig_text)
-            sig_item.setForeground(QColor("#00E676") if row_data['predicted_direction'] == "BUY" else QColor("#FF5252"))
-            self.table.setItem(i, 1, sig_item)
-            
-            self.table.setItem(i, 2, QTableWidgetItem(f"{row_data['entry_price']:,.0f}"))
-            
-            status = row_data['status']
-            stat_item = QTableWidgetItem(status)
-            if status == "CORRECT": stat_item.setForeground(QColor("#00E676"))
-            elif status == "WRONG": stat_item.setForeground(QColor("#FF5252"))
-            else: stat_item.setForeground(QColor("#FFD700"))
-            self.table.setItem(i, 3, stat_item)
-            
-            self.table.setItem(i, 4, QTableWidgetItem(f"{row_data['actual_result']:,.0f}"))
\ No newline at end of file
+        for row_data in df.sort_values('id').itertuples(index=False):
+            i = self._rows.get(row_data.id)
+            if i is None:
+                if row_data.id < self._max_id:
+                    continue # ردیف قدیمی‌تر از پنجره جدول (مثلاً اعتبارسنجی دیرهنگام)
+                self._max_id = row_data.id
+                i = self.table.rowCount()
+                self.table.insertRow(i)
+                self._rows[row_data.id] = i
+            self._set_row(i, row_data)
+
+        overflow = self.table.rowCount() - self.max_rows
+        if overflow > 0:
+            for _ in range(overflow):
+                self.table.removeRow(0)
+            self._rows = {row_id: i - overflow for row_id, i in self._rows.items() if i >= overflow}
+
+    def _set_row(self, i, row_data):
+        self.table.setItem(i, 0, QTableWidgetItem(str(row_data.timestamp)))
+
+        sig_text = f"{row_data.predicted_direction} ({row_data.confidence})"
+        sig_item = QTableWidgetItem(sig_text)
+        sig_item.setForeground(QColor("#00E676") if row_data.predicted_direction == "BUY" else QColor("#FF5252"))
+        self.table.setItem(i, 1, sig_item)
+
+        self.table.setItem(i, 2, QTableWidgetItem(f"{row_data.entry_price:,.0f}"))
+
+        status = row_data.status
+        stat_item = QTableWidgetItem(status)
+        if status == "CORRECT": stat_item.setForeground(QColor("#00E676"))
+        elif status == "WRONG": stat_item.setForeground(QColor("#FF5252"))
+        else: stat_item.setForeground(QColor("#FFD700"))
+        self.table.setItem(i, 3, stat_item)
+
+        self.table.setItem(i, 4, QTableWidgetItem(f"{row_data.actual_result:,.0f}"))
@@ -1,24 +1,34 @@
 # src/ui/worker.py
 from PySide6.QtCore import QThread, Signal
+from concurrent.futures import ThreadPoolExecutor
 import traceback
 import asyncio
 import pandas as pd
 import numpy as np
 import time
-import gc
 import os
 
-from src.ingest.wallex import WallexConnector
+from src.ingest.wallex import WallexConnector, OHLCV_TIMEOUT, MACRO_TIMEOUT
 from src.ingest.big_data import BigDataManager
-from src.features.indicators import TechnicalFeatures
+from src.features.incremental import IncrementalFeatures
+from src.features.multi_timeframe import MultiTimeframeFeatures
+from src.features.block import budget_from_env
 from src.strategy.scoring import SmartStrategy
 from src.ml.ensemble import EnsemblePredictor
-from src.ml.dataset import DataLabeler, SEQUENCE_LENGTH 
+from src.ml.online import OnlineTrainer
+from src.ml.dataset import DataLabeler, SEQUENCE_LENGTH
 from src.nlp.sentiment import NewsAnalyzer
 from src.reporting.generator import ReportGenerator
-from src.core.persistence import DBManager 
-from src.core.utils import LOGGER 
+from src.core.persistence import DBManager
+from src.core.utils import LOGGER
 from src.core.doctor import SystemDoctor
+from src.core.validation import PathValidator
+from src.core.profiling import CycleProfiler
+
+# مهلت هر تلاش هر منبع (ثانیه)؛ مهلت کل دریافت exchange.fetch_budgets است (ohlcv/macro با تلاش‌های دوباره)
+FETCH_TIMEOUTS = {"ohlcv": OHLCV_TIMEOUT, "macro": MACRO_TIMEOUT, "news": 5}
+# نام مرحله هر منبع در MetricsCollector
+FETCH_STAGES = {"ohlcv": "fetch", "macro": "macro", "news": "news"}
 
 class AnalysisWorker(QThread):
     data_ready = Signal(dict)
@@ -29,162 +39,264 @@ class AnalysisWorker(QThread):
         super().__init__()
         self.symbol = symbol
         self.doctor = SystemDoctor()
-        self.is_running = True 
-        self.ensemble = None 
+        self.metrics = self.doctor.metrics
+        self.profiler = CycleProfiler(self.metrics) # فعال‌سازی: PIED_PIPER_PROFILE=n یا دکمه PROFILE
+        self.is_running = True
+        self.ensemble = None
+        self.trainer = None # به‌روزرسانی افزایشی مدل‌ها در پروسه پس‌زمینه
+        # ویژگی‌ها در یک بلوک float32 پیش‌تخصیص‌یافته؛ سقف حافظه با PIED_PIPER_FEATURE_MB
+        self.feature_engine = IncrementalFeatures(max_rows=2000, budget_mb=budget_from_env())
+        self.mtf_features = MultiTimeframeFeatures() # زمینه 4h/1d از همان سری 1h (بدون درخواست شبکه)
+        self.nlp = NewsAnalyzer()
+        self.strategy = SmartStrategy()
+        self.validator = PathValidator()
+        self.history_rev = 0 # آخرین تغییر تاریخچه AI که به UI فرستاده شده
 
     def stop(self):
         self.is_running = False
 
     def run(self):
+        """
+        یک event loop برای کل عمر ترد (به جای ساخت loop و session جدید در هر چرخه).
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main())
+        finally:
+            loop.close()
+
+    async def _main(self):
         db_manager = DBManager()
         big_data_mgr = BigDataManager()
-        
+        # مراحل سنگین CPU (ویژگی‌ها، AI، SHAP) در یک ترد جدا اجرا می‌شوند تا loop آزاد بماند
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+
         LOGGER.info("WORKER: Initializing AI Brain...")
         self.log.emit("🚀 Initializing AI Engine...")
-        
+
         if self.ensemble is None:
             self.ensemble = EnsemblePredictor()
-        
+        self.trainer = OnlineTrainer(self.ensemble)
+
         LOGGER.info("WORKER: Entering Infinite Monitoring Loop...")
-        
-        while self.is_running:
-            loop_start = time.time()
-            
-            try:
-                # --- FIX: اجبار به نماد صحیح تومانی ---
-                if "USDT" in self.symbol and "TMN" not in self.symbol:
-                     self.symbol = "ETHTMN" # تصحیح خودکار
-
-                # 1. دریافت داده زنده
-                self.log.emit(f"📡 Fetching Data ({self.symbol})...")
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                live_df = loop.run_until_complete(self._fetch_data())
-                loop.close()
-
-                if live_df is None or live_df.empty: 
-                    self.log.emit("⚠️ Data Fetch Failed. Retrying...")
-                    time.sleep(5)
-                    continue
-                
-                current_price = live_df.iloc[-1]['close']
-
-                # --- FIX: گارد امنیتی قیمت صفر ---
-                if current_price <= 0:
-                    LOGGER.error(f"CRITICAL: Received Zero Price for {self.symbol}. Market Offline?")
-                    self.log.emit("⛔ Market Data Error (Price=0)")
-                    time.sleep(5)
-                    continue
-
-                # 2. ترکیب داده‌ها
-                full_df = big_data_mgr.get_combined_data(live_df, target_size=50000)
-                
-                # 3. پردازش (روی 2000 تای آخر برای سرعت)
-                processing_df = full_df.tail(2000).copy()
-                self.log.emit("⚙️ Analyzing...")
-                df_processed = TechnicalFeatures.add_all(processing_df)
-
-                # 4. هوش مصنوعی
-                labeler = DataLabeler()
-                X, y, scaler = labeler.prepare(df_processed) 
-                
-                if not self.ensemble.is_trained:
-                    self.log.emit("🧠 First-time Training...")
-                    self.ensemble.train_all(X, y)
-                
-                if len(X) < SEQUENCE_LENGTH:
-                     raise Exception("Insufficient data buffer.")
-
-                last_features = X.tail(SEQUENCE_LENGTH)
-                
-                # پیش‌بینی
-                ai_pred_raw, ai_conf = self.ensemble.predict_combined(last_features) 
-                
-                # منطق سه وضعیتی
-                THRESHOLD_BUY = 0.55
-                THRESHOLD_SELL = 0.45
-                
-                if ai_conf >= THRESHOLD_BUY:
-                    ai_direction = "BUY"
-                elif ai_conf <= THRESHOLD_SELL:
-                    ai_direction = "SELL"
-                else:
-                    ai_direction = "WAIT"
-
-                # SHAP
-                last_row_df = X.tail(1)
-                shap_importance = self.ensemble.aux_predictor.get_feature_importance(last_row_df)
-
-                # 5. اعتبارسنجی و ذخیره
-                db_manager.validate_past_predictions(current_price, validation_period_minutes=120)
-                
+
+        try:
+            # یک session (با connection pool) برای تمام درخواست‌ها
+            async with WallexConnector() as exchange:
+                while self.is_running:
+                    await self._cycle(exchange, db_manager, big_data_mgr, executor)
+
+                    for _ in range(5):
+                        if not self.is_running: break
+                        await asyncio.sleep(1)
+        finally:
+            executor.shutdown(wait=True)
+            self.trainer.close()
+            big_data_mgr.flush()
+            db_manager.close()
+            self.metrics.close()
+            LOGGER.info("WORKER: Stopped.")
+
+    async def _fetch(self, name, coro, default, budget):
+        """اجرای یک دریافت با مهلت کل مخصوص خودش؛ در صورت خطا مقدار پیش‌فرض"""
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coro, budget)
+        except Exception as e:
+            LOGGER.warning(f"FETCH {name.upper()} FAILED: {e!r}")
+            self.metrics.inc(f"{name}_errors")
+            return default
+        finally:
+            self.metrics.record(FETCH_STAGES[name], (time.perf_counter() - start) * 1000)
+
+    async def _cycle(self, exchange, db_manager, big_data_mgr, executor):
+        loop_start = time.time()
+        loop = asyncio.get_running_loop()
+        metrics = self.metrics
+        profiler = self.profiler
+        metrics.begin_cycle()
+        profiler.begin_cycle()
+        pending = []
+
+        try:
+            # --- FIX: اجبار به نماد صحیح تومانی ---
+            if "USDT" in self.symbol and "TMN" not in self.symbol:
+                 self.symbol = "ETHTMN" # تصحیح خودکار
+
+            # 1. دریافت هم‌زمان داده زنده، ماکرو و اخبار
+            self.log.emit(f"📡 Fetching Data ({self.symbol})...")
+            neutral_news = {"sentiment_score": 50, "news_count": 0, "summary": "No Connection / No News", "news_list": []}
+            budgets = exchange.fetch_budgets(FETCH_TIMEOUTS)
+            ohlcv_task = asyncio.create_task(self._fetch(
+                "ohlcv", exchange.fetch_ohlcv(self.symbol, timeframe="1h", limit=2000), None, budgets["ohlcv"]))
+            macro_task = asyncio.create_task(self._fetch(
+                "macro", exchange.fetch_macro_prices(), {"USDT_IRT": 0, "GOLD_IRT": 0}, budgets["macro"]))
+            news_task = asyncio.create_task(self._fetch(
+                "news", self.nlp.analyze_headlines_async(exchange.session), neutral_news, budgets["news"]))
+            pending = [macro_task, news_task]
+
+            live_df = await ohlcv_task
+
+            if live_df is None or live_df.empty:
+                self.log.emit("⚠️ Data Fetch Failed. Retrying...")
+                await asyncio.sleep(5)
+                return
+
+            current_price = live_df.iloc[-1]['close']
+
+            # --- FIX: گارد امنیتی قیمت صفر ---
+            if current_price <= 0:
+                LOGGER.error(f"CRITICAL: Received Zero Price for {self.symbol}. Market Offline?")
+                self.log.emit("⛔ Market Data Error (Price=0)")
+                await asyncio.sleep(5)
+                return
+
+            # 2-4. ترکیب، ویژگی‌ها و هوش مصنوعی در executor (ماکرو/اخبار هنوز در حال دریافت‌اند)
+            self.log.emit("⚙️ Analyzing...")
+            analysis = await loop.run_in_executor(executor, self._analyze, live_df, big_data_mgr)
+            df_processed = analysis["df_processed"]
+            ai_direction = analysis["ai_direction"]
+            ai_conf = analysis["ai_conf"]
+            shap_importance = analysis["shap_importance"]
+
+            # 5. اعتبارسنجی روی مسیر واقعی کندل‌های بسته‌شده (کندل باز را validator کنار می‌گذارد) و ذخیره
+            with profiler.span("db"):
+                self.validator.run(db_manager, self.symbol, analysis["candles"])
+
                 if ai_direction != "WAIT":
                     db_manager.add_prediction(self.symbol, ai_direction, ai_conf, current_price)
-                
-                # 6. استراتژی و اخبار
-                strategy = SmartStrategy()
-                connector = WallexConnector()
-                macro_data = connector.get_macro_prices()
-                nlp = NewsAnalyzer()
-                sent_res = nlp.analyze_headlines() 
-                
-                strat_res = strategy.analyze(df_processed.tail(100), macro_data, sent_res['sentiment_score'])
-                
-                # Consensus
-                final_consensus = "WAIT"
-                if strat_res['action'] == "BUY" and ai_direction == "BUY":
-                    final_consensus = "BUY"
-                elif strat_res['action'] == "SELL" and ai_direction == "SELL":
-                    final_consensus = "SELL"
-                
+
+            # 6. استراتژی و اخبار
+            macro_data, sent_res = await asyncio.gather(macro_task, news_task)
+            pending = []
+
+            strat_res = self.strategy.analyze(df_processed.tail(100), macro_data, sent_res['sentiment_score'])
+
+            # Consensus
+            final_consensus = "WAIT"
+            if strat_res['action'] == "BUY" and ai_direction == "BUY":
+                final_consensus = "BUY"
+            elif strat_res['action'] == "SELL" and ai_direction == "SELL":
+                final_consensus = "SELL"
+
+            # 7. ارسال نتیجه
+            # فقط ردیف‌های جدید/اعتبارسنجی‌شده از چرخه قبل؛ دقت از شمارنده‌های تجمیعی
+            with profiler.span("db"):
                 db_manager.save_signal(self.symbol, final_consensus, strat_res['score'], current_price)
-                
-                # 7. ارسال نتیجه
-                history_df, accuracy = db_manager.get_ai_history()
-                
-                # تبدیل برای گزارش
-                ai_pred_code = 1 if ai_direction == "BUY" else 0
-                
-                report_text = ReportGenerator.create_report(
-                    self.symbol, strat_res, (ai_pred_code, ai_conf), sent_res, shap_importance
-                )
-
-                result_package = {
-                    "dataframe": df_processed.tail(150), 
-                    "report": report_text, 
-                    "strategy": strat_res, 
-                    "sentiment": sent_res, 
-                    "macro": macro_data, 
-                    "history": {"df": history_df, "accuracy": accuracy},
-                    "feature_weights": shap_importance
-                }
-                
-                # ارسال وضعیت به دکتر
-                strat_res_for_doctor = strat_res.copy()
-                strat_res_for_doctor['action'] = final_consensus
-                
-                # اینجا ai_direction را می‌فرستیم (BUY/SELL/WAIT)
-                self.doctor.checkup(loop_start, (ai_direction, ai_conf), strat_res_for_doctor)
-                
+                history_df, self.history_rev = db_manager.get_history_changes(self.history_rev)
+                accuracy = db_manager.get_accuracy()
+
+            # تبدیل برای گزارش
+            ai_pred_code = 1 if ai_direction == "BUY" else 0
+
+            report_text = ReportGenerator.create_report(
+                self.symbol, strat_res, (ai_pred_code, ai_conf), sent_res, shap_importance
+            )
+
+            result_package = {
+                "dataframe": df_processed.tail(150),
+                "report": report_text,
+                "strategy": strat_res,
+                "sentiment": sent_res,
+                "macro": macro_data,
+                "history": {"df": history_df, "accuracy": accuracy},
+                "feature_weights": shap_importance
+            }
+
+            # ارسال وضعیت به دکتر
+            strat_res_for_doctor = strat_res.copy()
+            strat_res_for_doctor['action'] = final_consensus
+
+            with profiler.span("emit"):
                 self.data_ready.emit(result_package)
-                LOGGER.info(f"CYCLE DONE. Signal: {final_consensus} | AI: {ai_direction} ({ai_conf:.1%})")
-
-                # پاکسازی حافظه
-                del df_processed, X, y, full_df
-                gc.collect()
-
-            except Exception as e:
-                LOGGER.error(f"CYCLE ERROR: {e}", exc_info=True)
-                self.log.emit(f"⚠️ Error: {str(e)[:30]}...")
-                time.sleep(5)
-
-            for _ in range(5): 
-                if not self.is_running: break
-                time.sleep(1)
-        
-        db_manager.close()
-        LOGGER.info("WORKER: Stopped.")
-
-    async def _fetch_data(self):
-        async with WallexConnector() as exchange:
-            return await exchange.fetch_ohlcv(self.symbol, timeframe="1h", limit=2000)
\ No newline at end of file
+
+            # اینجا ai_direction را می‌فرستیم (BUY/SELL/WAIT)؛ چرخه در MetricsCollector بسته می‌شود
+            block = self.feature_engine.block
+            self.doctor.checkup(loop_start, (ai_direction, ai_conf), strat_res_for_doctor,
+                                features=block.footprint() if block is not None else None)
+            LOGGER.info(f"CYCLE DONE. Signal: {final_consensus} | AI: {ai_direction} ({ai_conf:.1%})")
+
+            # بافرها پیش‌تخصیص‌یافته‌اند و فریم‌ها view هستند؛ gc.collect در هر چرخه لازم نیست
+            del df_processed, analysis
+
+        except Exception as e:
+            LOGGER.error(f"CYCLE ERROR: {e}", exc_info=True)
+            metrics.inc("cycle_errors")
+            self.log.emit(f"⚠️ Error: {str(e)[:30]}...")
+            await asyncio.sleep(5)
+        finally:
+            for task in pending:
+                task.cancel()
+            report_path = profiler.end_cycle()
+            if report_path:
+                self.log.emit(f"🔬 Profile saved: {report_path}")
+
+    def _analyze(self, live_df, big_data_mgr):
+        """مراحل CPU-bound یک چرخه (اجرا در executor)"""
+        with self.profiler.thread():
+            return self._analyze_stages(live_df, big_data_mgr)
+
+    def _analyze_stages(self, live_df, big_data_mgr):
+        profiler = self.profiler
+        metrics = self.metrics
+
+        # 2. ترکیب داده‌ها
+        with profiler.span("merge"):
+            full_df = big_data_mgr.get_combined_data(live_df, target_size=50000)
+
+        # 3. پردازش افزایشی (فقط کندل‌های جدید؛ چرخه اول روی 2000 تای آخر seed می‌شود)
+        with profiler.span("features"):
+            df_processed = self.feature_engine.update_frame(full_df.tail(2000))
+            df_processed = self.mtf_features.join(df_processed, full_df)
+
+        # 4. هوش مصنوعی
+        with profiler.span("labeling"):
+            labeler = DataLabeler()
+            X, y, scaler = labeler.prepare(df_processed)
+
+        if not self.ensemble.is_trained:
+            self.log.emit("🧠 First-time Training...")
+            self.ensemble.train_all(X, y)
+            metrics.inc("trainings")
+
+        if len(X) <= SEQUENCE_LENGTH:
+             raise Exception("Insufficient data buffer.")
+
+        # پنجره آخر LSTM به SEQUENCE_LENGTH + 1 ردیف نیاز دارد (هم‌تراز با آموزش)
+        last_features = X.tail(SEQUENCE_LENGTH + 1)
+
+        # پیش‌بینی
+        with profiler.span("inference"):
+            ai_pred_raw, ai_conf = self.ensemble.predict_combined(last_features)
+
+        # منطق سه وضعیتی
+        THRESHOLD_BUY = 0.55
+        THRESHOLD_SELL = 0.45
+
+        if ai_conf >= THRESHOLD_BUY:
+            ai_direction = "BUY"
+        elif ai_conf <= THRESHOLD_SELL:
+            ai_direction = "SELL"
+        else:
+            ai_direction = "WAIT"
+
+        # SHAP
+        last_row_df = X.tail(1)
+        with profiler.span("shap"):
+            shap_importance = self.ensemble.aux_predictor.get_feature_importance(last_row_df)
+
+        # یادگیری آنلاین: برداشتن مدل‌های آماده (بین پیش‌بینی‌ها، روی همین ترد) و ثبت کار جدید
+        for event in self.trainer.apply_ready():
+            metrics.inc("model_swaps" if event.get("swapped") else "model_rejects")
+            if event.get("swapped"):
+                self.log.emit(f"🔁 {event['head']} model updated")
+        self.trainer.schedule(X, y)
+
+        return {
+            "candles": full_df,
+            "df_processed": df_processed,
+            "ai_direction": ai_direction,
+            "ai_conf": ai_conf,
+            "shap_importance": shap_importance,
+        }
@@ -0,0 +1,96 @@
+# tools/bench_db.py
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.getcwd())
+from src.core.persistence import DBManager, MIGRATIONS
+
+ROWS = 1_000_000
+PENDING = 10_000       # پیش‌بینی‌های سررسیده در انتظار اعتبارسنجی
+LEGACY_INSERTS = 2_000 # روش قدیمی (commit برای هر ردیف) خیلی کند است؛ نمونه کوچک‌تر
+
+
+def legacy_insert(path, n):
+    """روش قبلی: journal پیش‌فرض و یک commit برای هر INSERT"""
+    conn = sqlite3.connect(path)
+    for statement in MIGRATIONS[0]:
+        conn.execute(statement)
+    start = time.perf_counter()
+    for i in range(n):
+        conn.execute("""
+            INSERT INTO ai_history (timestamp, symbol, predicted_direction, confidence, entry_price, status, actual_result)
+            VALUES (?, ?, ?, ?, ?, 'PENDING', 0.0)
+        """, (datetime.now().strftime("%Y-%m-%d %H:%M"), "ETHTMN", "BUY", 0.6, 100.0 + i % 7))
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return n / elapsed
+
+
+def batched_insert(path, n):
+    db = DBManager(path)
+    start = time.perf_counter()
+    for i in range(n):
+        db.add_prediction("ETHTMN", "BUY" if i % 2 else "SELL", 0.6, 100.0 + i % 7)
+    db.flush()
+    elapsed = time.perf_counter() - start
+    return db, n / elapsed
+
+
+def age_rows(conn, n_validated, n_pending):
+    """بیشتر ردیف‌ها قدیمی و اعتبارسنجی‌شده؛ n_pending ردیف سررسیده PENDING"""
+    old = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M")
+    with conn:
+        conn.execute("UPDATE ai_history SET timestamp = ?, status = 'WRONG' WHERE id <= ?", (old, n_validated))
+        conn.execute("UPDATE ai_history SET timestamp = ?, status = 'PENDING' WHERE id > ? AND id <= ?",
+                     (old, n_validated, n_validated + n_pending))
+
+
+def legacy_validate(conn, current_price, validation_time_str):
+    """روش قبلی: SELECT بدون ایندکس و یک UPDATE برای هر ردیف"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, predicted_direction, entry_price FROM ai_history
+        WHERE status = 'PENDING' AND timestamp <= ?
+    """, (validation_time_str,))
+    for trade_id, direction, entry in cursor.fetchall():
+        is_correct = (direction == "BUY" and current_price > entry) or (direction == "SELL" and current_price < entry)
+        cursor.execute("UPDATE ai_history SET status = ?, actual_result = ? WHERE id = ?",
+                       ('CORRECT' if is_correct else 'WRONG', current_price, trade_id))
+    conn.commit()
+
+
+def main(rows=ROWS, pending=PENDING):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_rate = legacy_insert(os.path.join(tmp, "legacy.db"), LEGACY_INSERTS)
+
+        db, batched_rate = batched_insert(os.path.join(tmp, "bench.db"), rows)
+        validation_time_str = (datetime.now() - timedelta(minutes=120)).strftime("%Y-%m-%d %H:%M")
+
+        # اعتبارسنجی: روش قبلی روی همان داده (بدون ایندکس)
+        age_rows(db.conn, rows - pending - 1000, pending)
+        db.conn.execute("DROP INDEX idx_ai_history_status_ts")
+        start = time.perf_counter()
+        legacy_validate(db.conn, 103.0, validation_time_str)
+        legacy_validation = time.perf_counter() - start
+
+        # روش جدید: ایندکس + یک UPDATE مجموعه‌ای
+        age_rows(db.conn, rows - pending - 1000, pending)
+        db.conn.execute("CREATE INDEX idx_ai_history_status_ts ON ai_history(status, timestamp)")
+        start = time.perf_counter()
+        updated = db.validate_past_predictions(103.0)
+        new_validation = time.perf_counter() - start
+        db.close()
+
+    print(f"{'':28}{'legacy':>14}{'batched/WAL':>14}")
+    print(f"{'inserts/sec':28}{legacy_rate:>14,.0f}{batched_rate:>14,.0f}")
+    print(f"{f'validate {pending:,} of {rows:,} (ms)':28}{legacy_validation * 1000:>14,.1f}{new_validation * 1000:>14,.1f}")
+    print(f"rows updated: {updated:,}")
+
+
+if __name__ == "__main__":
+    main()
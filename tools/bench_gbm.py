@@ -0,0 +1,99 @@
+# tools/bench_gbm.py
+import sys
+import os
+import io
+import contextlib
+import time
+
+import numpy as np
+from sklearn.metrics import precision_score, roc_auc_score
+
+sys.path.append(os.getcwd())
+from src.ingest.big_data import BigDataManager
+from src.ml.model import MarketPredictor
+from src.ml.tuner import FeatureCache, walk_forward_folds
+
+CSV_PATH = "data/history_50k.csv"
+LATENCY_RUNS = 200
+
+
+def walk_forward(backend, X, y):
+    """precision/AUC میانگین روی فولدهای walk-forward تیونر (یک تقسیم 80/20 تنها خیلی پرنوسان است)"""
+    precisions, aucs, signals = [], [], 0
+    for train_stop, test_start, test_stop in walk_forward_folds(len(X)):
+        predictor = MarketPredictor(backend=backend)
+        with contextlib.redirect_stdout(io.StringIO()):
+            predictor.train(X.iloc[:train_stop], y.iloc[:train_stop])
+        probs = predictor.model.predict_proba(X.iloc[test_start:test_stop])[:, 1]
+        y_test = y.iloc[test_start:test_stop]
+        precisions.append(precision_score(y_test, probs >= 0.5, zero_division=0))
+        aucs.append(roc_auc_score(y_test, probs))
+        signals += int((probs >= 0.5).sum())
+    return float(np.mean(precisions)), float(np.mean(aucs)), signals
+
+
+def bench(backend, X, y):
+    predictor = MarketPredictor(backend=backend)
+    start = time.perf_counter()
+    precision = predictor.train(X, y)
+    train_s = time.perf_counter() - start
+
+    # تاخیر پیش‌بینی یک ردیف (مسیر هر چرخه) و دسته‌ای
+    row = X.tail(1)
+    latencies = []
+    for _ in range(LATENCY_RUNS):
+        start = time.perf_counter()
+        predictor.model.predict_proba(row)
+        latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    predictor.model.predict_proba(X)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    # SHAP: ساخت explainer + اولین ردیف، سپس ردیف جدید با explainer کش‌شده
+    start = time.perf_counter()
+    top = predictor.get_feature_importance(row)
+    shap_first_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    predictor.get_feature_importance(X.iloc[[-2]])
+    shap_next_ms = (time.perf_counter() - start) * 1000
+
+    trees = getattr(predictor.model, 'n_iter_', None) or getattr(predictor.model, 'n_estimators_', None)
+    wf_precision, wf_auc, wf_signals = walk_forward(backend, X, y)
+    return {
+        "train s": train_s,
+        "trees": trees,
+        "precision (80/20)": precision,
+        "precision (walk-fwd)": wf_precision,
+        "auc (walk-fwd)": wf_auc,
+        "signals (walk-fwd)": wf_signals,
+        "predict 1 row p50 ms": float(np.percentile(latencies, 50)),
+        f"predict {len(X):,} rows ms": batch_ms,
+        "shap first ms": shap_first_ms,
+        "shap next row ms": shap_next_ms,
+        "shap ok": bool(top),
+    }
+
+
+def main():
+    df = BigDataManager(csv_path=CSV_PATH).load_history()
+    _, X, y = FeatureCache().load_or_build(df)
+    print(f"📊 {len(X):,} samples × {X.shape[1]} features | {os.cpu_count()} CPUs\n")
+
+    results = {backend: bench(backend, X, y) for backend in MarketPredictor.BACKENDS}
+
+    print(f"\n{'':26}" + "".join(f"{backend:>14}" for backend in results))
+    for metric in next(iter(results.values())):
+        cells = []
+        for res in results.values():
+            value = res[metric]
+            if metric.startswith("precision"):
+                cells.append(f"{value:>14.2%}")
+            elif isinstance(value, float):
+                cells.append(f"{value:>14,.2f}")
+            else:
+                cells.append(f"{str(value):>14}")
+        print(f"{metric:26}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# tools/bench_indicators.py
+import sys
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.getcwd())
+from src.features import kernels
+from src.features.indicators import TechnicalFeatures
+from src.features.incremental import FEATURE_COLUMNS
+
+SIZES = [2_000, 50_000, 1_000_000]
+# pandas_ta روی 1M کندل کند است؛ مرجع دقت تا این اندازه ساخته می‌شود
+REFERENCE_MAX_ROWS = 50_000
+# rolling std در pandas الگوریتم آنلاین است و روی قیمت‌های تومانی (~1e9) تا حدود 1e-9 خطای گرد کردن جمع می‌کند؛
+# هسته‌ها هر پنجره را دومرحله‌ای حساب می‌کنند، پس اختلاف bb_* از سمت مرجع است
+TOLERANCE = 1e-6
+
+
+def synthetic_ohlcv(n, seed=7):
+    """random walk ساعتی با high/low/volume سازگار (کندل‌های صاف هم دارد تا مسیر eps در TR تست شود)"""
+    rng = np.random.default_rng(seed)
+    close = 1e9 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 0.004, n)) * close
+    spread[rng.random(n) < 0.01] = 0.0
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    low[spread == 0] = high[spread == 0] = close[spread == 0]
+    volume = rng.lognormal(3, 1, n)
+    index = pd.date_range("2020-01-01", periods=n, freq="1h", name="timestamp")
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def max_rel_error(out, ref):
+    """بیشترین خطای نسبی هر ستون نسبت به pandas_ta (ردیف‌ها و ترتیب ستون‌ها هم باید یکی باشند)"""
+    if not out.index.equals(ref.index) or list(out.columns) != list(ref.columns):
+        raise AssertionError("rows/columns differ from pandas_ta")
+    a = out[FEATURE_COLUMNS].to_numpy()
+    b = ref[FEATURE_COLUMNS].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel = np.abs(a - b) / np.maximum(np.abs(b), 1e-12)
+    return pd.Series(np.nanmax(rel, axis=0) if len(rel) else 0.0, index=FEATURE_COLUMNS)
+
+
+def main():
+    backends = ["numpy", "numba"] if kernels.HAS_NUMBA else ["numpy"]
+    print(f"🧮 backends: {backends} + pandas_ta reference | auto → {kernels.resolve_backend('auto')}")
+
+    if kernels.HAS_NUMBA:
+        # اولین فراخوانی numba کامپایل (یا بارگذاری کش __pycache__) است؛ جدا گزارش می‌شود
+        _, jit_ms = timed(kernels.ewm, np.ones(8), 0.5, "numba")
+        print(f"⚙️ numba JIT warm-up: {jit_ms:,.1f} ms")
+    # importهای تنبل (pandas_ta، scipy) در زمان‌سنجی‌ها حساب نشوند
+    warm = synthetic_ohlcv(200)
+    for backend in ["pandas_ta"] + backends:
+        _, warm_ms = timed(TechnicalFeatures.add_all, warm, backend)
+        print(f"⚙️ {backend} first call: {warm_ms:,.1f} ms")
+    print()
+
+    rows = []
+    worst = pd.Series(0.0, index=FEATURE_COLUMNS)
+    for n in SIZES:
+        df = synthetic_ohlcv(n)
+        row = {"candles": f"{n:,}"}
+        ref = None
+        if n <= REFERENCE_MAX_ROWS:
+            ref, row["pandas_ta ms"] = timed(TechnicalFeatures.add_all, df, "pandas_ta")
+        else:
+            row["pandas_ta ms"] = float("nan")
+        for backend in backends:
+            out, row[f"{backend} ms"] = timed(TechnicalFeatures.add_all, df, backend)
+            if ref is not None:
+                worst = np.maximum(worst, max_rel_error(out, ref))
+        rows.append(row)
+
+    table = pd.DataFrame(rows).set_index("candles")
+    for backend in backends:
+        table[f"{backend} speedup"] = table["pandas_ta ms"] / table[f"{backend} ms"]
+    print(table.to_string(float_format=lambda v: f"{v:,.1f}"))
+
+    print(f"\n📐 max relative error vs pandas_ta (tolerance {TOLERANCE:g}):")
+    print(worst.to_string(float_format=lambda v: f"{v:.2e}"))
+    if (worst > TOLERANCE).any():
+        print("❌ mismatch:", list(worst[worst > TOLERANCE].index))
+        sys.exit(1)
+    print("✅ kernels match pandas_ta")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# tools/bench_startup.py
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+from src.core.startup import EXIT_ENV, REPORT_ENV, STARTUP_MARKS
+
+# ماژول‌هایی که زمان import آن‌ها (مثل python -X importtime) اندازه‌گیری می‌شود
+IMPORT_TARGETS = ["src.ui.main_window", "src.ui.worker", "src.ml.ensemble", "src.ml.lstm_model"]
+TOP_PACKAGES = 8
+APP_TIMEOUT = 300
+
+
+def import_profile(module):
+    """
+    import یک ماژول در پروسه تازه با -X importtime.
+    خروجی: (کل میلی‌ثانیه، [(بسته سطح بالا، میلی‌ثانیه تجمعی)] سنگین‌ترین‌ها)
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=os.getcwd())
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_us = 0
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.strip()
+        if name == module:
+            total_us = int(cumulative)
+        elif '.' not in name and not name.startswith('_'):
+            packages[name] = max(packages.get(name, 0), int(cumulative))
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:TOP_PACKAGES]
+    return total_us / 1000, [(name, us / 1000) for name, us in top]
+
+
+def run_app(exit_mark, report_path):
+    """اجرای main.py تا رسیدن به exit_mark (بدون نمایشگر: QT_QPA_PLATFORM=offscreen)"""
+    env = dict(os.environ)
+    env[EXIT_ENV] = exit_mark
+    env[REPORT_ENV] = report_path
+    if not env.get("DISPLAY") and sys.platform.startswith("linux"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "main.py"], env=env, capture_output=True, text=True,
+                          timeout=APP_TIMEOUT, cwd=os.getcwd())
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0 or not os.path.exists(report_path):
+        raise RuntimeError(f"main.py exited with {proc.returncode}:\n{proc.stderr[-2000:]}")
+    with open(report_path, encoding="utf-8") as f:
+        report = json.load(f)
+    report["wall_ms"] = wall_ms
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark (import times, first frame, first signal)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--signal", action="store_true",
+                        help="also measure time-to-first-signal (starts the worker; needs network)")
+    args = parser.parse_args()
+
+    print("📦 Import times (-X importtime, fresh process):")
+    for module in IMPORT_TARGETS:
+        try:
+            total_ms, top = import_profile(module)
+        except RuntimeError as e:
+            print(f"  {module:24} ❌ {str(e).splitlines()[0]}")
+            continue
+        heavy = ", ".join(f"{name} {ms:,.0f}" for name, ms in top)
+        print(f"  {module:24} {total_ms:>9,.0f} ms | {heavy}")
+
+    targets = ["warm"] + (["first_signal"] if args.signal else [])
+    with tempfile.TemporaryDirectory() as tmp:
+        for target in targets:
+            reports = [run_app(target, os.path.join(tmp, f"{target}_{i}.json")) for i in range(args.runs)]
+
+            print(f"\n⏱️ Startup until '{target}' (median of {args.runs} runs, ms since first import):")
+            for mark in STARTUP_MARKS:
+                values = [r["marks_ms"][mark] for r in reports if mark in r["marks_ms"]]
+                if values:
+                    print(f"  {mark:24} {statistics.median(values):>9,.0f}")
+            if args.signal:
+                values = [r["signal_after_start_ms"] for r in reports if "signal_after_start_ms" in r]
+                if values:
+                    print(f"  {'signal after START':24} {statistics.median(values):>9,.0f}")
+            print(f"  {'process wall time':24} {statistics.median(r['wall_ms'] for r in reports):>9,.0f}")
+
+            print("  warm-up steps (background):")
+            for label in reports[0]["imports_ms"]:
+                values = [r["imports_ms"][label] for r in reports if label in r["imports_ms"]]
+                print(f"    {label:22} {statistics.median(values):>9,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,90 +1,181 @@
 # tools/miner.py
-import requests
+import sys
+import argparse
+import asyncio
+import json
+import shutil
+import numpy as np
 import pandas as pd
 import time
 import os
-from datetime import datetime
+
+sys.path.append(os.getcwd())
+from src.ingest.wallex import WallexConnector, TIMEFRAME_MINUTES
+from src.ingest.store import CandleStore, STORE_ROOT, PRICE_COLUMNS
 
 # --- تنظیمات دقیق برای تومان ---
-SYMBOL = "ETHTMN"  # <--- مهم: حتما باید ETHTMN باشد
-TIMEFRAME = "60"
+SYMBOLS = ["ETHTMN"]  # <--- مهم: حتما باید نماد تومانی (TMN) باشد
+TIMEFRAMES = ["1h"]
 TARGET_CANDLES = 50000
-BATCH_SIZE = 500 
-OUTPUT_FILE = "data/history_50k.csv"
-
-def fetch_batch(to_timestamp):
-    url = "https://api.wallex.ir/v1/udf/history"
-    from_timestamp = to_timestamp - (BATCH_SIZE * 60 * 60)
-    
-    params = {
-        'symbol': SYMBOL,
-        'resolution': TIMEFRAME,
-        'from': from_timestamp,
-        'to': to_timestamp
-    }
-    
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    
-    try:
-        res = requests.get(url, params=params, headers=headers, timeout=10)
-        data = res.json()
-        if data['s'] == 'ok':
-            df = pd.DataFrame({
-                'timestamp': data['t'],
-                'open': data['o'], 'high': data['h'], 
-                'low': data['l'], 'close': data['c'], 'volume': data['v']
-            })
-            return df
-    except:
-        pass
-    return None
-
-def mine_data():
-    if not os.path.exists("data"): os.makedirs("data")
-    
-    # حذف فایل قبلی (چه دلاری، چه مصنوعی)
-    if os.path.exists(OUTPUT_FILE): 
-        print("🗑️ Deleting old file to start fresh...")
-        os.remove(OUTPUT_FILE)
-    
-    all_dfs = []
-    current_end = int(time.time())
-    collected = 0
-    
-    print(f"⛏️ MINING STARTED: Fetching {TARGET_CANDLES} candles for {SYMBOL}...")
-    
-    while collected < TARGET_CANDLES:
-        df = fetch_batch(current_end)
-        
-        if df is None or df.empty:
-            print("❌ End of data reached.")
-            break
-            
-        cols = ['open', 'high', 'low', 'close', 'volume']
-        df[cols] = df[cols].astype(float)
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-        df.set_index('timestamp', inplace=True)
-        
-        all_dfs.append(df)
-        collected += len(df)
-        
-        last_price = df.iloc[-1]['close']
-        # نمایش قیمت برای اطمینان (باید میلیونی باشد)
-        print(f"   ✅ Got {len(df)} | Total: {collected} | Price: {last_price:,.0f} T")
-        
-        first_time = df.index.min().timestamp()
-        current_end = int(first_time) - 1
-        time.sleep(0.2)
-
-    if all_dfs:
-        print("💾 Saving real Toman data...")
-        final_df = pd.concat(all_dfs)
-        final_df.sort_index(inplace=True)
-        final_df = final_df[~final_df.index.duplicated(keep='first')]
-        final_df.to_csv(OUTPUT_FILE)
-        print(f"🎉 SUCCESS! Saved {len(final_df)} real Toman candles.")
-    else:
-        print("❌ Failed.")
+BATCH_SIZE = 500
+CONCURRENCY = 4
+MINING_ROOT = os.path.join(STORE_ROOT, "_mining")
+
+
+class MiningJob:
+    """
+    استخراج یک symbol/timeframe به صورت پنجره‌های BATCH_SIZE کندلی.
+    هر پنجره بلافاصله روی دیسک ذخیره و در manifest.json ثبت می‌شود؛
+    اجرای بعدی فقط پنجره‌های باقی‌مانده را می‌گیرد (resume).
+    در پایان، پنجره‌ها یک‌جا در CandleStore ادغام می‌شوند.
+    """
+    def __init__(self, store, symbol, timeframe, candles=TARGET_CANDLES, batch_size=BATCH_SIZE,
+                 topup=False, root=MINING_ROOT):
+        self.store = store
+        self.symbol = symbol.upper()
+        self.timeframe = timeframe
+        self.candles = candles
+        self.batch_size = batch_size
+        self.topup = topup
+        self.step = TIMEFRAME_MINUTES[timeframe] * 60
+        self.folder = os.path.join(root, self.symbol, timeframe)
+        self.manifest_path = os.path.join(self.folder, "manifest.json")
+        self.manifest = None
+
+    def _write_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+    def plan(self, fresh=False):
+        """ساخت (یا ادامه) برنامه پنجره‌ها؛ خروجی: لیست (from, to) پنجره‌های باقی‌مانده"""
+        if fresh:
+            shutil.rmtree(self.folder, ignore_errors=True)
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+            print(f"↩️ {self.symbol} {self.timeframe}: resuming ({len(self.manifest['done'])} windows done)")
+        else:
+            end = int(time.time()) // self.step * self.step
+            last = self.store.last_timestamp(self.symbol, self.timeframe)
+            if self.topup and last is not None:
+                # فقط کندل‌های جدیدتر (به همراه آخرین کندل ذخیره‌شده که شاید باز بوده)
+                mode, start = "topup", int(last.timestamp())
+            else:
+                mode, start = "backfill", end - self.candles * self.step
+            self.manifest = {"mode": mode, "start": start, "end": end, "step": self.step,
+                             "window": self.batch_size * self.step, "done": {}}
+            os.makedirs(self.folder, exist_ok=True)
+            self._write_manifest()
+
+        m = self.manifest
+        windows = [(w, min(w + m["window"] - 1, m["end"])) for w in range(m["start"], m["end"] + 1, m["window"])]
+        return [w for w in windows if str(w[0]) not in m["done"]]
+
+    def save_window(self, window_start, df):
+        """ذخیره اتمیک یک پنجره و ثبت آن در manifest (چک‌پوینت)"""
+        rows = len(df)
+        if rows:
+            stamps = pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+            values = df[PRICE_COLUMNS].to_numpy(dtype=np.float64)
+            path = os.path.join(self.folder, f"{window_start}.npz")
+            with open(path + ".tmp", "wb") as f:
+                np.savez(f, timestamp=stamps, values=values)
+            os.replace(path + ".tmp", path)
+        self.manifest["done"][str(window_start)] = rows
+        self._write_manifest()
+
+    def _load_windows(self):
+        frames = []
+        for window_start, rows in self.manifest["done"].items():
+            if not rows:
+                continue
+            with np.load(os.path.join(self.folder, f"{window_start}.npz")) as chunk:
+                index = pd.DatetimeIndex(chunk["timestamp"].view('datetime64[ns]'), name='timestamp')
+                frames.append(pd.DataFrame(chunk["values"], index=index, columns=PRICE_COLUMNS))
+        if not frames:
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+        mined = pd.concat(frames)
+        return mined[~mined.index.duplicated(keep='last')].sort_index()
+
+    def finalize(self):
+        """ادغام پنجره‌های استخراج‌شده در انبار و پاک کردن فایل‌های موقت؛ خروجی: تعداد کندل اضافه‌شده"""
+        mined = self._load_windows()
+        added = 0
+        if not mined.empty:
+            existing = self.store.load(self.symbol, self.timeframe)
+            if existing.empty or mined.index[0] >= existing.index[0]:
+                # فقط داده جدیدتر: افزودن ساده به انتهای انبار
+                added = self.store.append(self.symbol, self.timeframe, mined)
+            else:
+                # تاریخچه قدیمی‌تر از انبار: ادغام و بازنویسی کامل
+                existing = existing.copy()
+                merged = pd.concat([mined, existing])
+                merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+                added = len(merged) - len(existing)
+                del existing
+                self.store.replace(self.symbol, self.timeframe, merged)
+        shutil.rmtree(self.folder, ignore_errors=True)
+        return added
+
+    async def run(self, exchange, semaphore, fresh=False):
+        pending = self.plan(fresh)
+        total = len(pending)
+        failed = 0
+
+        async def fetch(window):
+            async with semaphore:
+                return window, await exchange.fetch_range(self.symbol, self.timeframe, *window)
+
+        tasks = [asyncio.ensure_future(fetch(w)) for w in pending]
+        for done, future in enumerate(asyncio.as_completed(tasks), 1):
+            try:
+                (window_start, _), df = await future
+            except Exception as e:
+                failed += 1
+                print(f"   ❌ {self.symbol} {self.timeframe}: window failed ({e})")
+                continue
+            self.save_window(window_start, df)
+            print(f"   ✅ {self.symbol} {self.timeframe}: {done}/{total} windows | +{len(df)} candles")
+
+        if failed:
+            print(f"⚠️ {self.symbol} {self.timeframe}: {failed} windows failed. Run again to resume.")
+            return None
+        added = self.finalize()
+        print(f"🎉 {self.symbol} {self.timeframe}: {added} new candles "
+              f"(store: {self.store.count(self.symbol, self.timeframe)})")
+        return added
+
+
+async def mine_data(symbols=SYMBOLS, timeframes=TIMEFRAMES, candles=TARGET_CANDLES, topup=False,
+                    concurrency=CONCURRENCY, rate=5.0, fresh=False, store_root=STORE_ROOT, api_root=None):
+    store = CandleStore(store_root)
+    jobs = [MiningJob(store, symbol, tf, candles=candles, topup=topup,
+                      root=os.path.join(store_root, "_mining"))
+            for symbol in symbols for tf in timeframes]
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = WallexConnector(rate=rate) if api_root is None else WallexConnector(api_root, rate=rate)
+
+    print(f"⛏️ MINING STARTED: {len(jobs)} jobs ({'top-up' if topup else f'{candles} candles'})...")
+    start = time.time()
+    async with connector as exchange:
+        results = await asyncio.gather(*[job.run(exchange, semaphore, fresh) for job in jobs])
+    print(f"⏱️ Done in {time.time() - start:.1f}s | {exchange.get_metrics()['requests']} requests")
+    return dict(zip([(job.symbol, job.timeframe) for job in jobs], results))
+
 
 if __name__ == "__main__":
-    mine_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Wallex history miner (resumable, concurrent)")
+    parser.add_argument("--symbols", nargs="+", default=SYMBOLS)
+    parser.add_argument("--timeframes", nargs="+", default=TIMEFRAMES, choices=list(TIMEFRAME_MINUTES))
+    parser.add_argument("--candles", type=int, default=TARGET_CANDLES)
+    parser.add_argument("--topup", action="store_true", help="only fetch candles newer than the store")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=5.0, help="requests per second")
+    parser.add_argument("--fresh", action="store_true", help="discard unfinished checkpoints")
+    args = parser.parse_args()
+
+    asyncio.run(mine_data(args.symbols, args.timeframes, args.candles, args.topup,
+                          args.concurrency, args.rate, args.fresh))